@@ -0,0 +1,302 @@
+""" This file benchmarks the numerical core of the polynomial interpolation demo (Newton's
+    interpolation and the polynomial display string) and checks for performance regressions.
+
+    Each function is timed across a range of point counts (n) and node distributions. For every case
+    the time per call (ns/op) and the peak memory allocated during a call are recorded, and the complexity
+    exponent k (time ~ n^k) is fitted for each function and node distribution. The results are compared
+    against a baseline file and the run fails if any case got slower by more than the threshold.
+
+    The import time of each module (as reported by python -X importtime) is also measured, and the run
+    fails if a module that should not need pygame imports it.
+
+    Usage:
+        python BenchInterpolation.py                     # run and compare against bench_baseline.json
+        python BenchInterpolation.py --update-baseline   # run and save the results as the new baseline
+        python BenchInterpolation.py --threshold 50      # only fail when a case is over 50% slower
+        python BenchInterpolation.py --imports-only      # only report the import times
+
+    Authors: Joshua Fawcett, Hans Prieto
+"""
+
+import os
+import sys
+import math
+import json
+import argparse
+import subprocess
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+import Interpolation
+import Formatting
+
+# Default point counts the functions are benchmarked at
+SIZES = [4, 10, 100, 1000, 10000]
+
+# Node distributions on the interval [-1, 1] (see Interpolation.makeNodes())
+DISTRIBUTIONS = Interpolation.NODE_DISTRIBUTIONS
+
+# newtonsIP builds the full n x n table and the string getPolynomialString returns is O(n^2) characters
+# long, so at n = 10000 a single call takes minutes and gigabytes of memory. These functions
+# are only benchmarked up to the given n unless --max-n is used
+SIZE_LIMITS = {
+    'newtonsIP': 1000,
+    'getPolynomialString': 1000,
+}
+
+# Modules whose import time is reported. Every module except Graphics must be importable without pygame
+IMPORT_MODULES = ['Interpolation', 'Formatting', 'Sampling', 'Session', 'InterpolationServer', 'Streaming', 'Graphics']
+PYGAME_FREE_MODULES = ['Interpolation', 'Formatting', 'Sampling', 'Session', 'InterpolationServer', 'Streaming']
+
+DEFAULT_BASELINE = 'bench_baseline.json'
+DEFAULT_THRESHOLD = 25 # percent
+
+# Function that is interpolated in every benchmark (Runge's function)
+def runge(x):
+    return 1 / (1 + 25 * x * x)
+
+
+###################
+# Benchmark cases #
+###################
+
+def setupCase(function, distribution, n):
+    ''' Returns (call, opsPerCall) where call() runs 'function' once on n points with the given node
+        distribution, and opsPerCall is the number of operations a single call performs
+    '''
+    xs = Interpolation.makeNodes(distribution, n)
+    ys = [runge(x) for x in xs]
+
+    # The top row of the divided difference table only needs O(n) memory, so the benchmarks that read
+    # it can use point counts too large for newtonsIP. The coefficients overflow for large n, which is
+    # expected here
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        topRow = Interpolation.newtonCoefficients(xs, ys).tolist()
+
+    if function == 'newtonsIP':
+        return (lambda: Interpolation.newtonsIP(xs, ys)), 1
+
+    if function == 'evaluatePolynomial':
+        # evaluatePolynomial only reads the top row of the table
+        table = [topRow]
+        evalXs = [x + 0.001 for x in xs[:64]] # evaluate next to (but not on) the nodes
+        def call():
+            for x in evalXs:
+                Interpolation.evaluatePolynomial(x, xs, table)
+        return call, len(evalXs)
+
+    if function == 'Interpolant':
+        # Build the interpolant and evaluate it next to the nodes in a single vectorized call
+        evalXs = [x + 0.001 for x in xs[:64]]
+        def call():
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                Interpolation.Interpolant.fromPoints(xs, ys)(evalXs)
+        return call, 1
+
+    if function == 'getPolynomialString':
+        table = Interpolation.newtonsIP(xs, ys) if n <= 1000 else [topRow] * n
+        return (lambda: Formatting.getPolynomialString(xs, table)), 1
+
+    if function == 'formatNumberString':
+        # Format the string of every node and value (one op = one number)
+        strings = [str(v) for v in xs + ys]
+        def call():
+            for string in strings:
+                Formatting.formatNumberString(string)
+        return call, len(strings)
+
+    raise ValueError(f"Unknown function '{function}'")
+
+FUNCTIONS = ['newtonsIP', 'evaluatePolynomial', 'Interpolant', 'getPolynomialString', 'formatNumberString']
+
+def timeCall(call, minTime, repeat):
+    ''' Returns the fastest time (in seconds) of a single call, taken over 'repeat' rounds that each
+        run the call for at least 'minTime' seconds
+    '''
+    # Find how many calls are needed for a round to last minTime
+    number = 1
+    while True:
+        start = perf_counter()
+        for i in range(number):
+            call()
+        elapsed = perf_counter() - start
+        if elapsed >= minTime:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(minTime / elapsed) + 1))
+
+    best = elapsed / number
+    for r in range(repeat - 1):
+        start = perf_counter()
+        for i in range(number):
+            call()
+        best = min(best, (perf_counter() - start) / number)
+    return best
+
+def measureAllocations(call):
+    ''' Returns the peak number of bytes allocated while running call() once
+    '''
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - before)
+
+def fitExponent(sizes, times):
+    ''' Least squares fit of log(time) = k * log(n) + c. Returns the complexity exponent k
+    '''
+    points = [(math.log(n), math.log(t)) for n, t in zip(sizes, times) if n >= 10 and t > 0]
+    if len(points) < 2:
+        return None
+    meanX = sum(p[0] for p in points) / len(points)
+    meanY = sum(p[1] for p in points) / len(points)
+    sxx = sum((p[0] - meanX) ** 2 for p in points)
+    sxy = sum((p[0] - meanX) * (p[1] - meanY) for p in points)
+    return sxy / sxx
+
+def runBenchmarks(functions, distributions, sizes, minTime=0.05, repeat=3, maxN=None, log=print):
+    ''' Runs every benchmark case and returns the results as a dictionary of the form:
+        {'cases': {'function/distribution/n': {'nsPerOp': ..., 'peakAllocBytes': ...}, ...},
+         'exponents': {'function/distribution': k, ...}}
+    '''
+    results = {'cases': {}, 'exponents': {}}
+    for function in functions:
+        limit = maxN if maxN is not None else SIZE_LIMITS.get(function, math.inf)
+        for distribution in distributions:
+            measuredSizes = []
+            measuredTimes = []
+            for n in sizes:
+                if n > limit:
+                    continue
+                call, ops = setupCase(function, distribution, n)
+                seconds = timeCall(call, minTime, repeat) / ops
+                allocated = measureAllocations(call)
+
+                key = f"{function}/{distribution}/{n}"
+                results['cases'][key] = {'nsPerOp': seconds * 1e9, 'peakAllocBytes': allocated}
+                log(f"{key:<45}{seconds * 1e9:>16,.0f} ns/op{allocated:>14,.0f} B peak")
+
+                measuredSizes.append(n)
+                measuredTimes.append(seconds)
+
+            exponent = fitExponent(measuredSizes, measuredTimes)
+            if exponent is not None:
+                results['exponents'][f"{function}/{distribution}"] = exponent
+                log(f"{function}/{distribution}: time ~ n^{exponent:.2f}")
+    return results
+
+def measureImport(module, repeat=3):
+    ''' Imports 'module' in a new interpreter 'repeat' times. Returns (microseconds, imported) where
+        microseconds is the fastest cumulative import time of the module reported by python -X importtime,
+        and imported is the set of the names of every module that was imported with it
+    '''
+    best = math.inf
+    imported = set()
+    for r in range(repeat):
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                   cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   capture_output=True, text=True, check=True)
+        for line in completed.stderr.splitlines():
+            # Lines are of the form 'import time: self [us] | cumulative | imported package'
+            fields = line[len('import time:'):].split('|')
+            if not line.startswith('import time:') or len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            name = fields[2].strip()
+            imported.add(name)
+            if name == module:
+                best = min(best, int(fields[1]))
+    return best, imported
+
+def runImportReport(modules, repeat=3, log=print):
+    ''' Measures the import time of every module. Returns a dictionary of the form
+        {module: {'importUs': ..., 'importsPygame': ..., 'importsNumpy': ...}, ...}
+    '''
+    report = {}
+    for module in modules:
+        microseconds, imported = measureImport(module, repeat)
+        report[module] = {'importUs': microseconds, 'importsPygame': 'pygame' in imported,
+                          'importsNumpy': 'numpy' in imported}
+        log(f"import {module:<39}{microseconds / 1000:>13,.1f} ms"
+            f"{'   (pygame)' if 'pygame' in imported else ''}{'   (numpy)' if 'numpy' in imported else ''}")
+    return report
+
+def compareToBaseline(results, baseline, threshold):
+    ''' Returns a list of (case, baseline ns/op, current ns/op) for every case that is more than
+        'threshold' percent slower than the baseline
+    '''
+    regressions = []
+    for key, current in results['cases'].items():
+        previous = baseline['cases'].get(key)
+        if previous is None:
+            continue
+        if current['nsPerOp'] > previous['nsPerOp'] * (1 + threshold / 100):
+            regressions.append((key, previous['nsPerOp'], current['nsPerOp']))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the numerical core of the interpolation demo')
+    parser.add_argument('--functions', nargs='+', default=FUNCTIONS, choices=FUNCTIONS)
+    parser.add_argument('--distributions', nargs='+', default=DISTRIBUTIONS, choices=DISTRIBUTIONS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--max-n', type=int, default=None,
+                        help='benchmark every function up to this n (overrides the per-function limits)')
+    parser.add_argument('--min-time', type=float, default=0.05, help='minimum seconds per timing round')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timing rounds (the fastest is kept)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='fail if a case is more than this percent slower than the baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--imports-only', action='store_true', help='only report the import time of each module')
+    parser.add_argument('--skip-imports', action='store_true', help="don't report the import time of each module")
+    args = parser.parse_args(argv)
+
+    imports = {}
+    if not args.skip_imports:
+        imports = runImportReport(IMPORT_MODULES, args.repeat)
+        heavy = [module for module in PYGAME_FREE_MODULES if imports.get(module, {}).get('importsPygame')]
+        if heavy:
+            print(f"\nThese modules should not import pygame: {', '.join(heavy)}")
+            return 1
+        if args.imports_only:
+            return 0
+
+    results = runBenchmarks(args.functions, args.distributions, args.sizes,
+                            args.min_time, args.repeat, args.max_n)
+    if imports:
+        results['imports'] = imports
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline found at {args.baseline} (run with --update-baseline to create one)")
+        return 0
+
+    regressions = compareToBaseline(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold}%:")
+        for key, previous, current in regressions:
+            print(f"  {key}: {previous:,.0f} -> {current:,.0f} ns/op ({(current / previous - 1) * 100:+.0f}%)")
+        return 1
+
+    print(f"\nNo regressions beyond {args.threshold}% against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
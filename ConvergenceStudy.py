@@ -0,0 +1,249 @@
+""" This file implements a convergence study of Newton's interpolation: a known function is interpolated
+    at n nodes for a range of n, and the maximum and RMS error of the interpolating polynomial are measured
+    on a dense grid. Comparing equispaced, Chebyshev and random nodes shows Runge's phenomenon: the error of
+    the equispaced interpolant grows with n near the ends of the interval, while the Chebyshev interpolant
+    converges.
+
+    Every (node family, n) case is independent, so the cases are spread across a pool of processes. The
+    polynomials are built and evaluated as Interpolation.Interpolant objects. The results are printed
+    as a table, and can be saved as JSON and plotted (log10 of the maximum error against n for each family)
+    with the graph's Grid drawing code.
+
+    The function is either a Python callable or an expression in x that may use numpy's functions, such as
+    "1/(1+25*x**2)" or "exp(-x**2)*sin(5*x)". Callables are sent to the worker processes by pickling, so a
+    lambda (which can't be pickled) is studied in this process instead.
+
+    Usage:
+        python ConvergenceStudy.py                                        # Runge's function on [-1, 1]
+        python ConvergenceStudy.py "abs(x)" --n 2 30 --step 2 --plot study.png
+        python ConvergenceStudy.py "exp(x)" --interval 0 3 --families chebyshev random --output study.json
+
+        results = runStudy(math.sin, range(2, 20), interval=(0, 6))
+
+    Authors: Joshua Fawcett, Hans Prieto
+"""
+
+import os
+import sys
+import math
+import json
+import pickle
+import argparse
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Interpolation import Interpolant, makeNodes, NODE_DISTRIBUTIONS
+
+DEFAULT_FUNCTION = '1/(1+25*x**2)' # Runge's function
+DEFAULT_INTERVAL = (-1.0, 1.0)
+DEFAULT_SIZES = (2, 30) # Smallest and largest n
+GRID_SIZE = 2001 # Number of points the error is measured at
+
+# Names that can be used in a function expression (besides x)
+EXPRESSION_NAMES = {name: getattr(np, name) for name in
+                    ('sin', 'cos', 'tan', 'arcsin', 'arccos', 'arctan', 'sinh', 'cosh', 'tanh',
+                     'exp', 'log', 'log10', 'sqrt', 'abs', 'sign', 'pi', 'e')}
+
+
+#########
+# Study #
+#########
+
+# The error of one interpolating polynomial. 'maxError' and 'rmsError' are infinite if the polynomial
+# overflowed somewhere on the grid
+def caseResult(family, n, maxError, rmsError, seconds):
+    return {'family': family, 'n': n, 'maxError': maxError, 'rmsError': rmsError, 'seconds': seconds}
+
+
+def makeFunction(function):
+    ''' Returns a function that evaluates 'function' (a callable or an expression in x) at every value of an
+        array of x values
+    '''
+    if isinstance(function, str):
+        code = compile(function, '<expression>', 'eval')
+        namespace = dict(EXPRESSION_NAMES, __builtins__={})
+        def f(x):
+            return np.broadcast_to(eval(code, namespace, {'x': x}), np.shape(x)).astype(float)
+        return f
+
+    def f(x):
+        try: # Try evaluating the whole array at once (for example with numpy's functions)
+            values = np.asarray(function(x), dtype=float)
+            if values.shape == np.shape(x):
+                return values
+        except (TypeError, ValueError):
+            pass
+        return np.array([function(value) for value in np.ravel(x)], dtype=float).reshape(np.shape(x))
+    return f
+
+def functionName(function):
+    return function if isinstance(function, str) else getattr(function, '__name__', repr(function))
+
+def nodesFor(family, n, interval):
+    ''' Returns n nodes of the family 'family' (see Interpolation.makeNodes()) on 'interval'
+    '''
+    a, b = interval
+    return [a + (x + 1) * (b - a) / 2 for x in makeNodes(family, n)]
+
+def studyCase(function, interval, gridSize, case):
+    ''' Interpolates 'function' at the nodes of 'case' (a (family, n) pair) and returns the caseResult
+        holding the error of the polynomial on a grid of 'gridSize' points. Runs in a worker process
+    '''
+    family, n = case
+    start = perf_counter()
+    f = makeFunction(function)
+
+    xs = nodesFor(family, n, interval)
+    ys = f(np.array(xs)).tolist()
+    polynomial = Interpolant.fromPoints(xs, ys)
+
+    grid = np.linspace(interval[0], interval[1], gridSize)
+    with np.errstate(over='ignore', invalid='ignore'):
+        errors = np.abs(polynomial(grid) - f(grid))
+        if np.all(np.isfinite(errors)):
+            maxError = float(errors.max())
+            rmsError = float(np.sqrt(np.mean(errors * errors)))
+        else:
+            maxError = rmsError = math.inf
+    return caseResult(family, n, maxError, rmsError, perf_counter() - start)
+
+def runStudy(function, sizes, families=NODE_DISTRIBUTIONS, interval=DEFAULT_INTERVAL, gridSize=GRID_SIZE, processes=None):
+    ''' Measures the error of the polynomial interpolating 'function' at n nodes of each family in 'families',
+        for each n in 'sizes'. The cases are spread across 'processes' worker processes (one per CPU by
+        default, and none if 'processes' is 1). Returns a dictionary of the form
+        {'function': ..., 'interval': ..., 'gridSize': ..., 'seconds': ..., 'results': [caseResult, ...]}
+    '''
+    cases = [(family, n) for n in sizes for family in families]
+
+    try:
+        pickle.dumps(function)
+    except (pickle.PicklingError, AttributeError, TypeError): # Lambdas can't be sent to other processes
+        processes = 1
+
+    start = perf_counter()
+    arguments = ([function] * len(cases), [interval] * len(cases), [gridSize] * len(cases), cases)
+    if processes == 1:
+        results = list(map(studyCase, *arguments))
+    else:
+        # Each worker is sent its cases in a few chunks instead of one at a time
+        workers = processes or os.cpu_count() or 1
+        chunksize = max(1, len(cases) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(studyCase, *arguments, chunksize=chunksize))
+
+    return {
+        'function': functionName(function),
+        'interval': list(interval),
+        'gridSize': gridSize,
+        'seconds': perf_counter() - start,
+        'results': results,
+    }
+
+def printTable(study, log=print):
+    ''' Print the maximum and RMS error of each case, with a row for each n and a column for each family
+    '''
+    families = list(dict.fromkeys(result['family'] for result in study['results']))
+    errors = {(result['family'], result['n']): result for result in study['results']}
+    sizes = sorted(set(result['n'] for result in study['results']))
+
+    log(f"Interpolating {study['function']} on [{study['interval'][0]:g}, {study['interval'][1]:g}] "
+        f"(errors measured at {study['gridSize']} points, {study['seconds']:.2f} s)")
+    log(f"{'':>5}" + ''.join(f"{family:^24}" for family in families))
+    log(f"{'n':>5}" + f"{'max':>12}{'rms':>12}" * len(families))
+    for n in sizes:
+        row = f"{n:>5}"
+        for family in families:
+            result = errors[(family, n)]
+            row += f"{result['maxError']:>12.3e}{result['rmsError']:>12.3e}"
+        log(row)
+    return None
+
+
+########
+# Plot #
+########
+
+def renderPlot(study, path, size=(700, 700)):
+    ''' Draw log10 of the maximum error against n for each node family on a graph grid (see Graphics.Grid),
+        and save the image to 'path'
+    '''
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy') # No window is needed
+    import pygame
+    from Graphics import Grid, CURVE_COLORS, BLACK, WHITE, getFont
+
+    pygame.display.init()
+    pygame.font.init()
+
+    families = list(dict.fromkeys(result['family'] for result in study['results']))
+    lines = {family: [] for family in families}
+    for result in sorted(study['results'], key=lambda result: result['n']):
+        if 0 < result['maxError'] < math.inf:
+            lines[result['family']].append((result['n'], math.log10(result['maxError'])))
+
+    # Choose the scale (1, 2 or 5 times a power of 10 units per grid line) and offsets that fit every point
+    points = [point for line in lines.values() for point in line] or [(0, 0)]
+    left, right = min(p[0] for p in points), max(p[0] for p in points)
+    bottom, top = min(p[1] for p in points), max(p[1] for p in points)
+    grid = Grid(size)
+    span = max(right - left, top - bottom, 1) * 1.2
+    power = 10 ** math.floor(math.log10(span / (min(size) / grid.pixelsPerUnit)))
+    grid.worldScale = next(power * step for step in (1, 2, 5, 10) if (min(size) / grid.pixelsPerUnit) * power * step >= span)
+    scale = grid.pixelsPerUnit / grid.worldScale
+    grid.xOffset = -round((left + right) / 2 * scale)
+    grid.yOffset = -round((bottom + top) / 2 * scale)
+    grid.__drawGrid__()
+
+    surface = grid.screen
+    font = getFont("Courier New", 14, bold=True)
+    for index, family in enumerate(families):
+        color = CURVE_COLORS[index % len(CURVE_COLORS)][0]
+        screenPoints = [grid.convertToScreen(n, error) for n, error in lines[family]]
+        if len(screenPoints) > 1:
+            pygame.draw.lines(surface, color, False, screenPoints, 2)
+        for x, y in screenPoints:
+            pygame.draw.circle(surface, color, (int(x), int(y)), 3, 0)
+
+        # Legend
+        text = font.render(family, True, color)
+        textRect = text.get_rect(topright=(size[0] - 10, 34 + 18 * index))
+        pygame.draw.rect(surface, WHITE, textRect)
+        surface.blit(text, textRect)
+
+    title = font.render(f"log10(max error) vs n: {study['function']}", True, BLACK)
+    titleRect = title.get_rect(topleft=(10, 10))
+    pygame.draw.rect(surface, WHITE, titleRect)
+    surface.blit(title, titleRect)
+
+    pygame.image.save(surface, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how the error of Newton's interpolation changes with n for different node families")
+    parser.add_argument('function', nargs='?', default=DEFAULT_FUNCTION,
+                        help='expression in x to interpolate (numpy functions such as sin, exp and abs can be used)')
+    parser.add_argument('--interval', type=float, nargs=2, default=DEFAULT_INTERVAL, metavar=('A', 'B'))
+    parser.add_argument('--n', type=int, nargs=2, default=DEFAULT_SIZES, metavar=('MIN', 'MAX'), help='range of node counts')
+    parser.add_argument('--step', type=int, default=1, help='step between node counts')
+    parser.add_argument('--families', nargs='+', choices=NODE_DISTRIBUTIONS, default=NODE_DISTRIBUTIONS)
+    parser.add_argument('--grid', type=int, default=GRID_SIZE, help='number of points the error is measured at')
+    parser.add_argument('--processes', type=int, help='number of worker processes (one per CPU by default)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--plot', help='save a plot of the maximum error to this image file (for example study.png)')
+    args = parser.parse_args(argv)
+
+    study = runStudy(args.function, range(args.n[0], args.n[1] + 1, args.step), args.families,
+                     tuple(args.interval), args.grid, args.processes)
+    printTable(study)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(study, f, indent=2)
+    if args.plot:
+        print(f"Plot saved to {renderPlot(study, args.plot)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+""" This file implements the string formatting used to display numbers and the interpolating polynomial
+    (for example 'P(x) = 1 + 3(x - 2) + ...'). It does not import pygame, so the strings can be generated
+    by tools that don't use the graphical interface.
+
+    Numbers are formatted through formatNumber(), which remembers the string of every number it formatted
+    (up to FORMAT_MEMO_SIZE numbers), so each node and coefficient is only formatted once while it is shown.
+
+    Authors: Joshua Fawcett, Hans Prieto
+
+    Sources:
+            String Formatting: https://www.w3schools.com/python/ref_string_format.asp
+"""
+
+# Maximum number of formatted numbers that are remembered (see formatNumber())
+FORMAT_MEMO_SIZE = 4096
+
+# Strings of the numbers that have been formatted, of the form {(type, value): string}. The type is part of
+# the key because an int and a float that are equal are formatted differently (for example 1 and 1.0)
+_formatted = {}
+
+
+def isValidNumber(string):
+    ''' Helper function to determine if 'string' contains a valid floating point number or integer
+    '''
+    # Try-Except used to prevent program from crashing when trying to determine if 'string' contains a valid number
+    try:
+        if '.' in string: # Number is of the form "x.y" (ex: "3.5")
+            temp = string.split(".") # Split string on '.' to obtain a list of the form ['x', 'y']
+
+            if len(temp) != 2: # If we have an invalid floating point number EX: "x.", "x.y.z", etc.
+                return False
+            
+            else: # If we have a valid floating point then check to make sure 'x' and 'y' are valid
+                if '-' in temp[1]: # Make sure we dont have number of the form: "x.-y" or "x.y-"
+                    return False
+                
+                for v in temp: # Try converting "x" and "y" to floats. If this fails, an exception is raised
+                    float(v)
+        else: # If number is not of the form: "x.y", then we can try to directly convert it to a float
+            float(string) # If this fails, 'string' is not a valid number
+
+    except Exception: # If an exception is raised, 'string' is not a valid number so we return False
+        return False
+
+    return True
+
+def formatNumberString(string):
+    ''' Helper function to format the number in 'string' in order to prevent the graphical display of certain numbers
+        from taking up too much space. (rounds numbers with large number of decimal points, converts to scientific notation
+        if the number is large, etc.)
+    '''
+
+    newStr = string
+
+    roundDecimal = False
+    convertToInt = False
+    ScientificNotation = False
+
+    index = string.find('.')
+    if index != -1:
+        numDecimals = len(string[index+1:])
+        if numDecimals > 4:
+            roundDecimal = True
+        elif numDecimals == 1 and string[index+1] == '0':
+            convertToInt = True
+
+        magnitude = len(string[:index])
+        if magnitude > 4:
+            ScientificNotation = True
+
+    else:
+        if len(newStr) > 4:
+            ScientificNotation = True
+
+    if convertToInt:
+        if ScientificNotation:
+            newStr = '{:0.2e}'.format(int(float(newStr)))
+        else:
+            newStr = '{:d}'.format(int(float(newStr)))
+    else:
+        if ScientificNotation:
+            newStr = '{:0.4e}'.format(float(newStr))
+        else:
+            newStr = '{:0.4f}'.format(float(newStr))
+
+        newStr = newStr.rstrip('0') # Remove unecessary trailing zeros
+
+    return newStr
+
+def formatNumber(value):
+    ''' Returns formatNumberString(str(value)), formatting 'value' only if it wasn't formatted recently.
+        When FORMAT_MEMO_SIZE numbers are remembered, they are forgotten and the memo starts again
+    '''
+    key = (type(value), value)
+    string = _formatted.get(key)
+    if string is None:
+        if len(_formatted) >= FORMAT_MEMO_SIZE:
+            _formatted.clear()
+        string = formatNumberString(str(value))
+        _formatted[key] = string
+    return string
+
+def getPolynomialString(xs, table):
+    ''' Helper function that takes a list of x coordinates and a divided difference table and returns
+        a string that represents the interpolation polynomial (ex: 'P(x) = 1 + 3(x - 2) + ...')
+    '''
+    return polynomialString(xs, table[0][:len(table)])
+
+def polynomialString(xs, coefficients):
+    ''' Returns the string of the polynomial with nodes 'xs' and Newton coefficients 'coefficients' (see
+        getPolynomialString()).
+
+        Term i is its coefficient followed by the factors (x - xs[j]) for every j < i, so the factors are
+        joined onto the product of the previous term instead of being formatted again for every term
+    '''
+    n = len(coefficients)
+
+    parts = ['P(x) = ', formatNumber(coefficients[0]), ' ']
+    product = '' # (x - xs[0])(x - xs[1])...(x - xs[i-1])
+
+    for i in range(1, n):
+        xi = xs[i - 1]
+        if xi < 0:
+            product += f'(x + {formatNumber(abs(xi))})'
+        else:
+            product += f'(x - {formatNumber(xi)})'
+
+        coefficient = coefficients[i]
+        if coefficient < 0:
+            parts.append(f'- {formatNumber(abs(coefficient))}')
+        else:
+            parts.append(f'+ {formatNumber(coefficient)}')
+        parts.append(product)
+        parts.append(' ')
+    return ''.join(parts)
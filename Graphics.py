@@ -16,8 +16,16 @@
 import pygame
 import sys
 import math
+from time import perf_counter
 
-from Interpolation import newtonsIP, evaluatePolynomial
+import numpy as np
+
+from Profiling import profiler, profiled
+from Interpolation import ENGINES, Interpolant, findCriticalPoints
+from Sampling import ViewTransform, CurveRequest, CurveSampler, CurveWorker, resampleCurve, visibleMarkers
+from Session import Session, CurveData, saveSession, loadSession, DEFAULT_SESSION_PATH
+from Formatting import isValidNumber, polynomialString
+from History import History, Snapshot, CurveSnapshot, PersistentVector
 
 # Import pygame key constants
 from pygame.locals import (
@@ -31,6 +39,14 @@ from pygame.locals import (
     K_ESCAPE,
     K_RETURN,
     K_BACKSPACE,
+    K_F3,
+    K_TAB,
+    K_s,
+    K_o,
+    K_z,
+    K_y,
+    KMOD_CTRL,
+    KMOD_SHIFT,
     QUIT,
 )
 
@@ -47,6 +63,31 @@ GREEN = (10, 200, 10)
 
 # Maximum number of points the graph can interpolate
 MAXPOINTS = 10
+# Maximum number of points the graph can interpolate with a cubic spline (splines are cheap to
+# calculate and don't oscillate, so many more points can be used)
+MAXSPLINEPOINTS = 1000
+
+# Names of the curve engines displayed on the curve engine button
+ENGINE_LABELS = {'newton': 'NEWTON', 'natural': 'NATURAL', 'clamped': 'CLAMPED'}
+
+# Names of the curves on the graph, and the (curve, point) colors of each curve
+CURVE_NAMES = ['A', 'B', 'C', 'D', 'E']
+CURVE_COLORS = [(RED, BLUE), ((20, 120, 255), (0, 60, 150)), ((235, 130, 0), (150, 80, 0)),
+                ((160, 40, 210), (90, 20, 130)), ((0, 160, 140), (0, 95, 85))]
+
+# Maximum number of curves on the graph
+MAXCURVES = len(CURVE_NAMES)
+
+# Resolution the grid and curves are drawn at (relative to the window) while the user drags or zooms the
+# graph, and the filters that can scale them up to the size of the window. A full resolution frame is drawn
+# once there has been no input for SETTLE_TIME seconds. A scale of 1 always draws at full resolution
+RENDER_SCALE = 1
+RENDER_FILTERS = {'smooth': pygame.transform.smoothscale, 'fast': pygame.transform.scale}
+SETTLE_TIME = 0.15
+
+# Size of the overview (relative to the window) and the number of zoom steps it is zoomed out from the graph
+OVERVIEW_SIZE = 1 / 3
+OVERVIEW_ZOOM = 28
 
 ####################
 # Helper Functions #
@@ -70,136 +111,262 @@ def lerp(a, b, f):
     '''
     return (1-f)*a + f*b 
 
-def isValidNumber(string):
-    ''' Helper function to determine if 'string' contains a valid floating point number or integer
+# Fonts that have been created, of the form {(name, size, bold): pygame font}. Creating a font loads it
+# from disk, so each font is created once, the first time something is drawn with it
+_fonts = {}
+
+def getFont(name, size, bold=False):
+    ''' Helper function that returns the pygame font with the given name, size and boldness
     '''
-    # Try-Except used to prevent program from crashing when trying to determine if 'string' contains a valid number
-    try:
-        if '.' in string: # Number is of the form "x.y" (ex: "3.5")
-            temp = string.split(".") # Split string on '.' to obtain a list of the form ['x', 'y']
+    key = (name, size, bold)
+    font = _fonts.get(key)
+    if font is None:
+        font = pygame.font.SysFont(name, size, bold=bold)
+        _fonts[key] = font
+    return font
 
-            if len(temp) != 2: # If we have an invalid floating point number EX: "x.", "x.y.z", etc.
-                return False
-            
-            else: # If we have a valid floating point then check to make sure 'x' and 'y' are valid
-                if '-' in temp[1]: # Make sure we dont have number of the form: "x.-y" or "x.y-"
-                    return False
-                
-                for v in temp: # Try converting "x" and "y" to floats. If this fails, an exception is raised
-                    float(v)
-        else: # If number is not of the form: "x.y", then we can try to directly convert it to a float
-            float(string) # If this fails, 'string' is not a valid number
 
-    except Exception: # If an exception is raised, 'string' is not a valid number so we return False
-        return False
+################################################################################################
+################################################################################################
+##                                     Point Class                                            ##
+################################################################################################
+################################################################################################
 
-    return True
+# The point store holds the data of every point on the graph in contiguous arrays (one array for each
+# of the world x/y coordinates, screen x/y coordinates, and active/selected flags). This allows the
+# graph to update the positions of all of the points at once when the user zooms or drags the screen.
+# Individual points are accessed through Point objects, which are lightweight views into the store
+class PointStore:
+    def __init__(self, capacity=16, color=BLUE):
+        self.count = 0
 
-def formatNumberString(string):
-    ''' Helper function to format the number in 'string' in order to prevent the graphical display of certain numbers
-        from taking up too much space. (rounds numbers with large number of decimal points, converts to scientific notation
-        if the number is large, etc.)
-    '''
+        # Color the points are drawn in when they are not selected
+        self.color = color
 
-    newStr = string
+        self.worldX = np.zeros(capacity)
+        self.worldY = np.zeros(capacity)
+        self.screenX = np.zeros(capacity)
+        self.screenY = np.zeros(capacity)
+        self.active = np.ones(capacity, dtype=bool)
+        self.selected = np.zeros(capacity, dtype=bool)
 
-    roundDecimal = False
-    convertToInt = False
-    ScientificNotation = False
+        # Display string of each point while it is being edited in the side menu (None if the string
+        # should be generated from the point's coordinates)
+        self.text = []
 
-    index = string.find('.')
-    if index != -1:
-        numDecimals = len(string[index+1:])
-        if numDecimals > 4:
-            roundDecimal = True
-        elif numDecimals == 1 and string[index+1] == '0':
-            convertToInt = True
+        # Point views, in the order the points were added
+        self.views = []
 
-        magnitude = len(string[:index])
-        if magnitude > 4:
-            ScientificNotation = True
+        # Indices of the points whose state (see self.state()) may have changed since the undo history last
+        # recorded them (see Graph.recordHistory()), so only those points are compared with the snapshot
+        self.changed = set()
+        return None
 
-    else:
-        if len(newStr) > 4:
-            ScientificNotation = True
+    def __len__(self):
+        return self.count
 
-    if convertToInt:
-        if ScientificNotation:
-            newStr = '{:0.2e}'.format(int(float(newStr)))
-        else:
-            newStr = '{:d}'.format(int(float(newStr)))
-    else:
-        if ScientificNotation:
-            newStr = '{:0.4e}'.format(float(newStr))
-        else:
-            newStr = '{:0.4f}'.format(float(newStr))
+    def __iter__(self):
+        return iter(self.views)
 
-        while newStr[-1] == '0': # Remove unecessary trailing zeros
-            newStr = newStr[:-1]
+    def __getitem__(self, index):
+        return self.views[index]
 
-    return newStr
+    def __repr__(self):
+        return repr(self.views)
 
-def getPolynomialString(xs, table):
-    ''' Helper function that takes a list of x coordinates and a divided difference table and returns
-        a string that represents the interpolation polynomial (ex: 'P(x) = 1 + 3(x - 2) + ...')
-    '''
-    returnString = 'P(x) = '
+    def add(self, worldCoords, screenCoords):
+        ''' Add a point to the store and return its Point view
+        '''
+        if self.count == len(self.worldX): # Double the capacity of the arrays when they are full
+            for name in ('worldX', 'worldY', 'screenX', 'screenY', 'active', 'selected'):
+                array = getattr(self, name)
+                grown = np.zeros(2 * len(array), dtype=array.dtype)
+                grown[:self.count] = array[:self.count]
+                setattr(self, name, grown)
+
+        i = self.count
+        self.worldX[i], self.worldY[i] = worldCoords
+        self.screenX[i], self.screenY[i] = screenCoords
+        self.active[i] = True
+        self.selected[i] = False
+        self.text.append(None)
+        self.count += 1
+        self.changed.add(i)
+
+        point = Point(self, i)
+        self.views.append(point)
+        return point
+
+    def remove(self, point):
+        ''' Remove 'point' from the store. The points after it are moved down one place
+        '''
+        i = point.index
+        n = self.count
+        for array in (self.worldX, self.worldY, self.screenX, self.screenY, self.active, self.selected):
+            array[i:n-1] = array[i+1:n]
+        del self.text[i]
+        del self.views[i]
+        for view in self.views[i:]:
+            view.index -= 1
+        self.count -= 1
+        self.changed = {j - (j > i) for j in self.changed if j != i}
+        return None
 
-    n = len(table)
+    def clear(self):
+        ''' Remove all of the points from the store
+        '''
+        self.views = []
+        self.text = []
+        self.count = 0
+        self.changed = set()
+        return None
 
-    startingValue = formatNumberString(str(table[0][0]))
+    def load(self, worldX, worldY, active):
+        ''' Replace the points in the store with the points in the arrays 'worldX', 'worldY' and 'active'.
+            The screen positions are not set (see project())
+        '''
+        n = len(worldX)
+        capacity = max(16, n)
+        self.worldX = np.zeros(capacity)
+        self.worldY = np.zeros(capacity)
+        self.screenX = np.zeros(capacity)
+        self.screenY = np.zeros(capacity)
+        self.active = np.ones(capacity, dtype=bool)
+        self.selected = np.zeros(capacity, dtype=bool)
+
+        self.worldX[:n] = worldX
+        self.worldY[:n] = worldY
+        self.active[:n] = active
+        self.text = [None] * n
+        self.views = [Point(self, i) for i in range(n)]
+        self.count = n
+        self.changed = set(range(n))
+        return None
 
-    returnString = returnString + startingValue + ' '
+    def state(self, index):
+        ''' Returns the tuple (x, y, active) holding the world coordinates of the point at 'index' and whether it is active
+        '''
+        return (float(self.worldX[index]), float(self.worldY[index]), bool(self.active[index]))
 
-    for i in range(1, n):
-        add = ''
-        coefficient = table[0][i]
-        if coefficient < 0:
-            s = formatNumberString(str(abs(coefficient)))
-            add += f'- {s}'
-        else:
-            s = formatNumberString(str(coefficient))
-            add += f'+ {s}'
-
-        for j in range(i):
-            add += '(x '
-            xi = xs[j]
-            if xi < 0:
-                s = formatNumberString(str(abs(xi)))
-                add += f'+ {s}'
-            else:
-                s = formatNumberString(str(xi))
-                add += f'- {s}'
-            add += ')'
-        add += ' ' 
-        
-        returnString += add 
-    return returnString
+    def activeCoordinates(self):
+        ''' Returns two tuples holding the world x and y coordinates of the active points
+        '''
+        n = self.count
+        mask = self.active[:n]
+        return tuple(self.worldX[:n][mask].tolist()), tuple(self.worldY[:n][mask].tolist())
 
+    def project(self, grid):
+        ''' Update the screen positions of all of the points from their world coordinates
+        '''
+        n = self.count
+        self.screenX[:n], self.screenY[:n] = grid.convertToScreen(self.worldX[:n], self.worldY[:n])
+        return None
 
-################################################################################################
-################################################################################################
-##                                     Point Class                                            ##
-################################################################################################
-################################################################################################
+    def translate(self, grid, dx, dy):
+        ''' Move every point by (dx, dy) in screen space and update their world coordinates (see Point.update())
+        '''
+        n = self.count
+        self.screenX[:n] += dx
+        self.screenY[:n] += dy
+        wx, wy = grid.convertToWorld(self.screenX[:n], self.screenY[:n])
+        wx, wy = np.round(wx, 6), np.round(wy, 6)
+
+        # Recalculating the world coordinates from the screen positions may round them
+        moved = (wx != self.worldX[:n]) | (wy != self.worldY[:n])
+        self.changed.update(np.flatnonzero(moved).tolist())
+        self.worldX[:n] = wx
+        self.worldY[:n] = wy
+        self.text[:n] = [None] * n
+        return None
 
-# The point class is a container to hold a single point in the graphical interface. 
+    def pointAt(self, position, radius):
+        ''' Returns the first active point within 'radius' pixels (horizontally and vertically) of the screen
+            space 'position', or None if there is no such point (see inCircle())
+        '''
+        n = self.count
+        hits = (self.active[:n] &
+                (np.abs(position[0] - self.screenX[:n]) <= radius) &
+                (np.abs(position[1] - self.screenY[:n]) <= radius))
+        indices = np.flatnonzero(hits)
+        if len(indices) == 0:
+            return None
+        return self.views[indices[0]]
+
+
+# The point class is a view of a single point in the point store. It reads and writes the point's
+# data in the store's arrays
 class Point:
-    def __init__(self, worldCoords, screenCoords, radius=5, color=BLUE):
-        self.coordinates = worldCoords # Coordinates of point in world space (based on the coordinate axes of the grid)
-        self.screenPos = screenCoords # Coordinates of point in screen space (location of the point relative to the pygame window)
-        
-        self.color = color
-        self.radius = radius
-        self.selected = False
-        self.active = True
-        self.str = ''
+    __slots__ = ('store', 'index')
 
-        self.updateStr()
+    radius = 5
+
+    def __init__(self, store, index):
+        self.store = store # PointStore holding the point's data
+        self.index = index # Index of the point's data in the store's arrays
+
+    @property
+    def coordinates(self):
+        ''' Coordinates of point in world space (based on the coordinate axes of the grid)
+        '''
+        i = self.index
+        return (float(self.store.worldX[i]), float(self.store.worldY[i]))
+
+    @coordinates.setter
+    def coordinates(self, worldCoords):
+        i = self.index
+        self.store.worldX[i], self.store.worldY[i] = worldCoords
+        self.store.changed.add(i)
+
+    @property
+    def screenPos(self):
+        ''' Coordinates of point in screen space (location of the point relative to the pygame window)
+        '''
+        i = self.index
+        return (float(self.store.screenX[i]), float(self.store.screenY[i]))
+
+    @screenPos.setter
+    def screenPos(self, screenCoords):
+        i = self.index
+        self.store.screenX[i], self.store.screenY[i] = screenCoords
+
+    @property
+    def active(self):
+        return bool(self.store.active[self.index])
+
+    @active.setter
+    def active(self, value):
+        self.store.active[self.index] = value
+        self.store.changed.add(self.index)
+
+    @property
+    def selected(self):
+        return bool(self.store.selected[self.index])
+
+    @selected.setter
+    def selected(self, value):
+        self.store.selected[self.index] = value
+
+    @property
+    def color(self):
+        return GREEN if self.selected else self.store.color
+
+    @property
+    def str(self):
+        ''' The point's string representation of itself
+        '''
+        text = self.store.text[self.index]
+        if text is None:
+            x, y = self.coordinates
+            text = f"({x}, {y})"
+        return text
+
+    @str.setter
+    def str(self, text):
+        self.store.text[self.index] = text
 
     def update(self, grid, dx, dy):
         ''' Update the point's world coordinates and screen position based on the
-            change in (screen space) x and y. 
+            change in (screen space) x and y.
         '''
         cur_screen_x, cur_screen_y = self.screenPos
 
@@ -225,23 +392,19 @@ class Point:
         self.updateStr()
 
     def updateStr(self):
-        string = f"({self.coordinates[0]}, {self.coordinates[1]})"
-        self.str = string
+        ''' Generate the point's string from its coordinates again (discarding any text being edited)
+        '''
+        self.store.text[self.index] = None
 
     def select(self, selectValue=None):
         ''' Toggles whether the point is selected or not. (if 'selectValue' is specified, then the
-            point will be set to selected/deselected based on the specified value). Updates
-            the point's color based on selected value
+            point will be set to selected/deselected based on the specified value). The point's
+            color is based on the selected value
         '''
         if selectValue is not None:
             self.selected = not selectValue
-        
-        if self.selected:
-            self.color = BLUE
-            self.selected = False
-        else:
-            self.color = GREEN
-            self.selected = True
+
+        self.selected = not self.selected
 
     def __repr__(self):
         ''' Used for debugging
@@ -264,6 +427,10 @@ class Grid:
         self.screen = pygame.Surface(size)
         self.rect = self.screen.get_rect()
 
+        # Transform between screen and world space. It is created when it is first needed after
+        # the offsets or scale of the grid change (see self.view)
+        self._view = None
+
         self.xOffset = 0
         self.yOffset = 0
 
@@ -272,9 +439,14 @@ class Grid:
         self.zoomct = 2
         self.pixelsPerUnit = 60
 
-        self.font = pygame.font.SysFont("QuickType 2", 16, bold=True)
+        # Size of the axis labels
+        self.fontSize = 16
 
-        self.__drawGrid__()
+        # The grid is drawn (and its font is created) the first time it is displayed
+
+    @property
+    def font(self):
+        return getFont("QuickType 2", self.fontSize, bold=True)
 
     def snapToGrid(self, x, y):
         ''' given world coordinates (x,y), this method determines if the coordinates
@@ -293,20 +465,66 @@ class Grid:
             newy = nearestValueY
         return newx,newy
 
+    # The offsets and scale of the grid are properties so that the view transform is recreated
+    # whenever one of them changes
+    @property
+    def xOffset(self):
+        return self._xOffset
+
+    @xOffset.setter
+    def xOffset(self, value):
+        self._xOffset = value
+        self._view = None
+
+    @property
+    def yOffset(self):
+        return self._yOffset
+
+    @yOffset.setter
+    def yOffset(self, value):
+        self._yOffset = value
+        self._view = None
+
+    @property
+    def pixelsPerUnit(self):
+        return self._pixelsPerUnit
+
+    @pixelsPerUnit.setter
+    def pixelsPerUnit(self, value):
+        self._pixelsPerUnit = value
+        self._view = None
+
+    @property
+    def worldScale(self):
+        return self._worldScale
+
+    @worldScale.setter
+    def worldScale(self, value):
+        self._worldScale = value
+        self._view = None
+
+    @property
+    def view(self):
+        ''' The ViewTransform for the current offsets and scale of the grid. The transform never changes,
+            so it can also be used as a snapshot of the current view (for example on the background
+            sampling thread)
+        '''
+        if self._view is None:
+            self._view = ViewTransform(self._xOffset, self._yOffset, self._pixelsPerUnit, self._worldScale,
+                                       self.rect.width, self.rect.height)
+        return self._view
+
     def convertToWorld(self, x, y):
-        ''' Converts screen space coordinates (x,y) to world space coordinates
+        ''' Converts screen space coordinates (x,y) to world space coordinates. x and y may be numbers or arrays
         '''
-        newX = (((x - self.xOffset) - (self.rect.width // 2)) / self.pixelsPerUnit) * self.worldScale
-        newY = -1 * (((y + self.yOffset) - (self.rect.height // 2)) / self.pixelsPerUnit) * self.worldScale
-        return (newX, newY)
+        return self.view.toWorld(x, y)
 
     def convertToScreen(self, x, y):
-        ''' Converts world coordinates (x,y) to screen space coordinates
+        ''' Converts world coordinates (x,y) to screen space coordinates. x and y may be numbers or arrays
         '''
-        newX = (((self.rect.width // 2) + (x * self.pixelsPerUnit / self.worldScale)) + self.xOffset)
-        newY = (((self.rect.width // 2) - (y * self.pixelsPerUnit / self.worldScale)) - self.yOffset)
-        return newX, newY
+        return self.view.toScreen(x, y)
 
+    @profiled('Grid.__drawGrid__')
     def __drawGrid__(self):
         ''' Draws coordinate axes and all other grid lines at the correct position on the screen
         '''
@@ -482,10 +700,29 @@ class Grid:
 # The appropriate action when a button is clicked on 
 class Button:
     def __init__(self, action, buttonSize):
-        self.screen = pygame.Surface(buttonSize)
-        self.screen.fill(DARKGREY)
+        self.rect = pygame.Rect((0, 0), buttonSize)
+        self._screen = None
+        self.version = 0 # Incremented every time the button is redrawn (see Compositor)
         self.fn = action
 
+    @property
+    def screen(self):
+        ''' The button's surface. It is created and drawn the first time the button is displayed
+        '''
+        if self._screen is None:
+            self._screen = pygame.Surface(self.rect.size)
+            self.__draw__()
+        return self._screen
+
+    def __draw__(self):
+        self.screen.fill(DARKGREY)
+
+    def redraw(self):
+        ''' Draw the button again the next time it is displayed
+        '''
+        self._screen = None
+        self.version += 1
+
     def onClick(self):
         self.fn()
 
@@ -494,9 +731,12 @@ class resetButton(Button):
     def __init__(self, action, screen_size):
         super(resetButton, self).__init__(action, (40, 40))
 
-        self.rect = self.screen.get_rect(center=(screen_size[0] - 22, 22))
+        self.rect.center = (screen_size[0] - 22, 22)
+
+    def __draw__(self):
+        self.screen.fill(DARKGREY)
 
-        font = pygame.font.SysFont("QuickType 2", 14, bold=True)
+        font = getFont("QuickType 2", 14, bold=True)
         text1 = font.render("RESET", True, BLACK)
         text2 = font.render("ZOOM", True, BLACK)
         textRect1 = text1.get_rect()
@@ -512,9 +752,14 @@ class clearButton(Button):
     def __init__(self, action, screen_size):
         super(clearButton, self).__init__(action, (40, 40))
 
-        self.rect = self.screen.get_rect(center=(screen_size[0] - 22, 64))
+        self.rect.center = (screen_size[0] - 22, 64)
+
+        self.currentClickedPoint = None
+
+    def __draw__(self):
+        self.screen.fill(DARKGREY)
 
-        font = pygame.font.SysFont("QuickType 2", 14, bold=True)
+        font = getFont("QuickType 2", 14, bold=True)
         text1 = font.render("CLEAR", True, BLACK)
         text2 = font.render("POINTS", True, BLACK)
         textRect1 = text1.get_rect()
@@ -525,15 +770,15 @@ class clearButton(Button):
         self.screen.blit(text1, textRect1)
         self.screen.blit(text2, textRect2)
 
-        self.currentClickedPoint = None
-
 # Zoom in button: Zooms in on the graph
 class zoomInButton(Button):
     def __init__(self, action, screen_size):
         super(zoomInButton, self).__init__(action, (40, 40))
 
-        self.rect = self.screen.get_rect(center=(screen_size[0] - 22, 106))
+        self.rect.center = (screen_size[0] - 22, 106)
 
+    def __draw__(self):
+        self.screen.fill(DARKGREY)
         pygame.draw.line(self.screen, BLACK, (10, 20), (30, 20), 3)
         pygame.draw.line(self.screen, BLACK, (20, 10), (20, 30), 3)
 
@@ -542,17 +787,49 @@ class zoomOutButton(Button):
     def __init__(self, action, screen_size):
         super(zoomOutButton, self).__init__(action, (40, 40))
 
-        self.rect = self.screen.get_rect(center=(screen_size[0] - 22, 148))
-        
+        self.rect.center = (screen_size[0] - 22, 148)
+
+    def __draw__(self):
+        self.screen.fill(DARKGREY)
         pygame.draw.line(self.screen, BLACK, (10, 20), (30, 20), 3)
 
+# Curve engine button: Switches between Newton's interpolating polynomial and cubic splines
+class curveEngineButton(Button):
+    def __init__(self, action, screen_size):
+        super(curveEngineButton, self).__init__(action, (40, 40))
+
+        self.rect.center = (screen_size[0] - 22, 190)
+
+        self.engine = ENGINES[0]
+
+    def __draw__(self):
+        self.screen.fill(DARKGREY)
+
+        font1 = getFont("QuickType 2", 14, bold=True)
+        font2 = getFont("QuickType 2", 11, bold=True)
+        text1 = font1.render("CURVE", True, BLACK)
+        text2 = font2.render(ENGINE_LABELS[self.engine], True, BLACK)
+        textRect1 = text1.get_rect()
+        textRect2 = text2.get_rect()
+        textRect1.midtop = (20, 10)
+        textRect2.midbottom = (20, 30)
+
+        self.screen.blit(text1, textRect1)
+        self.screen.blit(text2, textRect2)
+
+    def onClick(self):
+        self.engine = self.fn()
+        self.redraw()
+
 # Open menu button: Opens the side menu
 class openMenuButton(Button):
     def __init__(self, action, screen_size):
         super(openMenuButton, self).__init__(action, (40, 40))
 
-        self.rect = self.screen.get_rect(center=(22, 22))
-        
+        self.rect.center = (22, 22)
+
+    def __draw__(self):
+        self.screen.fill(DARKGREY)
         pygame.draw.line(self.screen, BLACK, (10, 15), (30, 15), 2)
         pygame.draw.line(self.screen, BLACK, (10, 20), (30, 20), 2)
         pygame.draw.line(self.screen, BLACK, (10, 25), (30, 25), 2)
@@ -562,16 +839,14 @@ class openBottomMenuButton(Button):
     def __init__(self, action, screen_size):
         super(openBottomMenuButton, self).__init__(action, (40, 40))
 
-        self.rect = self.screen.get_rect(center=(screen_size[0] - 22, screen_size[1] - 22))
+        self.rect.center = (screen_size[0] - 22, screen_size[1] - 22)
 
         self.selected = False
 
-        self.__draw__()
-
     def __draw__(self):
         self.screen.fill(DARKGREY)
         if not self.selected:
-            font = pygame.font.SysFont("QuickType 2", 18, bold=True)
+            font = getFont("QuickType 2", 18, bold=True)
             text = font.render("P(X)", True, BLACK)
             textRect = text.get_rect()
             textRect.center = (20, 20)
@@ -585,7 +860,7 @@ class openBottomMenuButton(Button):
             self.selected = False
         else:
             self.selected = True
-        self.__draw__()
+        self.redraw()
         self.fn()
 
 # Add point button: Toggles the graph 'add point mode' where a point will be added to the graph
@@ -594,15 +869,14 @@ class addPointButton(Button):
     def __init__(self, action, screen_size):
         super(addPointButton, self).__init__(action, (40, 40))
 
-        self.rect = self.screen.get_rect(center=(64, 22))
+        self.rect.center = (64, 22)
 
         self.selected = False
-        self.__draw__()
 
     def __draw__(self):
         self.screen.fill(DARKGREY)
         
-        font = pygame.font.SysFont("QuickType 2", 14, bold=True)
+        font = getFont("QuickType 2", 14, bold=True)
         text1 = font.render("ADD", True, BLACK)
         text2 = font.render("POINTS", True, BLACK)
         textRect1 = text1.get_rect()
@@ -622,7 +896,7 @@ class addPointButton(Button):
             self.selected = False
         else:
             self.selected = True
-        self.__draw__()
+        self.redraw()
         self.fn()
 
 # Delete point button: Deletes a currently selected point
@@ -630,15 +904,13 @@ class deletePointButton(Button):
     def __init__(self, action, screen_size):
         super(deletePointButton, self).__init__(action, (40, 40))
 
-        self.rect = self.screen.get_rect(center=(106, 22))
-
-        self.__draw__()
+        self.rect.center = (106, 22)
 
     def __draw__(self):
         self.screen.fill(DARKGREY)
         #pygame.draw.circle(self.screen, BLUE, (self.rect.width //2, self.rect.height // 2), 7)
 
-        font = pygame.font.SysFont("QuickType 2", 14, bold=True)
+        font = getFont("QuickType 2", 14, bold=True)
         text1 = font.render("DELETE", True, BLACK)
         text2 = font.render("POINT", True, BLACK)
         textRect1 = text1.get_rect()
@@ -661,7 +933,8 @@ class deletePointButton(Button):
 
 # Side menu is responsible for displaying the coordinates of all of the points on the graph.
 # It allows the user to view what points are on the graph, where the points are, and allows
-# them to modify the location of these points
+# them to modify the location of these points. When the graph has more than one curve, the
+# points are grouped under a header for each curve
 class SideMenu:
     def __init__(self, screen_size):
         self.screen = pygame.Surface((screen_size[0] // 4, screen_size[1]))
@@ -670,8 +943,13 @@ class SideMenu:
 
         self.active = False
 
-        self.pointList = []
+        self.curves = [] # Curves whose points are displayed
+        self.activeCurve = 0 # Index of the curve being edited
         self.pointDisplayRects = []
+        self.curveHeaderRects = [] # List of the form [(rect, curve index), ...]
+
+        # Rows (headers and point displays) of the menu when it was last drawn (see self.updatePoints())
+        self.drawnRows = None
 
         self.scrollPosition = 0
         self.scrollRect = pygame.Rect(self.rect.width - 17, 44, 17, 30)
@@ -681,7 +959,7 @@ class SideMenu:
         self.cursorPosition = 0
         self.pointText = ''
 
-        self.drawBG()
+        # The menu is drawn the first time it is displayed (see self.updatePoints())
         return None
 
     def drawBG(self):
@@ -689,7 +967,7 @@ class SideMenu:
         '''
         self.screen.fill(GREY)
 
-        font = pygame.font.SysFont("Arial", 28, bold=True)
+        font = getFont("Arial", 28, bold=True)
 
         self.__drawPointBGs__()
 
@@ -724,6 +1002,14 @@ class SideMenu:
         self.selected = None
         return None
 
+    def clickOnCurveHeader(self, position):
+        ''' Returns the index of the curve whose header was clicked on (or None if no header was clicked on)
+        '''
+        for rect, index in self.curveHeaderRects:
+            if rect.collidepoint(position[0], position[1]):
+                return index
+        return None
+
     def moveCursor(self, direction):
         ''' Moves the cursor's position one character to the left/right based
             on user input
@@ -783,45 +1069,106 @@ class SideMenu:
         #self.drawBG()
         return None
 
-    def __drawPointBGs__(self):
-        ''' Draw the white background for each of the point displays as well as the point
-            display text (showing each point's coordinates
+    def __layout__(self):
+        ''' Calculate the position of each curve header and point display. Returns a list of the form
+            [(rect, key), ...] with an entry for each row, where the key of a row changes whenever the
+            row would be drawn differently
         '''
-        font = pygame.font.SysFont("Courier New", 12, bold=True)
         self.pointDisplayRects = []
+        self.curveHeaderRects = []
+        rows = []
 
         top = self.scrollRect.top - 44
         
         pointBGRect = pygame.Rect(0, 44 - top, self.rect.width - 2, 40)
-        for point in self.pointList:
-            x,y = point.coordinates
-            pygame.draw.rect(self.screen, WHITE, pointBGRect)
+        for index, curve in enumerate(self.curves):
+            if len(self.curves) > 1: # Draw a header above the points of each curve
+                headerRect = pygame.Rect(0, pointBGRect.top, pointBGRect.width, 20)
+                self.curveHeaderRects.append((headerRect, index))
+                rows.append((tuple(headerRect), (curve.name, curve.engine, index == self.activeCurve)))
+                pointBGRect.top += 22
+
+            for point in curve.points:
+                self.pointDisplayRects.append((pointBGRect.copy(), point))
+                selected = point.selected
+                rows.append((tuple(pointBGRect), (point.str, selected, self.cursorPosition if selected else None)))
+                pointBGRect.centery += 42
+        return rows
+
+    def __drawPointBGs__(self):
+        ''' Draw the white background for each of the point displays as well as the point
+            display text (showing each point's coordinates
+        '''
+        font = getFont("Courier New", 12, bold=True)
 
-            temp = pointBGRect.copy()
-            self.pointDisplayRects.append((temp, point))
+        for headerRect, index in self.curveHeaderRects:
+            self.__drawCurveHeader__(self.curves[index], headerRect, index == self.activeCurve)
 
-            displayString = point.str
-            
-            text = font.render(displayString, True, BLACK)
-            textRect = text.get_rect(center=(pointBGRect.centerx, pointBGRect.centery))
+        for pointBGRect, point in self.pointDisplayRects:
+            self.__drawPointBG__(point, pointBGRect, font)
 
-            if point.selected:
-                pygame.draw.rect(self.screen, GREEN, pointBGRect, 2)
+    def __drawCurveHeader__(self, curve, headerRect, active):
+        ''' Draw the header of a group of points: the curve's color, name and curve engine. The header
+            of the curve being edited is highlighted
+        '''
+        font = getFont("Courier New", 12, bold=True)
+        if active:
+            pygame.draw.rect(self.screen, DARKGREY, headerRect)
+        pygame.draw.line(self.screen, BLACK, headerRect.bottomleft, headerRect.bottomright, 1)
 
-                # Hardcoded character width = 7
-                cursorXPos = textRect.right - (self.cursorPosition * 7)
+        swatchRect = pygame.Rect(headerRect.left + 6, headerRect.top + 5, 10, 10)
+        pygame.draw.rect(self.screen, curve.color, swatchRect)
 
-                pygame.draw.line(self.screen, BLACK, (cursorXPos, textRect.top - 1), (cursorXPos, textRect.bottom - 1), 1)
+        text = font.render(f"CURVE {curve.name} ({ENGINE_LABELS[curve.engine]})", True, BLACK)
+        self.screen.blit(text, text.get_rect(midleft=(swatchRect.right + 6, headerRect.centery)))
+        return None
 
-                self.pointText = displayString
+    def __drawPointBG__(self, point, pointBGRect, font):
+        ''' Draw the white background and display text of a single point display
+        '''
+        pygame.draw.rect(self.screen, WHITE, pointBGRect)
 
+        displayString = point.str
+        
+        text = font.render(displayString, True, BLACK)
+        textRect = text.get_rect(center=(pointBGRect.centerx, pointBGRect.centery))
 
-            self.screen.blit(text, textRect)
-            pointBGRect.centery += 42
+        if point.selected:
+            pygame.draw.rect(self.screen, GREEN, pointBGRect, 2)
+
+            # Hardcoded character width = 7
+            cursorXPos = textRect.right - (self.cursorPosition * 7)
+
+            pygame.draw.line(self.screen, BLACK, (cursorXPos, textRect.top - 1), (cursorXPos, textRect.bottom - 1), 1)
+
+            self.pointText = displayString
+
+
+        self.screen.blit(text, textRect)
+        return None
+
+    @profiled('SideMenu.updatePoints')
+    def updatePoints(self, curves, activeCurve=0):
+        ''' Update the menu to show the points of each of the curves in 'curves' ('activeCurve' is the index
+            of the curve being edited). The menu is only redrawn if one of its rows changed. Returns a list
+            of the rects (in screen space) of the rows that changed
+        '''
+        self.curves = curves
+        self.activeCurve = activeCurve
 
-    def updatePoints(self, pointsList=[]):
-        self.pointList = pointsList
+        rows = self.__layout__()
+        if rows == self.drawnRows:
+            return []
+
+        if self.drawnRows is None: # The menu hasn't been drawn yet
+            changed = [self.rect.copy()]
+        else:
+            # (A row's dirty rect spans the width of the menu and includes the line drawn under a header)
+            changed = [pygame.Rect(self.rect.left, self.rect.top + rect[1], self.rect.width, rect[3] + 1)
+                       for rect, key in set(rows) ^ set(self.drawnRows)]
         self.drawBG()
+        self.drawnRows = rows
+        return changed
 
 
 #################
@@ -838,31 +1185,51 @@ class BottomMenu:
 
         self.active = False
 
-        self.displayText = "P(X) = 0"
+        self._displayText = "P(X) = 0"
         self.fontSize = 28
 
+        # Interpolant (see Interpolation.Interpolant) that the display text will be generated from the next
+        # time it is needed. The polynomial string is expensive to build, so it is only created once the menu is visible
+        self.polynomialSource = None
+
+        # True when the menu's surface is out of date and must be redrawn before it is displayed
+        self.needsRedraw = True
+
         scrollBarPosition = 0
         self.scrollRect = pygame.Rect(0, self.rect.height - 19, 30, 17)
-
-        self.drawBG()
         return None
 
+    @property
+    def displayText(self):
+        ''' The text displayed in the bottom menu. If the interpolating polynomial changed since
+            the text was last generated, the polynomial string is generated here
+        '''
+        if self.polynomialSource is not None:
+            interpolant = self.polynomialSource
+            with profiler.stage('polynomialString'):
+                self._displayText = polynomialString(interpolant.xs.tolist(), interpolant.coefficients.tolist())
+            self.polynomialSource = None
+        return self._displayText
+
     def drawBG(self):
         ''' Draw the bottom menu background, scroll bar, and interpolation polynomial display text
         '''
-        self.screen.fill((120, 120, 255))
-        fillRect = pygame.Rect(4, 8, self.rect.width - 8, self.rect.height - 30)
-        pygame.draw.rect(self.screen, WHITE, fillRect)
+        displayText = self.displayText # (the polynomial string is timed as its own stage)
 
-        font = self.__getFont__()
-        text = font.render(self.displayText, True, BLACK)
-        textRect = text.get_rect()
+        with profiler.stage('BottomMenu.drawBG'):
+            self.screen.fill((120, 120, 255))
+            fillRect = pygame.Rect(4, 8, self.rect.width - 8, self.rect.height - 30)
+            pygame.draw.rect(self.screen, WHITE, fillRect)
 
-        X = self.getTextPosition(font)
-        
-        textRect.midleft = (X, fillRect.centery)
-        self.screen.blit(text, textRect)
-        pygame.draw.rect(self.screen, (90, 90, 160), self.scrollRect)
+            font = self.__getFont__()
+            text = font.render(displayText, True, BLACK)
+            textRect = text.get_rect()
+
+            X = self.getTextPosition(font)
+
+            textRect.midleft = (X, fillRect.centery)
+            self.screen.blit(text, textRect)
+            pygame.draw.rect(self.screen, (90, 90, 160), self.scrollRect)
         return None
 
     def scroll(self, dx):
@@ -871,6 +1238,7 @@ class BottomMenu:
         self.scrollRect.left += dx
         self.scrollRect.left = max(0, self.scrollRect.left)
         self.scrollRect.right = min(self.rect.right, self.scrollRect.right)
+        self.needsRedraw = True
 
     def getTextPosition(self, font):
         ''' Gets the new position of the display text based on the position of the scroll bar. This
@@ -895,7 +1263,7 @@ class BottomMenu:
         ''' Returns a font with a size in the range [12,28], attempting to size the font
             as big as possible without the text going off the screen
         '''
-        font = pygame.font.SysFont("Courier New", self.fontSize, bold=True)
+        font = getFont("Courier New", self.fontSize, bold=True)
 
         maxWidth = self.rect.width - 8
         
@@ -906,7 +1274,7 @@ class BottomMenu:
             if self.fontSize == 28:
                 return font
             self.fontSize += 2
-            font = pygame.font.SysFont("Courier New", self.fontSize, bold=True)
+            font = getFont("Courier New", self.fontSize, bold=True)
             width, height = font.size(self.displayText)
 
         # This while loop scales the font size down to fit inside the screen
@@ -914,20 +1282,681 @@ class BottomMenu:
             if self.fontSize == 12:
                 return font
             self.fontSize -= 2
-            font = pygame.font.SysFont("Courier New", self.fontSize, bold=True)
+            font = getFont("Courier New", self.fontSize, bold=True)
             width, height = font.size(self.displayText)
         return font
 
     def updateDisplay(self, newText):
-        ''' Update the bottom menu display. The new interpolating polynomial to display
-            will be provided in 'newText'
+        ''' Update the bottom menu display to show the message in 'newText'. The menu is
+            redrawn the next time it is displayed (see self.refresh())
         '''
-        self.displayText = newText
-        self.drawBG()
+        if self.polynomialSource is not None or newText != self._displayText:
+            self.polynomialSource = None
+            self._displayText = newText
+            self.needsRedraw = True
         return None
+
+    def updatePolynomial(self, interpolant):
+        ''' Update the bottom menu to display the interpolating polynomial 'interpolant' (see
+            Interpolation.Interpolant). The polynomial string is not generated until the menu is displayed
+        '''
+        self.polynomialSource = interpolant
+        self.needsRedraw = True
+        return None
+
+    def refresh(self):
+        ''' Redraw the bottom menu if anything it displays has changed since it was last drawn. Returns
+            True if the menu was redrawn
+        '''
+        if self.needsRedraw:
+            self.drawBG()
+            self.needsRedraw = False
+            return True
+        return False
         
 
 
+######################
+## Profiler Overlay ##
+######################
+
+# The profiler overlay displays the recent timings of each profiled stage of the frame, so that
+# the user can see where the time of a slow frame went
+class ProfilerOverlay:
+    def __init__(self, screen_size):
+        self.rect = pygame.Rect(0, 0, 330, 0)
+        self.rect.midtop = (screen_size[0] // 2, 4)
+        self.font = None
+        self.lines = []
+        return None
+
+    def update(self):
+        ''' Build the lines of text showing the mean, 95th percentile and maximum time of each profiled
+            stage, and resize the overlay to fit them
+        '''
+        if self.font is None:
+            self.font = getFont("Courier New", 12, bold=True)
+
+        lines = ['{:<28}{:>6}{:>6}{:>6}'.format('stage (ms)', 'mean', 'p95', 'max')]
+        for name in sorted(profiler.stages()):
+            s = profiler.summary(name)
+            lines.append('{:<28}{:>6.2f}{:>6.2f}{:>6.2f}'.format(name[:27], s['mean'], s['p95'], s['max']))
+
+        self.lines = lines
+        self.rect.height = self.font.get_linesize() * len(lines) + 8
+        return None
+
+    def draw(self, screen):
+        ''' Draw the overlay (with the lines built by the last call of update()) onto 'screen'
+        '''
+        lineHeight = self.font.get_linesize()
+
+        background = pygame.Surface(self.rect.size)
+        background.set_alpha(210)
+        background.fill(WHITE)
+        screen.blit(background, self.rect)
+        pygame.draw.rect(screen, BLACK, self.rect, 1)
+
+        y = self.rect.top + 4
+        for line in self.lines:
+            text = self.font.render(line, True, BLACK)
+            screen.blit(text, (self.rect.left + 4, y))
+            y += lineHeight
+        return None
+
+
+################################################################################################
+################################################################################################
+##                                     Curve Class                                            ##
+################################################################################################
+################################################################################################
+
+# A curve is one named set of points on the graph, drawn in its own color with its own curve engine.
+# Each curve samples its polynomial (or spline) with its own sampler, so the divided difference table
+# and polyline of a curve are only calculated again when that curve's points or engine (or the view)
+# change. Editing one curve never recalculates the others
+class Curve:
+    def __init__(self, index, threadedSampling=False):
+        self.name = CURVE_NAMES[index]
+        self.color, pointColor = CURVE_COLORS[index]
+
+        # Store holding the curve's points
+        self.points = PointStore(color=pointColor)
+
+        # Curve used to interpolate the points (one of Interpolation.ENGINES)
+        self.engine = ENGINES[0]
+
+        # Samples the curve, either on a background thread or when sample() is called
+        if threadedSampling:
+            self.sampler = CurveWorker()
+        else:
+            self.sampler = CurveSampler()
+        self.lastCurveRequest = None
+
+        # CurveResult returned by the last call of sample(), which is the one that is drawn
+        self.result = None
+
+        # Message for the bottom menu when the curve can't be drawn (None if it can)
+        self.message = None
+
+        # The roots and local extrema of the polynomial are found once for each sampled polyline
+        # ('criticalPointsResult' is the CurveResult they were found for)
+        self.criticalPoints = None
+        self.criticalPointsResult = None
+        return None
+
+    def __repr__(self):
+        return f"Curve({self.name}, {self.engine}, {self.points!r})"
+
+    def sample(self, view):
+        ''' Request the curve through the active points to be sampled in 'view' (a ViewTransform), unless
+            that was already requested, and return the most recent CurveResult. Returns None if there is
+            nothing to draw
+        '''
+        self.result = None
+        if len(self.points) == 0:
+            self.message = 'Add points to interpolate'
+            return None
+
+        # Tuples of the x and y coordinates of the active points for polynomial interpolation
+        xs, ys = self.points.activeCoordinates()
+
+        if len(set(xs)) != len(xs): # If the x values of the points are not distinct, then we can't calculate the interpolating polynomial
+            self.message = 'Error: x values must be distinct'
+            return None
+
+        self.message = None
+        if len(xs) == 0: # Every point is being edited in the side menu
+            return None
+
+        request = CurveRequest(xs, ys, view, self.engine)
+        if request != self.lastCurveRequest:
+            self.lastCurveRequest = request
+            self.sampler.submit(request)
+        self.result = self.sampler.latest()
+
+        if self.sampler.error is not None: # The latest request failed, so the last curve that succeeded is shown
+            self.message = f'Error: {self.sampler.error}'
+        return self.result
+
+    def coefficients(self):
+        ''' Returns the Newton coefficients of the polynomial through the active points if they have been
+            calculated (and an empty list otherwise)
+        '''
+        result = self.sampler.latest()
+        if result is not None and result.key == ('newton',) + self.points.activeCoordinates():
+            return result.table.coefficients
+        return []
+
+    def close(self):
+        ''' Stop the curve's sampler
+        '''
+        self.sampler.close()
+        return None
+
+
+################################################################################################
+################################################################################################
+##                                   Viewport Class                                           ##
+################################################################################################
+################################################################################################
+
+# A viewport shows the curves and points of the graph in a smaller window drawn over the graph, with its
+# own offsets and scale: 'zoomSteps' zoom steps further out than the graph (or further in, if it is negative),
+# centered on the world point 'center' (or on the center of the graph's view if 'center' is None). Viewports
+# share the graph's point stores and each curve's divided difference table (or spline): a viewport only
+# evaluates the curves at its own pixel columns (see Sampling.resampleCurve()), so moving a point calculates
+# the table once however many viewports show the curve
+class Viewport(Grid):
+    def __init__(self, graph, rect, zoomSteps=OVERVIEW_ZOOM, center=None):
+        super(Viewport, self).__init__(rect.size)
+        self.graph = graph
+        self.position = pygame.Rect(rect) # Where the viewport is drawn on the window
+        self.zoomSteps = zoomSteps
+        self.center = center
+        self.fontSize = 12
+
+        self.results = [] # CurveResult of each curve sampled in the viewport's view (or None)
+        self.state = None # What the viewport showed when it was last drawn (see self.update())
+        return None
+
+    def sync(self):
+        ''' Update the viewport's offsets and scale to follow the graph's scale and center
+        '''
+        graph = self.graph
+        self.zoomIndex, self.zoomct = graph.zoomIndex, graph.zoomct
+        self.pixelsPerUnit, self.worldScale = graph.pixelsPerUnit, graph.worldScale
+        self.xOffset = self.yOffset = 0
+        for i in range(abs(self.zoomSteps)):
+            self.__zoom__(1 if self.zoomSteps > 0 else 0)
+
+        if self.center is None:
+            cx, cy = graph.convertToWorld(graph.rect.centerx, graph.rect.centery)
+        else:
+            cx, cy = self.center
+        scale = self.pixelsPerUnit / self.worldScale
+        self.xOffset = -cx * scale
+        self.yOffset = -cy * scale
+        return None
+
+    def update(self):
+        ''' Resample the curves whose polynomial changed (or every curve if the view changed), and redraw
+            the viewport if anything it shows changed. Returns True if the viewport was redrawn
+        '''
+        self.sync()
+        view = self.view
+        results = []
+        for index, curve in enumerate(self.graph.curves):
+            source = curve.result
+            old = self.results[index] if index < len(self.results) else None
+            if source is None:
+                results.append(None)
+            elif old is not None and old.table is source.table and old.request.view == view:
+                results.append(old)
+            else:
+                results.append(resampleCurve(source, view))
+
+        state = (view.key(), self.graph.view.key(), tuple(id(result) for result in results),
+                 tuple(self.__pointState__(curve.points) for curve in self.graph.curves))
+        self.results = results
+        if state == self.state:
+            return False
+        self.state = state
+        self.__draw__()
+        return True
+
+    def contains(self, position):
+        return self.position.collidepoint(position)
+
+    def toWorld(self, position):
+        ''' Returns the world coordinates shown at the window position 'position'
+        '''
+        return self.convertToWorld(position[0] - self.position.left, position[1] - self.position.top)
+
+    def __pointState__(self, store):
+        n = len(store)
+        return b''.join(array[:n].tobytes() for array in (store.worldX, store.worldY, store.active, store.selected))
+
+    def __draw__(self):
+        self.__drawGrid__()
+
+        for curve, result in zip(self.graph.curves, self.results):
+            if result is not None:
+                for polyline in result.polylines:
+                    pygame.draw.lines(self.screen, curve.color, False, polyline, 2)
+
+        radius = max(2, Point.radius // 2)
+        for curve in self.graph.curves:
+            store = curve.points
+            n = len(store)
+            xs, ys = self.convertToScreen(store.worldX[:n], store.worldY[:n])
+            for x, y, active, selected in zip(xs.tolist(), ys.tolist(), store.active[:n], store.selected[:n]):
+                if active and self.rect.inflate(2 * radius, 2 * radius).collidepoint(x, y):
+                    pygame.draw.circle(self.screen, GREEN if selected else store.color, (int(x), int(y)), radius, 0)
+
+        # Outline the part of the world the graph shows
+        graph = self.graph
+        left, top = self.convertToScreen(*graph.convertToWorld(0, 0))
+        right, bottom = self.convertToScreen(*graph.convertToWorld(graph.rect.width, graph.rect.height))
+        pygame.draw.rect(self.screen, DARKGREY, pygame.Rect(int(left), int(top), int(right - left), int(bottom - top)), 1)
+
+        pygame.draw.rect(self.screen, BLACK, self.rect, 2)
+        return None
+
+
+################################################################################################
+################################################################################################
+##                                   Compositor Class                                         ##
+################################################################################################
+################################################################################################
+
+# Maximum number of dirty rectangles passed to pygame.display.update(). If more parts of the screen
+# changed, they are merged into the one rectangle containing all of them
+MAXDIRTYRECTS = 32
+
+# Number of pixels around a curve's polyline that are redrawn when the curve changes (the curve is 2 pixels
+# wide and the critical point markers reach 5 pixels from the curve)
+CURVE_MARGIN = 6
+
+
+def polylineBounds(polylines, margin=CURVE_MARGIN):
+    ''' Returns the rect containing every point of 'polylines' (see Sampling.clipPolyline()), grown by
+        'margin' pixels on each side, or None if there are no polylines
+    '''
+    if not polylines:
+        return None
+    points = np.concatenate([np.asarray(polyline) for polyline in polylines])
+    left, top = np.floor(points.min(axis=0)).astype(int) - margin
+    right, bottom = np.ceil(points.max(axis=0)).astype(int) + margin
+    return pygame.Rect(left, top, right - left + 1, bottom - top + 1)
+
+
+# The compositor draws the graph interface onto the main pygame display in layers. From the bottom up:
+#     background        the grid lines (redrawn when the view changes) with the curves drawn over them
+#                       (redrawn when a curve's sampled polyline changes)
+#     points            the points of every curve
+#     viewports         (redrawn when what they show changes, see Viewport.update())
+#     buttons           (see Button.redraw())
+#     side menu         (redrawn when one of its rows changes, see SideMenu.updatePoints())
+#     bottom menu       (redrawn when its text changes, see BottomMenu.refresh())
+#     profiler overlay
+# Each frame, the compositor works out which parts of the screen changed since the last frame (the dirty
+# rectangles) and draws the layers again only inside of them. The dirty rectangles are returned so that
+# only those parts of the window are updated (see pygame.display.update())
+class Compositor:
+    def __init__(self, graph):
+        self.graph = graph
+        self.background = pygame.Surface(graph.rect.size) # The grid with the curves drawn over it
+        self.surface = None # Surface that the last frame was drawn to
+
+        # While the user drags or zooms the graph, the background is drawn on a smaller grid and scaled up
+        # (see self.__drawPreview__())
+        self.previewGrid = None
+        self.interactionTime = None # Time of the last drag or zoom
+        self.preview = False # True if the background was drawn at the render scale
+
+        # State of each layer in the last frame
+        self.view = None # Key of the view the grid was drawn for
+        self.curves = None # List of the form [(result, color, bounds), ...] for each curve
+        self.showCriticalPoints = False
+        # Position (of the center) and sprite of each point that was drawn: pointSprites[i] is the index in
+        # 'palette' of the color of the point at (pointXs[i], pointYs[i])
+        self.pointXs = np.zeros(0, dtype=np.int64)
+        self.pointYs = np.zeros(0, dtype=np.int64)
+        self.pointSprites = np.zeros(0, dtype=np.int64)
+        self.palette = []
+        self.sprites = {} # Dictionary of the form {color: sprite} (see self.__sprite__())
+        self.viewports = [] # Rect of each viewport
+        self.buttons = [] # List of the form [(version, rect, visible), ...] for each button
+        self.menuActive = False
+        self.bottomMenuActive = False
+        self.overlayRect = None
+        return None
+
+    def compose(self, surface):
+        ''' Draw the parts of the graph interface that changed since the last frame onto 'surface'.
+            Everything is drawn the first time (or when 'surface' is a different surface). Returns a list
+            of the rects of 'surface' that were drawn
+        '''
+        dirty = self.__updateBackground__(self.graph.plot())
+        dirty += self.__updatePoints__(surface.get_rect())
+        dirty += self.__updateViewports__()
+        dirty += self.__updateButtons__()
+        dirty += self.__updateMenus__()
+        dirty += self.__updateOverlay__()
+
+        if surface is not self.surface:
+            self.surface = surface
+            dirty = [surface.get_rect()]
+
+        # Clip the dirty rects to the surface, removing empty and repeated rects
+        dirty = [rect.clip(surface.get_rect()) for rect in dirty]
+        dirty = list({tuple(rect): rect for rect in dirty if rect.width and rect.height}.values())
+        if len(dirty) > MAXDIRTYRECTS:
+            dirty = [dirty[0].unionall(dirty[1:])]
+
+        with profiler.stage('Graph.displayToScreen blits'):
+            for rect in dirty:
+                self.__drawLayers__(surface, rect)
+        return dirty
+
+    def interact(self):
+        ''' Called when the user drags or zooms the graph. Until the input settles, the background is drawn
+            at the graph's render scale (see self.__drawPreview__())
+        '''
+        self.interactionTime = perf_counter()
+        return None
+
+    def interacting(self):
+        ''' Returns True if the background should be drawn at the graph's render scale: the render scale is
+            below 1 and the user dragged or zoomed the graph in the last SETTLE_TIME seconds
+        '''
+        if self.graph.renderScale >= 1 or self.interactionTime is None:
+            return False
+        return perf_counter() - self.interactionTime < SETTLE_TIME
+
+    def __updateBackground__(self, results):
+        ''' Redraw the background if the view or one of the curves changed, or the user started or stopped
+            dragging or zooming the graph. 'results' holds the CurveResult of each curve (see Graph.plot()).
+            Returns the dirty rects
+        '''
+        graph = self.graph
+
+        # The grid is drawn slightly differently for an offset of 15 and an offset of 15.0 (which make equal
+        # views), so the type of each value is part of the key
+        view = tuple((type(value), value) for value in graph.view.key())
+        viewChanged = view != self.view
+        self.view = view
+
+        old = self.curves or []
+        changed = [index for index, (curve, result) in enumerate(zip(graph.curves, results))
+                   if index >= len(old) or old[index][0] is not result or old[index][1] != curve.color]
+        changed += range(len(results), len(old)) # Curves that were removed
+        preview = self.interacting()
+        criticalPointsChanged = graph.showCriticalPoints != self.showCriticalPoints
+        if not (viewChanged or changed or criticalPointsChanged or preview != self.preview):
+            return []
+
+        # The grid lines and critical points are timed as stages of their own, so they are drawn and found
+        # before the background stage starts (nested stages would count the same time twice)
+        if preview:
+            self.__drawPreviewGrid__()
+        elif viewChanged or self.preview: # The grid lines were last drawn for another view
+            graph.__drawGrid__() # draw the grid lines to the graph's local screen
+        if graph.showCriticalPoints:
+            for curve, result in zip(graph.curves, results):
+                if result is not None and result.request.engine == 'newton':
+                    graph.criticalPoints(curve, result)
+
+        with profiler.stage('Compositor.background'):
+            if preview:
+                self.__drawPreview__(results)
+            else:
+                self.background.blit(graph.screen, (0, 0))
+                for curve, result in zip(graph.curves, results):
+                    if result is None: # Nothing to draw (or nothing has been sampled yet)
+                        continue
+
+                    # Draw a line between each of the plotted points (the curve is split into several polylines
+                    # where it leaves the screen)
+                    for polyline in result.polylines:
+                        pygame.draw.lines(self.background, curve.color, False, polyline, 2)
+
+                    if graph.showCriticalPoints and result.request.engine == 'newton':
+                        graph.drawCriticalPoints(curve, result, self.background)
+
+        curves = []
+        for index, (curve, result) in enumerate(zip(graph.curves, results)):
+            if index in changed:
+                bounds = polylineBounds(result.polylines) if result is not None else None
+            else:
+                bounds = old[index][2]
+            curves.append((result, curve.color, bounds))
+
+        dirty = []
+        if viewChanged or self.curves is None or criticalPointsChanged or preview or self.preview:
+            dirty.append(graph.rect.copy())
+        else: # Only the parts of the graph covered by the old and new curves changed
+            for index in changed:
+                for state in (old, curves):
+                    if index < len(state) and state[index][2] is not None:
+                        dirty.append(state[index][2].move(graph.rect.topleft))
+
+        self.curves = curves
+        self.showCriticalPoints = graph.showCriticalPoints
+        self.preview = preview
+        return dirty
+
+    def __drawPreviewGrid__(self):
+        ''' Draw the grid lines at the graph's render scale on a smaller grid (see self.__drawPreview__())
+        '''
+        graph = self.graph
+        scale = graph.renderScale
+        size = (max(1, round(graph.rect.width * scale)), max(1, round(graph.rect.height * scale)))
+        if self.previewGrid is None or self.previewGrid.rect.size != size:
+            self.previewGrid = Grid(size)
+
+        # The smaller grid shows the same view as the graph, with every length multiplied by the scale
+        grid = self.previewGrid
+        grid.xOffset = graph.xOffset * scale
+        grid.yOffset = graph.yOffset * scale
+        grid.pixelsPerUnit = graph.pixelsPerUnit * scale
+        grid.worldScale = graph.worldScale
+        grid.fontSize = max(1, round(graph.fontSize * scale))
+        grid.__drawGrid__()
+        return None
+
+    def __drawPreview__(self, results):
+        ''' Draw the curves at the graph's render scale on the smaller grid drawn by self.__drawPreviewGrid__(),
+            and scale it up to the size of the background with the graph's render filter (see RENDER_FILTERS)
+        '''
+        graph = self.graph
+        grid = self.previewGrid
+        scale = graph.renderScale
+        width = max(1, round(2 * scale))
+        for curve, result in zip(graph.curves, results):
+            if result is None:
+                continue
+            for polyline in result.polylines:
+                pygame.draw.lines(grid.screen, curve.color, False, (np.asarray(polyline) * scale).tolist(), width)
+
+            if graph.showCriticalPoints and result.request.engine == 'newton':
+                graph.drawCriticalPoints(curve, result, grid.screen, scale)
+
+        RENDER_FILTERS[graph.renderFilter](grid.screen, graph.rect.size, self.background)
+        return None
+
+    def __updatePoints__(self, screenRect):
+        ''' Find the points of every curve that are drawn (the active points whose circle is inside of
+            'screenRect') and the sprite of each one. Returns the dirty rects of the circles that were added,
+            removed or changed since the last frame
+        '''
+        r = Point.radius
+        left, top, right, bottom = screenRect.left - r, screenRect.top - r, screenRect.right + r, screenRect.bottom + r
+
+        xs, ys, sprites = [], [], []
+        palette = []
+        for curve in self.graph.curves:
+            points = curve.points
+            n = len(points)
+            # Cull the points outside of the screen before converting them to pixels (the screen position
+            # of a point far away from the view may be too large for an integer)
+            sx = points.screenX[:n] + 1
+            sy = points.screenY[:n]
+            visible = points.active[:n] & (sx > left - 1) & (sx < right + 1) & (sy > top - 1) & (sy < bottom + 1)
+
+            xs.append(sx[visible].astype(np.int64))
+            ys.append(sy[visible].astype(np.int64))
+            sprites.append(points.selected[:n][visible] + len(palette)) # (selected points use the second sprite)
+            palette += [points.color, GREEN]
+
+        xs, ys, sprites = np.concatenate(xs), np.concatenate(ys), np.concatenate(sprites)
+        inside = (xs >= left) & (xs <= right) & (ys >= top) & (ys <= bottom)
+        if not inside.all():
+            xs, ys, sprites = xs[inside], ys[inside], sprites[inside]
+
+        if (palette == self.palette and np.array_equal(xs, self.pointXs) and np.array_equal(ys, self.pointYs)
+                and np.array_equal(sprites, self.pointSprites)):
+            return []
+
+        # A circle changed if its position or color is only in one of the frames. Each circle is a row
+        # (x, y and the 24 bit color) and the distinct rows of both frames are compared at once
+        def circles(xs, ys, sprites, palette):
+            colors = np.array([(c[0] << 16) | (c[1] << 8) | c[2] for c in palette] or [0], dtype=np.int64)
+            return np.unique(np.column_stack((xs, ys, colors[sprites])), axis=0)
+        rows, counts = np.unique(np.concatenate((circles(self.pointXs, self.pointYs, self.pointSprites, self.palette),
+                                                 circles(xs, ys, sprites, palette))), axis=0, return_counts=True)
+        changed = rows[counts == 1]
+        changedXs, changedYs = changed[:, 0], changed[:, 1]
+
+        self.pointXs, self.pointYs, self.pointSprites, self.palette = xs, ys, sprites, palette
+
+        if len(changed) > MAXDIRTYRECTS: # Redraw the rect containing every changed circle
+            x0, y0 = int(changedXs.min()) - r, int(changedYs.min()) - r
+            return [pygame.Rect(x0, y0, int(changedXs.max()) + r + 1 - x0, int(changedYs.max()) + r + 1 - y0)]
+        return [pygame.Rect(x - r, y - r, 2 * r + 1, 2 * r + 1) for x, y in zip(changedXs.tolist(), changedYs.tolist())]
+
+    def __sprite__(self, color):
+        ''' Returns the sprite of a point drawn in 'color' (a circle with a transparent background). The
+            circle is drawn once for each color
+        '''
+        sprite = self.sprites.get(color)
+        if sprite is None:
+            r = Point.radius
+            key = (255, 0, 255) if color != (255, 0, 255) else (0, 255, 0)
+            sprite = pygame.Surface((2 * r + 3, 2 * r + 3))
+            sprite.fill(key)
+            pygame.draw.circle(sprite, color, (r + 1, r + 1), r, 0)
+            sprite.set_colorkey(key, pygame.RLEACCEL)
+            self.sprites[color] = sprite
+        return sprite
+
+    def __updateViewports__(self):
+        ''' Returns the rects of the viewports that were redrawn, added or removed since the last frame
+        '''
+        dirty = []
+        viewports = []
+        for viewport in self.graph.viewports:
+            if viewport.update() or viewport.position not in self.viewports:
+                dirty.append(viewport.position.copy())
+            viewports.append(viewport.position.copy())
+        dirty += [rect for rect in self.viewports if rect not in viewports]
+        self.viewports = viewports
+        return dirty
+
+    def __updateButtons__(self):
+        ''' Returns the dirty rects of the buttons that were redrawn, moved, shown or hidden since the last frame
+        '''
+        graph = self.graph
+        buttons = []
+        for button in graph.buttons:
+            visible = not (type(button) == deletePointButton and graph.selectedPoint is None)
+            buttons.append((button.version, tuple(button.rect), visible))
+
+        dirty = []
+        for old, new in zip(self.buttons, buttons):
+            if old != new:
+                dirty += [pygame.Rect(old[1]), pygame.Rect(new[1])]
+        self.buttons = buttons
+        return dirty
+
+    def __updateMenus__(self):
+        ''' Update the side and bottom menus. Returns the dirty rects of the parts of the menus that were
+            redrawn, opened or closed since the last frame
+        '''
+        graph = self.graph
+        dirty = []
+
+        menu = graph.menu
+        if menu.active:
+            changed = menu.updatePoints(graph.curves, graph.activeCurve)
+            dirty += changed if self.menuActive else [menu.rect.copy()]
+        elif self.menuActive:
+            dirty.append(menu.rect.copy())
+        self.menuActive = menu.active
+
+        bottomMenu = graph.bottomMenu
+        if bottomMenu.active:
+            redrawn = bottomMenu.refresh() # Redraw the bottom menu only if its contents changed
+            if redrawn or not self.bottomMenuActive:
+                dirty.append(bottomMenu.rect.copy())
+        elif self.bottomMenuActive:
+            dirty.append(bottomMenu.rect.copy())
+        self.bottomMenuActive = bottomMenu.active
+        return dirty
+
+    def __updateOverlay__(self):
+        ''' Update the profiler overlay. Its timings change every frame, so the whole overlay is dirty
+            while it is visible
+        '''
+        overlay = self.graph.profilerOverlay
+        dirty = [self.overlayRect] if self.overlayRect is not None else []
+        self.overlayRect = None
+        if profiler.overlayVisible:
+            overlay.update()
+            self.overlayRect = overlay.rect.copy()
+            dirty.append(self.overlayRect)
+        return dirty
+
+    def __drawLayers__(self, surface, rect):
+        ''' Draw every layer of the graph interface onto 'surface' inside of 'rect'
+        '''
+        graph = self.graph
+        surface.set_clip(rect)
+
+        # copy the background (grid and curves) to the main pygame display
+        surface.blit(self.background, rect, rect.move(-graph.rect.left, -graph.rect.top))
+
+        # Draw the points that overlap the rect with one call, using a sprite for each color
+        r = Point.radius
+        xs, ys = self.pointXs, self.pointYs
+        overlap = (xs >= rect.left - r) & (xs <= rect.right + r) & (ys >= rect.top - r) & (ys <= rect.bottom + r)
+        if overlap.any():
+            sprites = np.empty(len(self.palette), dtype=object)
+            sprites[:] = [self.__sprite__(color) for color in self.palette]
+            positions = np.column_stack((xs[overlap] - r - 1, ys[overlap] - r - 1)).tolist()
+            surface.blits(zip(sprites[self.pointSprites[overlap]].tolist(), positions), False)
+
+        for viewport in graph.viewports:
+            if viewport.position.colliderect(rect):
+                surface.blit(viewport.screen, viewport.position)
+
+        for button, (version, buttonRect, visible) in zip(graph.buttons, self.buttons):
+            if visible and button.rect.colliderect(rect):
+                surface.blit(button.screen, button.rect)
+
+        for menu in (graph.menu, graph.bottomMenu):
+            if menu.active and menu.rect.colliderect(rect):
+                surface.blit(menu.screen, menu.rect)
+
+        # If the profiler overlay is visible, draw it on top of everything else
+        if self.overlayRect is not None and self.overlayRect.colliderect(rect):
+            graph.profilerOverlay.draw(surface)
+
+        surface.set_clip(None)
+        return None
+
+
 ################################################################################################
 ################################################################################################
 ##                                     Graph Class                                            ##
@@ -935,15 +1964,68 @@ class BottomMenu:
 ################################################################################################
 
 
+# A view transaction changes the view of the graph in several steps (zooms and moves), and then updates
+# the graph for the new view once: when the transaction ends, every point is projected to its new screen
+# position and each curve is sampled for the new view. Transactions are used with the 'with' statement:
+#
+#     with graph.viewTransaction() as view:
+#         view.zoom(0)
+#         view.move(dx, dy)
+#
+# A transaction opened while another one is open joins it, so the graph is only updated when the
+# outermost transaction ends
+class ViewTransaction:
+    def __init__(self, graph):
+        self.graph = graph
+        self.depth = 0 # Number of 'with' statements using the transaction
+        return None
+
+    def __enter__(self):
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0:
+            self.graph.transaction = None
+            self.commit()
+        return False
+
+    def zoom(self, zoomType):
+        ''' Zoom the view in (zoomType = 0) or out (zoomType = 1) by a single step (see Grid.__zoom__())
+        '''
+        self.graph.__zoom__(zoomType)
+        return None
+
+    def move(self, dx, dy):
+        ''' Move the view by (dx, dy) pixels (see Grid.updatePosition())
+        '''
+        self.graph.updatePosition(dx, dy)
+        return None
+
+    @profiled('ViewTransaction.commit')
+    def commit(self):
+        ''' Update the screen position of every point and request every curve to be sampled for the new view
+        '''
+        graph = self.graph
+        for curve in graph.curves:
+            curve.points.project(graph)
+            curve.sample(graph.view)
+        return None
+
+
 # Graph class extends the grid class in order to provide the graph interface,
-# including the grid lines, labeled axes, buttons, and points
+# including the grid lines, labeled axes, buttons, and points. The graph holds one or
+# more curves (see Curve). Points are added to, edited on and deleted from the active curve
 class Graph(Grid):
-    def __init__(self, screen_size):
+    def __init__(self, screen_size, threadedSampling=False):
         # Call parent class (grid) __init__() to set up the graph display
         super(Graph, self).__init__(screen_size)
 
-        # List of points
-        self.points = []
+        # Curves on the graph, and the index of the curve being edited
+        self.threadedSampling = threadedSampling
+        self.curves = [Curve(0, threadedSampling)]
+        self.activeCurve = 0
 
         # List of buttons
         self.buttons = []
@@ -953,6 +2035,7 @@ class Graph(Grid):
         self.buttons.append(clearButton(self.clearAllPoints, screen_size))
         self.buttons.append(zoomInButton(self.zoomIn, screen_size))
         self.buttons.append(zoomOutButton(self.zoomOut, screen_size))
+        self.buttons.append(curveEngineButton(self.nextEngine, screen_size))
         self.buttons.append(openBottomMenuButton(self.toggleBottomMenu, screen_size))
         self.buttons.append(deletePointButton(self.deleteSelectedPoint, screen_size))
         self.buttons.append(openMenuButton(self.toggleMenu, screen_size))
@@ -962,6 +2045,37 @@ class Graph(Grid):
         self.menu = SideMenu(screen_size)
         # Create bottom menu
         self.bottomMenu = BottomMenu(screen_size)
+        # Create profiler overlay (only drawn when toggled on)
+        self.profilerOverlay = ProfilerOverlay(screen_size)
+        # Smaller views of the graph drawn over it (see Viewport). The overview is shown when toggled on
+        self.viewports = []
+        size = round(min(screen_size) * OVERVIEW_SIZE)
+        self.overview = Viewport(self, pygame.Rect(10, screen_size[1] - size - 10, size, size))
+
+        # Draws the interface to the window, one layer at a time (see Compositor)
+        self.compositor = Compositor(self)
+
+        # Undo/redo history of the curves and view (see History.py and self.recordHistory())
+        self.history = History(Snapshot((CurveSnapshot(PersistentVector(), self.engine),), self.viewState()))
+
+        # 'interpolationKey' holds the coordinates of the points that 'interpolant' (the Interpolant or
+        # Spline of the active curve shown in the bottom menu) was calculated from
+        self.interpolationKey = None
+        self.interpolant = None
+
+        # When True, the roots and local extrema of the polynomials are marked on the graph
+        self.showCriticalPoints = False
+
+        # Resolution the grid and curves are drawn at while the graph is dragged or zoomed, and the filter
+        # that scales them up (see RENDER_SCALE and Compositor.__drawPreview__())
+        self.renderScale = RENDER_SCALE
+        self.renderFilter = 'smooth'
+
+        # The open view transaction (see self.viewTransaction())
+        self.transaction = None
+
+        # File the session is saved to and loaded from (see saveSession())
+        self.sessionPath = DEFAULT_SESSION_PATH
 
         # Useful state information
         self.currentClickedPoint = None
@@ -971,96 +2085,111 @@ class Graph(Grid):
         self.objectClickedOn = 0
         return None
 
+    @property
+    def curve(self):
+        ''' The curve being edited
+        '''
+        return self.curves[self.activeCurve]
+
+    @property
+    def points(self):
+        ''' Store holding the points of the curve being edited
+        '''
+        return self.curve.points
+
+    @property
+    def engine(self):
+        ''' Curve engine of the curve being edited
+        '''
+        return self.curve.engine
+
+    def close(self):
+        ''' Stop the sampler of every curve
+        '''
+        for curve in self.curves:
+            curve.close()
+        return None
+
     ####################################
     #  Methods for rendering the graph #
     ####################################
 
     def displayToScreen(self, screen):
-        ''' Copy the graph's local screen onto the main pygame display 'screen'
-            in order to display the graphical interface to the window
+        ''' Draw the graphical interface onto the main pygame display 'screen'. Only the parts of the
+            interface that changed since the last frame are drawn again (see Compositor). Returns a list
+            of the rects of 'screen' that changed, to be passed to pygame.display.update()
         '''
-        self.__drawGrid__() # draw the grid lines to the graph's local screen
-        self.plot() # Plot the interpolating polynomial to the graph's local screen
-        screen.blit(self.screen, self.rect) # copy the graph's local screen to the main pygame display
+        return self.compositor.compose(screen)
 
-        # Iterate through the points and draw them to the main pygame display
-        for point in self.points:
-            if point.active:
-                x,y = point.screenPos
-                pygame.draw.circle(screen, point.color, (int(x+1), int(y)), 5, 0)
+    # Important: This method draws the interpolating polynomial
+    def plot(self):
+        ''' This function samples the interpolating polynomial of each curve (see Sampling.py) by plotting a
+            point for every pixel in the screen using the calculated interpolating polynomial. Returns a list
+            holding the CurveResult of each curve (or None if there is nothing to draw), whose polylines are
+            drawn by the compositor.
 
-        # Iterate through the buttons and draw them to the main pygame display
-        for button in self.buttons:
-            if type(button) == deletePointButton and self.selectedPoint is None:
+            If the graph uses a background sampling thread, the most recent finished polyline is returned,
+            which may be a frame or two behind the current points and view
+        '''
+        current = self.history.current
+        results = []
+        for index, curve in enumerate(self.curves):
+            # Request the curve to be sampled for its current points and the view (unless that was already requested)
+            result = curve.sample(self.view)
+            results.append(result)
+
+            if index == self.activeCurve and curve.message is not None: # The bottom menu explains why there is no curve
+                self.interpolationKey = None
+                self.bottomMenu.updateDisplay(curve.message)
+
+            if result is None: # Nothing to draw (or nothing has been sampled yet)
                 continue
-            screen.blit(button.screen, button.rect)
 
-        # If the side menu is active, draw it to the main pygame display
-        if self.menu.active:
-            self.menu.updatePoints(self.points)
-            screen.blit(self.menu.screen, self.menu.rect)
-
-        # If the bottom menu is active, draw it to the main pygame display
-        if self.bottomMenu.active:
-            screen.blit(self.bottomMenu.screen, self.bottomMenu.rect)
-        return None
+            if index < len(current.curves):
+                snapshot = current.curves[index]
+                if snapshot.result is None and snapshot.matches(result.request, current.view):
+                    snapshot.result = result # Remember the curve of this state so undo/redo can show it again
 
-    # Important: This method draws the interpolating polynomial
-    def plot(self):
-        ''' This function draws the interpolating polynomial to the screen. It does so by plotting
-            a point for every pixel in the screen using the calculated interpolating polynomial and
-            then draws a tiny line between each of these points
-        '''
-        if len(self.points) >= 1:
-            # 'data' is a list of the form: [(x1, f(x1)), (x1, f(x1)), ...], where each tuple (xi, f(xi))
-            # represents a coordinate in screen space to be drawn to the screen
-            data = []
-
-            # A list of the x coordinates of the points for polynomial interpolation
-            xs = []
-            # A list of the y coordinates of the points for polynomial interpolation
-            ys = []
-
-            for point in self.points:
-                if point.active:
-                    x,y = point.coordinates
-
-                    if x in xs: # If the x values of the points are not distinct, then we can't calculate the interpolating polynomial
-                        self.bottomMenu.updateDisplay('Error: x values must be distinct')
-                        return None
-
-                    xs.append(x)
-                    ys.append(y)
-
-            # Calculate the divided difference table based on Newton's polynomial interpolation method
-            dividedDifferenceTable = newtonsIP(xs, ys)
-
-            # generate the interpolation polynomial display string
-            polynomialDisplay = getPolynomialString(xs, dividedDifferenceTable)
-            # Update the bottom menu to display the interpolating polynomial
-            self.bottomMenu.updateDisplay(polynomialDisplay)
-        
-            # sx1, sx2 define the range of points to be plotted. sx1 is the x coordinate of the leftmost pixel
-            # in screen space, and x2 is the x coordinate of the rightmost pixel in screen space
-            sx1, sx2 = self.rect.left, self.rect.right
+            if index == self.activeCurve and result.key != self.interpolationKey: # The polynomial changed since it was last shown
+                self.interpolationKey = result.key
+                self.interpolant = result.table
 
-            # sx stands for 'screen x', which is the x coordinate in screen space to be plotted
-            for sx in range(sx1, sx2): # iterate from sx1 to sx2
-                wx = self.convertToWorld(sx, 0)[0] # convert current screen coordinate 'sx' to a world space coordinate 'wx'
-
-                # This following line evaluates the interpolating polynomial at world coordinate 'wx'
-                wy = evaluatePolynomial(wx, xs, dividedDifferenceTable)
-                # store (screen space x, screen space f(x)) in a tuple called 'c'
-                c = (sx, self.convertToScreen(0, wy)[1])
-                # append the coordinate 'c' to the list of coordinates 'data'
-                data.append(c)
+                if result.request.engine == 'newton':
+                    # Update the bottom menu to display the interpolating polynomial. The display string is
+                    # generated the next time the bottom menu is drawn
+                    self.bottomMenu.updatePolynomial(result.table)
+                else:
+                    self.bottomMenu.updateDisplay(f'S(x) = {result.request.engine} cubic spline through {len(result.request.xs)} points')
 
-            # Draw a line between each of the plotted points
-            pygame.draw.lines(self.screen, RED, False, data, 2)
+        return results
 
-        else: # If there are no points: display this message in the bottom menu
-            self.bottomMenu.updateDisplay('Add points to interpolate')
+    def criticalPoints(self, curve, result):
+        ''' Returns (roots, minima, maxima) of the polynomial of 'curve' inside the sampled range of 'result'
+            (a CurveResult from the curve's sampler). They are only found again when the result changes
+        '''
+        if result is not curve.criticalPointsResult:
+            curve.criticalPointsResult = result
+            with profiler.stage('findCriticalPoints'):
+                curve.criticalPoints = findCriticalPoints(result.worldXs, result.worldYs,
+                                                          result.request.xs, result.table.coefficients)
+        return curve.criticalPoints
+
+    def drawCriticalPoints(self, curve, result, surface, scale=1):
+        ''' Mark the roots (circles) and local extrema (squares) of the polynomial of 'curve' that are inside
+            the sampled range of 'result' (a CurveResult from the curve's sampler) on 'surface'. 'scale' is
+            the size of 'surface' relative to the graph. Only the points inside the view are marked (an
+            extremum can be far too large to convert to pixels)
+        '''
+        roots, minima, maxima = self.criticalPoints(curve, result)
+        radius, size, width = (max(1, round(length * scale)) for length in (5, 9, 2))
+        for sx, sy in zip(*visibleMarkers(roots, np.zeros(len(roots)), self.view, size)):
+            pygame.draw.circle(surface, BLACK, (int(sx * scale), int(sy * scale)), radius, width)
 
+        for extrema in (minima, maxima):
+            if len(extrema) == 0:
+                continue
+            for sx, sy in zip(*visibleMarkers(extrema, result.table(extrema), self.view, size)):
+                pygame.draw.rect(surface, BLACK, pygame.Rect(int(sx * scale) - size // 2, int(sy * scale) - size // 2, size, size), width)
         return None
 
     ##################################
@@ -1072,45 +2201,304 @@ class Graph(Grid):
     def reset(self):
         ''' Resets the position and scale of the graph back to the default.
             It does this by reversing the current zoom, and setting the offset
-            to 0
+            to 0. The graph is only updated for the default view once (see ViewTransaction)
         '''
         if self.zoomct < 2:
             zoomType = 0
         else:
             zoomType = 1
-        for i in range(abs(self.zoomct - 2)):
-            self.zoom(zoomType)
-        
-        self.dragScreen(-self.xOffset, self.yOffset)
+        with self.viewTransaction() as view:
+            for i in range(abs(self.zoomct - 2)):
+                view.zoom(zoomType)
+
+            view.move(-self.xOffset, self.yOffset)
+        self.recordHistory('view')
         return None
 
+    def nextEngine(self):
+        ''' Switch the active curve to the next curve engine (Newton's interpolating polynomial, natural
+            cubic spline, clamped cubic spline). A spline with more than 'MAXPOINTS' points can't be switched
+            back to Newton's polynomial, and the bottom menu explains why. Returns the new engine
+        '''
+        engine = ENGINES[(ENGINES.index(self.engine) + 1) % len(ENGINES)]
+        if engine == 'newton' and len(self.points) > MAXPOINTS:
+            self.bottomMenu.updateDisplay(f"Error: Newton's polynomial can't use more than {MAXPOINTS} points")
+            return self.engine
+
+        self.setEngine(engine)
+        self.recordHistory('engine')
+        return self.engine
+
     def clearAllPoints(self):
-        ''' Deletes all of the user-created points from the graph
+        ''' Deletes all of the user-created points from the active curve
         '''
-        self.points = []
+        hadPoints = len(self.points) > 0
+        self.points.clear()
+        self.selectedPoint = None
+        if hadPoints:
+            self.recordHistory('clear')
+        return None
+
+    def saveSession(self, path=None):
+        ''' Save the curves and view of the graph to the session file 'path' (or self.sessionPath). The
+            Newton coefficients of each curve are saved too if they have been calculated for its current points
+        '''
+        if path is None:
+            path = self.sessionPath
+
+        curves = []
+        for curve in self.curves:
+            points = curve.points
+            n = len(points)
+            curves.append(CurveData(curve.engine, points.worldX[:n], points.worldY[:n], points.active[:n],
+                                    curve.coefficients()))
+
+        session = Session(self.xOffset, self.yOffset, self.pixelsPerUnit, self.worldScale, self.zoomIndex,
+                          self.zoomct, self.activeCurve, curves)
+        saveSession(path, session)
+        return None
+
+    def loadSession(self, path=None):
+        ''' Replace the curves and view of the graph with the session in the file 'path' (or self.sessionPath).
+            If the session holds the Newton coefficients of a curve, its polynomial is not calculated again
+        '''
+        if path is None:
+            path = self.sessionPath
+        session = loadSession(path)
+        if not 0 < len(session.curves) <= MAXCURVES:
+            raise ValueError(f"A session must have between 1 and {MAXCURVES} curves")
+
+        self.xOffset = session.xOffset
+        self.yOffset = session.yOffset
+        self.pixelsPerUnit = session.pixelsPerUnit
+        self.worldScale = session.worldScale
+        self.zoomIndex = session.zoomIndex
+        self.zoomct = session.zoomct
+
+        self.setCurveCount(len(session.curves))
+        for curve, data in zip(self.curves, session.curves):
+            curve.engine = data.engine
+            curve.points.load(data.worldX, data.worldY, data.active)
+            curve.points.project(self)
+            curve.lastCurveRequest = None
+
+            xs, ys = curve.points.activeCoordinates()
+            if len(data.coefficients) == len(xs) > 0:
+                curve.sampler.preload(('newton', xs, ys), Interpolant(xs, data.coefficients))
+
+        self.currentClickedPoint = None
         self.selectedPoint = None
+        self.menu.selected = None
+        self.selectCurve(min(session.activeCurve, len(self.curves) - 1))
+
+        self.recordHistory('all')
+        return None
+
+    ###################################
+    #         Curve Methods           #
+    ###################################
+
+    def addCurve(self):
+        ''' Add a new curve to the graph (up to 'MAXCURVES' curves) and make it the active curve.
+            Returns True if a curve was added and False otherwise
+        '''
+        if len(self.curves) == MAXCURVES:
+            return False
+        self.curves.append(Curve(len(self.curves), self.threadedSampling))
+        self.selectCurve(len(self.curves) - 1)
+        self.recordHistory('curve')
+        return True
+
+    def selectCurve(self, index):
+        ''' Make the curve at 'index' the active curve. Points of the other curves are deselected
+        '''
+        if index != self.activeCurve:
+            self.deselectPoints()
+            self.menu.selected = None
+            self.activeCurve = index
+            self.interpolationKey = None # Show the new curve's polynomial in the bottom menu
+        self.setEngine(self.curve.engine)
+        return None
+
+    def nextCurve(self):
+        ''' Make the next curve the active curve
+        '''
+        self.selectCurve((self.activeCurve + 1) % len(self.curves))
+        return None
+
+    def setCurveCount(self, count):
+        ''' Add or remove curves from the end of the graph's curves until there are 'count' curves
+        '''
+        while len(self.curves) > count:
+            self.curves.pop().close()
+        while len(self.curves) < count:
+            self.curves.append(Curve(len(self.curves), self.threadedSampling))
+        if self.activeCurve >= count:
+            self.activeCurve = count - 1
+            self.interpolationKey = None
+        return None
+
+    def curveOf(self, point):
+        ''' Returns the index of the curve holding 'point'
+        '''
+        for index, curve in enumerate(self.curves):
+            if curve.points is point.store:
+                return index
+        return None
+
+    def pointAt(self, position):
+        ''' Returns the first active point of any curve within a point's radius of the screen space 'position'
+            (or None if there is no such point). The points of the active curve are checked first
+        '''
+        order = [self.activeCurve] + [i for i in range(len(self.curves)) if i != self.activeCurve]
+        for index in order:
+            point = self.curves[index].points.pointAt(position, Point.radius)
+            if point is not None:
+                return point
+        return None
+
+    ###################################
+    #     Undo/Redo History Methods   #
+    ###################################
+
+    def viewState(self):
+        ''' Returns the tuple (xOffset, yOffset, pixelsPerUnit, worldScale, zoomIndex, zoomct) describing the view
+        '''
+        return (self.xOffset, self.yOffset, self.pixelsPerUnit, self.worldScale, self.zoomIndex, self.zoomct)
+
+    def recordHistory(self, change, index=None, coalesce=None):
+        ''' Add the current state of the graph to the undo history. 'change' describes what changed since
+            the last recorded state (on the active curve, unless stated otherwise):
+                'add'       a point was added to the end of the points
+                'set'       the point at 'index' was moved or edited
+                'delete'    the point at 'index' was deleted
+                'clear'     every point was deleted
+                'engine'    the curve engine changed
+                'curve'     a curve was added to the end of the curves
+                'all'       any of the points of any curve may have changed
+                'view'      only the view changed
+            Only the points that changed (see PointStore.changed) are copied into the new snapshot, so recording
+            a change takes time proportional to the number of changed points. Curves that didn't change
+            share their snapshot (and the curve drawn for it) with the previous state. Changes recorded
+            one after another with the same 'coalesce' value are undone as a single step
+        '''
+        current = self.history.current
+
+        if change == 'all':
+            curves = [CurveSnapshot(PersistentVector.fromList(curve.points.state(i) for i in range(len(curve.points))),
+                                    curve.engine) for curve in self.curves]
+            for curve in self.curves:
+                curve.points.changed.clear()
+        else:
+            curves = []
+            for i, (curve, snapshot) in enumerate(zip(self.curves, current.curves)):
+                points = snapshot.points
+                if i == self.activeCurve:
+                    if change == 'add':
+                        points = points.append(curve.points.state(len(curve.points) - 1))
+                    elif change == 'delete':
+                        points = points.delete(index)
+                    elif change == 'clear':
+                        points = PersistentVector()
+
+                # Dragging the graph (even by 0 pixels while clicking) recalculates the world coordinates of
+                # every point from its screen position, which may round them (see PointStore.translate()), so
+                # every changed point that differs from the snapshot is updated. This includes the point changed by 'set'
+                for j in sorted(curve.points.changed):
+                    if j < len(points) and curve.points.state(j) != points[j]:
+                        points = points.set(j, curve.points.state(j))
+                curve.points.changed.clear()
+
+                # The curve drawn for the old snapshot doesn't match a new view
+                if change == 'view' or points is not snapshot.points or curve.engine != snapshot.engine:
+                    snapshot = CurveSnapshot(points, curve.engine)
+                curves.append(snapshot)
+
+            if change == 'curve':
+                curves.append(CurveSnapshot(PersistentVector(), self.curves[-1].engine))
+
+        self.history.record(Snapshot(tuple(curves), self.viewState(), self.activeCurve), coalesce)
+        return None
+
+    def restoreSnapshot(self, snapshot):
+        ''' Set the curves and view of the graph to those of 'snapshot'. If the snapshot's curves were
+            drawn before, they are shown again without being calculated
+        '''
+        (self.xOffset, self.yOffset, self.pixelsPerUnit, self.worldScale,
+         self.zoomIndex, self.zoomct) = snapshot.view
+
+        self.setCurveCount(len(snapshot.curves))
+        for curve, curveSnapshot in zip(self.curves, snapshot.curves):
+            curve.engine = curveSnapshot.engine
+            states = list(curveSnapshot.points)
+            curve.points.load([s[0] for s in states], [s[1] for s in states], [s[2] for s in states])
+            curve.points.changed.clear() # The points match the snapshot
+            curve.points.project(self)
+
+            if curveSnapshot.result is not None:
+                curve.sampler.show(curveSnapshot.result)
+                curve.lastCurveRequest = curveSnapshot.result.request
+            else:
+                curve.lastCurveRequest = None
+
+        self.currentClickedPoint = None
+        self.selectedPoint = None
+        self.menu.selected = None
+        self.selectCurve(snapshot.active)
+        return None
+
+    def undo(self):
+        ''' Undo the most recent change to the points or view
+        '''
+        snapshot = self.history.undo()
+        if snapshot is not None:
+            self.restoreSnapshot(snapshot)
+        return None
+
+    def redo(self):
+        ''' Redo the most recently undone change
+        '''
+        snapshot = self.history.redo()
+        if snapshot is not None:
+            self.restoreSnapshot(snapshot)
+        return None
+
+    def setEngine(self, engine):
+        ''' Switch the active curve to the curve engine 'engine' and update the curve engine button
+        '''
+        self.curve.engine = engine
+        for button in self.buttons:
+            if isinstance(button, curveEngineButton) and button.engine != engine:
+                button.engine = engine
+                button.redraw()
         return None
 
     def zoomIn(self):
         ''' self.zoomIn() implements the functionality of the 'zoom in' button at the
-            top right of the graph. It uses the self.zoom() function to avoid redundancy of code
+            top right of the graph. The four zoom steps are applied in a single view transaction
         '''
-        for i in range(4):
-            self.zoom(0)
+        with self.viewTransaction() as view:
+            for i in range(4):
+                view.zoom(0)
+        self.recordHistory('view')
 
     def zoomOut(self):
         ''' self.zoomOut() implements the functionality of the 'zoom out' button at the
-            top right of the graph. It uses the self.zoom() function to avoid redundancy of code
+            top right of the graph. The four zoom steps are applied in a single view transaction
         '''
-        for i in range(4):
-            self.zoom(1)
+        with self.viewTransaction() as view:
+            for i in range(4):
+                view.zoom(1)
+        self.recordHistory('view')
 
     def deleteSelectedPoint(self):
         ''' Delete the currently selected point
         '''
         if self.selectedPoint is not None:
+            index = self.selectedPoint.index
             self.points.remove(self.selectedPoint)
             self.selectedPoint = None
+            self.recordHistory('delete', index)
         return None
 
     def toggleMenu(self):
@@ -1129,6 +2517,25 @@ class Graph(Grid):
             deletePointButton.rect.left -= self.menu.rect.width - 42
         return None
 
+    def toggleOverview(self):
+        ''' Show/hide the overview of the graph (see Viewport)
+        '''
+        if self.overview in self.viewports:
+            self.viewports.remove(self.overview)
+        else:
+            self.viewports.append(self.overview)
+        return None
+
+    def centerOn(self, x, y):
+        ''' Move the view so that the world coordinates (x, y) are at the center of the graph
+        '''
+        scale = self.pixelsPerUnit / self.worldScale
+        cx, cy = self.convertToWorld(self.rect.centerx, self.rect.centery)
+        with self.viewTransaction() as view:
+            view.move((cx - x) * scale, (y - cy) * scale)
+        self.recordHistory('view')
+        return None
+
     def toggleBottomMenu(self):
         ''' Open/close the bottom menu
         '''
@@ -1154,8 +2561,9 @@ class Graph(Grid):
         return None
 
     def selectPoint(self, point):
-        ''' Select (or deselect) a single point specified by 'point'
+        ''' Select (or deselect) a single point specified by 'point'. The point's curve becomes the active curve
         '''
+        self.selectCurve(self.curveOf(point))
         point.select()
         if point.selected == True:
             self.selectedPoint = point
@@ -1167,13 +2575,15 @@ class Graph(Grid):
     def deselectPoints(self):
         ''' Deselect all points
         '''
-        for point in self.points:
-            point.select(False)
+        for curve in self.curves:
+            for point in curve.points:
+                point.select(False)
         self.selectedPoint = None
 
     def addPoint(self, x=math.inf, y=math.inf):
         ''' This method adds a new point to the graph at the specified x and y coordinates
-            (in screen space). This method will only add up to 'MAXPOINTS' points
+            (in screen space) on the active curve. This method will only add up to 'MAXPOINTS' points
+            to a curve ('MAXSPLINEPOINTS' points when the curve is a cubic spline)
 
             Returns True if a point was added and False otherwise
         '''
@@ -1181,7 +2591,8 @@ class Graph(Grid):
         if not addPointButton.selected:
             return False
         
-        if len(self.points) < MAXPOINTS:
+        maxPoints = MAXPOINTS if self.engine == 'newton' else MAXSPLINEPOINTS
+        if len(self.points) < maxPoints:
             if x != math.inf and y != math.inf:
                 sx, sy = x,y
                 wx, wy = self.convertToWorld(sx, sy)
@@ -1189,10 +2600,9 @@ class Graph(Grid):
                 sx, sy = (self.rect.width // 2, self.rect.height // 2)
                 wx, wy = self.convertToWorld(sx, sy)
 
-            p = Point((wx, wy), (sx, sy))
+            p = self.points.add((wx, wy), (sx, sy))
             p.snapToGrid(self)
-
-            self.points.append(p)
+            self.recordHistory('add')
         return True
     ##################################
     #        Input Methods:          #
@@ -1206,27 +2616,35 @@ class Graph(Grid):
             always located at the correct world coordinates and screen position
         '''
         self.updatePosition(dx, dy)
+        self.compositor.interact()
         self.plot()
 
-        for point in self.points:
-            point.update(self, dx, dy)
+        # Move every point of every curve with the graph (see Point.update())
+        for curve in self.curves:
+            curve.points.translate(self, dx, dy)
 
         return None
 
     def zoom(self, zoomType):
         ''' self.zoom implements a single zoom in/out, based on the grid.__zoom__() implementation.
-            This function is called from 3 different sources: the self.zoomIn() function, self.zoomOut()
-            function, and it is called for every movement of the user's mouse scroll wheel
+            It is called for every movement of the user's mouse scroll wheel (the zoom buttons apply
+            several zoom steps in one view transaction instead)
 
             Both the graph's grid lines and each point's position must be updated based on the new scale
+            (see ViewTransaction.commit())
         '''
-        self.__zoom__(zoomType)
-        for point in self.points:
-            px, py = point.coordinates
-            point.screenPos = self.convertToScreen(px, py)
-        self.plot()
+        with self.viewTransaction() as view:
+            view.zoom(zoomType)
+        self.compositor.interact()
         return None
 
+    def viewTransaction(self):
+        ''' Returns the open view transaction, or a new one if no transaction is open (see ViewTransaction)
+        '''
+        if self.transaction is None:
+            self.transaction = ViewTransaction(self)
+        return self.transaction
+
 
 ################################################################################################
 ################################################################################################
@@ -1237,8 +2655,8 @@ class Graph(Grid):
 # The input manager class reads and handles user input events based on the type of input and the
 # graph's internal state (which menus are active, etc.)
 class InputManager:
-    def __init__(self, screen_size):
-        self.graph = Graph(screen_size)
+    def __init__(self, screen_size, threadedSampling=False):
+        self.graph = Graph(screen_size, threadedSampling)
 
         self.mouseIsDown = False
         self.objectClickedOn = None
@@ -1255,11 +2673,11 @@ class InputManager:
                 1. button
                 2. bottom menu
                 3. side menu
-                4. point
+                4. viewport (the most recently added first)
+                5. point (of the active curve first, then the other curves)
         '''
         x,y = clickPosition
         buttons = self.graph.buttons
-        points = self.graph.points
 
         sidemenu = self.graph.menu
         bottomMenu = self.graph.bottomMenu
@@ -1279,13 +2697,13 @@ class InputManager:
             if sidemenu.rect.collidepoint(x, y):
                 return sidemenu
 
-        # Check if clicked on a point
-        for point in points:
-            if point.active:
-                if inCircle(point.screenPos, point.radius, clickPosition):
-                    return point
+        # Check if clicked on a viewport
+        for viewport in reversed(self.graph.viewports):
+            if viewport.contains(clickPosition):
+                return viewport
 
-        return None
+        # Check if clicked on a point
+        return self.graph.pointAt(clickPosition)
 
     def onClick(self, clickType, clickPosition):
         """ This method determines what happens when the left mouse button is either pressed down or
@@ -1299,6 +2717,9 @@ class InputManager:
             self.mouseIsDown = True # self.mouseIsDown is true until the next left click up event
             self.mouseDeltaXY = [0,0] # Reset the relative mouse movement
 
+            if isinstance(clickedObject, Point): # A point is edited on its own curve, so that curve becomes the active curve
+                self.graph.selectCurve(self.graph.curveOf(clickedObject))
+
         else: # Left click up
 
             # dx,dy = number of pixels the mouse moved in the x,y coordinates since mouse click down
@@ -1320,7 +2741,11 @@ class InputManager:
                     self.graph.selectPoint(self.objectClickedOn)
 
                 elif isinstance(self.objectClickedOn, SideMenu): # User clicked on the side menu
-                    if self.objectClickedOn.active:
+                    curveIndex = self.objectClickedOn.clickOnCurveHeader(clickPosition)
+                    if curveIndex is not None: # User clicked on the header of a curve's points
+                        self.graph.selectCurve(curveIndex)
+
+                    elif self.objectClickedOn.active:
                         selectedPoint = self.objectClickedOn.clickOnPointDisplay(clickPosition)
                         if selectedPoint is not None:
                             isActive = selectedPoint.selected
@@ -1328,11 +2753,18 @@ class InputManager:
                             selectedPoint.selected = isActive
                             self.graph.selectPoint(selectedPoint)
 
+                elif isinstance(self.objectClickedOn, Viewport): # User clicked on a viewport, so the graph is centered there
+                    self.graph.centerOn(*self.objectClickedOn.toWorld(clickPosition))
+
             else: # The user was dragging an object (a point, the graph, etc.) instead of clicking on an object
                 if isinstance(self.objectClickedOn, Point): # If the user was dragging a point
                     # Use snapToGrid() function to move the point onto a grid line if the user placed
                     # the point close enough to the grid line
                     self.objectClickedOn.snapToGrid(self.graph)  
+                    self.graph.recordHistory('set', self.objectClickedOn.index)
+
+                elif self.objectClickedOn is None: # If the user was dragging the graph
+                    self.graph.recordHistory('view')
 
             self.objectClickedOn = None # Reset object clicked on for next click down event
             self.mouseIsDown = False # Left mouse button is no longer being held down
@@ -1346,6 +2778,7 @@ class InputManager:
         # If the mouse is hovering over the grid or over a point
         if clickedObject is None or isinstance(clickedObject, Point):
             self.graph.zoom(scrollType) # Zoom in/out
+            self.graph.recordHistory('view', coalesce='zoom') # A run of scrolls is undone as one step
 
         # If the mouse is hovering over the side menu
         elif isinstance(clickedObject, SideMenu):
@@ -1356,6 +2789,13 @@ class InputManager:
                 dy = 10
             self.graph.menu.scroll(dy)
 
+        # If the mouse is hovering over a viewport, zoom the viewport in/out
+        elif isinstance(clickedObject, Viewport):
+            if scrollType == 0:
+                clickedObject.zoomSteps -= 1
+            else:
+                clickedObject.zoomSteps += 1
+
         # If the menu is hovering over the bottom menu
         elif isinstance(clickedObject, BottomMenu):
             # Scroll the bottom menu left/right
@@ -1373,6 +2813,44 @@ class InputManager:
             the event, and takes the appropriate action based on the key
         '''
         key = ev.key
+        if key == K_F3: # If the user pressed F3, show/hide the profiler overlay
+            profiler.toggleOverlay()
+            return None
+
+        if ev.mod & KMOD_CTRL and key in (K_s, K_o): # Ctrl+S saves the session and Ctrl+O loads it
+            try:
+                if key == K_s:
+                    self.graph.saveSession()
+                    self.graph.bottomMenu.updateDisplay(f'Session saved to {self.graph.sessionPath}')
+                else:
+                    self.graph.loadSession()
+            except (OSError, ValueError) as e:
+                self.graph.bottomMenu.updateDisplay(f'Error: {e}')
+            return None
+
+        if ev.mod & KMOD_CTRL and key in (K_z, K_y): # Ctrl+Z undoes, Ctrl+Y (or Ctrl+Shift+Z) redoes
+            if key == K_y or ev.mod & KMOD_SHIFT:
+                self.graph.redo()
+            else:
+                self.graph.undo()
+            return None
+
+        if ev.unicode == "c": # If the user pressed 'c', show/hide the roots and extrema of the polynomial
+            self.graph.showCriticalPoints = not self.graph.showCriticalPoints
+            return None
+
+        if ev.unicode == "n": # If the user pressed 'n', add a new curve
+            self.graph.addCurve()
+            return None
+
+        if ev.unicode == "v": # If the user pressed 'v', show/hide the overview
+            self.graph.toggleOverview()
+            return None
+
+        if key == K_TAB: # If the user pressed tab, edit the next curve
+            self.graph.nextCurve()
+            return None
+
         if key == K_RIGHT: # If the user pressed the right arrow key
             if self.graph.menu.active: # If the side menu is active
                 self.graph.menu.moveCursor(1) # Move the cursor to the right
@@ -1401,6 +2879,9 @@ class InputManager:
                     # the menu will display the correct coordinates for the point, but it will be drawn at the wrong screen position
                     updatedPoint.screenPos = self.graph.convertToScreen(updatedPoint.coordinates[0], updatedPoint.coordinates[1])
 
+                    # Typing into the same point is undone as a single step
+                    self.graph.recordHistory('set', updatedPoint.index, coalesce=('edit', updatedPoint.index))
+
     def update(self, changeInMousePosition):
         ''' This method updates the graphical interface based on the movement of the mouse. For example, if the user is attempting
             to drag a point (by clicking and holding on a point and moving the mouse), then the graphical interface should reflect
@@ -1438,9 +2919,7 @@ def testProgram(screen, clock):
     mouseDown = False # Used to track mouse clicks
     
     while True:
-        screen.fill(WHITE) # Fill screen with white every frame
-
-        inputManager.graph.displayToScreen(screen)
+        dirtyRects = inputManager.graph.displayToScreen(screen)
 
         dx,dy = pygame.mouse.get_rel() # Get updated (x,y) mouse position for current frame
         
@@ -1478,7 +2957,7 @@ def testProgram(screen, clock):
 
         inputManager.update((dx,dy))
         
-        pygame.display.update()
+        pygame.display.update(dirtyRects)
         clock.tick(FPS)
     return None
 
@@ -0,0 +1,213 @@
+""" This file implements the undo/redo history of the graph.
+
+    Each state of the graph is stored as a Snapshot holding the view and a CurveSnapshot of each curve
+    (its points and curve engine). The points are kept in a persistent vector (an immutable list stored as
+    a tree), so a new snapshot shares everything except the changed points with the snapshot before it,
+    and curves that didn't change share their whole CurveSnapshot. Each CurveSnapshot also remembers the
+    curve (divided difference table and polyline) that was drawn for it, so stepping back and forth
+    through the history doesn't calculate anything again.
+
+    Authors: Joshua Fawcett, Hans Prieto
+"""
+
+# The persistent vector is a tree where every node holds up to 32 children (or values, for the leaves)
+BITS = 5
+BRANCHING = 1 << BITS
+MASK = BRANCHING - 1
+
+# Maximum number of snapshots that can be undone
+HISTORY_LIMIT = 256
+
+
+###################
+# Persistent list #
+###################
+
+def _newPath(level, value):
+    ''' Returns a branch of nodes down to a leaf that holds only 'value'
+    '''
+    node = (value,)
+    for l in range(level, 0, -BITS):
+        node = (node,)
+    return node
+
+def _appendValue(node, level, index, value):
+    ''' Returns a copy of 'node' with 'value' added at 'index' (the number of values below the node)
+    '''
+    if level == 0:
+        return node + (value,)
+    child = (index >> level) & MASK
+    if child < len(node): # The last child has room for the value
+        return node[:child] + (_appendValue(node[child], level - BITS, index, value),)
+    return node + (_newPath(level - BITS, value),)
+
+def _setValue(node, level, index, value):
+    ''' Returns a copy of 'node' with the value at 'index' replaced by 'value'
+    '''
+    child = (index >> level) & MASK
+    if level == 0:
+        return node[:child] + (value,) + node[child+1:]
+    return node[:child] + (_setValue(node[child], level - BITS, index, value),) + node[child+1:]
+
+def _iterate(node, level):
+    if level == 0:
+        yield from node
+    else:
+        for child in node:
+            yield from _iterate(child, level - BITS)
+
+
+# The persistent vector is an immutable list. set() and append() return a new vector that shares all
+# of its nodes with the old vector except the O(log n) nodes on the path to the changed value
+class PersistentVector:
+    __slots__ = ('count', 'level', 'root')
+
+    def __init__(self, count=0, level=0, root=()):
+        self.count = count # Number of values in the vector
+        self.level = level # Height of the tree times BITS (0 when the root is a leaf)
+        self.root = root
+
+    @classmethod
+    def fromList(cls, values):
+        vector = cls()
+        for value in values:
+            vector = vector.append(value)
+        return vector
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return _iterate(self.root, self.level)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('vector index out of range')
+        node = self.root
+        for level in range(self.level, 0, -BITS):
+            node = node[(index >> level) & MASK]
+        return node[index & MASK]
+
+    def __repr__(self):
+        return f"PersistentVector({list(self)})"
+
+    def append(self, value):
+        ''' Returns a new vector with 'value' added to the end
+        '''
+        if self.count == 1 << (self.level + BITS): # The tree is full, so add a level above the root
+            root = (self.root, _newPath(self.level, value))
+            return PersistentVector(self.count + 1, self.level + BITS, root)
+        return PersistentVector(self.count + 1, self.level, _appendValue(self.root, self.level, self.count, value))
+
+    def set(self, index, value):
+        ''' Returns a new vector with the value at 'index' replaced by 'value'
+        '''
+        if not 0 <= index < self.count:
+            raise IndexError('vector index out of range')
+        return PersistentVector(self.count, self.level, _setValue(self.root, self.level, index, value))
+
+    def delete(self, index):
+        ''' Returns a new vector without the value at 'index'. Every value after 'index' moves down one
+            place, so (unlike set() and append()) this copies the whole vector
+        '''
+        values = list(self)
+        del values[index]
+        return PersistentVector.fromList(values)
+
+
+#############
+# Snapshots #
+#############
+
+# A state of one curve of the graph. 'points' is a PersistentVector of (x, y, active) tuples (the world
+# coordinates of each point and whether it is active) and 'engine' is the curve engine. 'result' is the
+# CurveResult that was drawn for the curve in the view of the Snapshot holding it (or None if the curve
+# hasn't been drawn yet)
+class CurveSnapshot:
+    __slots__ = ('points', 'engine', 'result', '_coordinates')
+
+    def __init__(self, points, engine):
+        self.points = points
+        self.engine = engine
+        self.result = None
+        self._coordinates = None
+
+    def activeCoordinates(self):
+        ''' Returns two tuples holding the x and y coordinates of the active points (see PointStore.activeCoordinates())
+        '''
+        if self._coordinates is None:
+            active = [(x, y) for x, y, isActive in self.points if isActive]
+            self._coordinates = (tuple(p[0] for p in active), tuple(p[1] for p in active))
+        return self._coordinates
+
+    def matches(self, request, view):
+        ''' Returns True if the CurveRequest 'request' is the curve of this snapshot in the view 'view'
+            (see Snapshot)
+        '''
+        xs, ys = self.activeCoordinates()
+        transform = request.view
+        return (request.engine == self.engine and request.xs == xs and request.ys == ys and
+                (transform.xOffset, transform.yOffset, transform.pixelsPerUnit, transform.worldScale) == view[:4])
+
+
+# A state of the graph. 'curves' is a tuple holding the CurveSnapshot of each curve, 'view' is the tuple
+# (xOffset, yOffset, pixelsPerUnit, worldScale, zoomIndex, zoomct) and 'active' is the index of the curve
+# being edited
+class Snapshot:
+    __slots__ = ('curves', 'view', 'active')
+
+    def __init__(self, curves, view, active=0):
+        self.curves = curves
+        self.view = view
+        self.active = active
+
+
+###########
+# History #
+###########
+
+class History:
+    def __init__(self, snapshot, limit=HISTORY_LIMIT):
+        self.current = snapshot
+        self.undoStack = [] # Snapshots before the current one (most recent last)
+        self.redoStack = [] # Snapshots that were undone (most recently undone last)
+        self.limit = limit
+
+        # Changes that are recorded with the same 'coalesce' value one after another are undone as a
+        # single step (for example each scroll of the mouse wheel while zooming)
+        self.lastCoalesce = None
+        return None
+
+    def record(self, snapshot, coalesce=None):
+        ''' Make 'snapshot' the current state. Anything that was undone can no longer be redone
+        '''
+        if coalesce is None or coalesce != self.lastCoalesce:
+            self.undoStack.append(self.current)
+            if len(self.undoStack) > self.limit:
+                del self.undoStack[0]
+        self.current = snapshot
+        self.redoStack = []
+        self.lastCoalesce = coalesce
+        return None
+
+    def undo(self):
+        ''' Step back to the previous snapshot. Returns the snapshot (or None if there is nothing to undo)
+        '''
+        if not self.undoStack:
+            return None
+        self.redoStack.append(self.current)
+        self.current = self.undoStack.pop()
+        self.lastCoalesce = None
+        return self.current
+
+    def redo(self):
+        ''' Step forward to the most recently undone snapshot. Returns the snapshot (or None if there is nothing to redo)
+        '''
+        if not self.redoStack:
+            return None
+        self.undoStack.append(self.current)
+        self.current = self.redoStack.pop()
+        self.lastCoalesce = None
+        return self.current
@@ -1,8 +1,35 @@
-""" This file implements the Newton's Interpolation functionality.
+""" This file implements the Newton's Interpolation functionality, as well as cubic spline
+    interpolation for large sets of points.
 
     Authors: Joshua Fawcett, Hans Prieto
 """
 
+import math
+import importlib
+from collections import namedtuple
+
+class _LazyModule:
+    ''' Stand-in for a module that is imported the first time one of its attributes is used. numpy takes
+        much longer to import than the rest of this file and newtonsIP()/evaluatePolynomial() don't use it,
+        so this file can be imported without importing numpy
+    '''
+    def __init__(self, name, alias):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module # Later uses of the alias skip the stand-in
+        return getattr(module, attribute)
+
+np = _LazyModule('numpy', 'np')
+
+# Curve engines supported by the graph: Newton's interpolating polynomial, or a natural/clamped cubic spline
+ENGINES = ['newton', 'natural', 'clamped']
+
+# Node distributions on the interval [-1, 1] (see makeNodes())
+NODE_DISTRIBUTIONS = ['equispaced', 'random', 'chebyshev']
+
 def newtonsIP(Xs, Ys):
     '''
     Creates a divided difference table for a list of x and y coordinates.
@@ -18,6 +45,93 @@ def newtonsIP(Xs, Ys):
             table[i][j] = (table[i+1][j-1] - table[i][j-1]) / (Xs[i+j] - Xs[i])
     return table
 
+def newtonCoefficients(Xs, Ys):
+    '''
+    Returns the top row of the divided difference table for a list of x and y coordinates (the
+    coefficients of the polynomial in Newton form) as an array. Unlike newtonsIP(), only O(n) memory
+    is used, so this works for large numbers of points.
+    '''
+    xs = np.asarray(Xs, dtype=float)
+    coefficients = np.array(Ys, dtype=float)
+    n = len(xs)
+
+    # After step j, coefficients[i] (for i >= j) holds the divided difference f[x(i-j), ..., x(i)]
+    for j in range(1, n):
+        coefficients[j:] = (coefficients[j:] - coefficients[j-1:-1]) / (xs[j:] - xs[:-j])
+    return coefficients
+
+class NewtonWindow:
+    '''
+    Divided difference table of a sliding window holding the 'size' most recent of a sequence of nodes.
+    The table is updated as nodes enter and leave the window instead of being calculated again with
+    newtonsIP(): adding a node calculates the k new divided differences that end at that node (one
+    diagonal of the table), and removing the oldest node removes the first row of the table.
+
+    Row i of 'table' holds the k - i entries newtonsIP() calculates for row i of the nodes in the window
+    (so row 0 holds the Newton coefficients), without the zeros that fill the rest of the row.
+    '''
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError('the window must hold at least one node')
+        self.size = size
+        self.xs = []
+        self.ys = []
+        self.table = []
+
+    def __len__(self):
+        return len(self.xs)
+
+    def append(self, x, y):
+        '''
+        Adds the node (x, y) to the end of the window, removing the oldest node if the window is full.
+        '''
+        full = len(self.xs) == self.size
+        if x in self.xs[full:]: # (the oldest node is removed first when the window is full)
+            raise ValueError('x values must be distinct')
+        if full:
+            self.popOldest()
+
+        xs, table = self.xs, self.table
+        k = len(xs)
+        xs.append(x)
+        self.ys.append(y)
+        table.append([y])
+
+        # table[i][j] = f[x(i), ..., x(k)] for each i with i + j = k, from the bottom of the table up
+        for j in range(1, k + 1):
+            i = k - j
+            table[i].append((table[i+1][j-1] - table[i][j-1]) / (x - xs[i]))
+
+    def popOldest(self):
+        '''
+        Removes the oldest node from the window. The divided differences of the remaining nodes don't
+        depend on it, so they are the rows of the table below the first row.
+        '''
+        del self.xs[0]
+        del self.ys[0]
+        del self.table[0]
+
+    def reset(self, Xs, Ys):
+        '''
+        Replaces the nodes in the window with the last 'size' nodes of Xs and Ys.
+        '''
+        self.xs, self.ys, self.table = [], [], []
+        for x, y in list(zip(Xs, Ys))[-self.size:]:
+            self.append(x, y)
+
+    def snapshot(self):
+        '''
+        Returns a copy of the table that later changes to the window don't modify.
+        '''
+        return [row[:] for row in self.table]
+
+    def interpolant(self):
+        '''
+        Returns the Interpolant of the nodes in the window (a copy of the first row of the table). Raises
+        ValueError if the window is empty.
+        '''
+        return Interpolant(self.xs, self.table[0] if self.table else [])
+
 def evaluatePolynomial(x, Xs, table):
     '''
     Evaluates the polynomial at a given x coordinate by using a list of X coordinates
@@ -28,7 +142,380 @@ def evaluatePolynomial(x, Xs, table):
     for i in range(1, n+1):
         result = table[0][n-i] + (x - Xs[n-i])* result
     return result
-    
+
+class Interpolant:
+    '''
+    The polynomial through a set of points in Newton form. The nodes and Newton coefficients are stored
+    together in one (2, n) array of floats ('data'), so an interpolant pickles as a single buffer and can
+    be copied into shared memory (see export()) for worker processes to attach to without copying.
+
+    Calling the interpolant evaluates the polynomial at a number or at every value of an array, in the
+    same order as evaluatePolynomial() (so the values are identical). An interpolant needs at least one node.
+    '''
+    __slots__ = ('data', 'memory')
+
+    def __init__(self, Xs, coefficients):
+        if len(Xs) == 0 or len(Xs) != len(coefficients):
+            raise ValueError('an interpolant needs at least one node and a coefficient for each node')
+        self.data = np.array([Xs, coefficients], dtype=float).reshape(2, -1)
+        self.memory = None # Shared memory block the data is stored in (see attach())
+
+    @classmethod
+    def fromPoints(cls, Xs, Ys):
+        '''
+        Returns the interpolant through the points (Xs[i], Ys[i]). Only the top row of the divided
+        difference table is calculated (see newtonCoefficients()).
+        '''
+        return cls(Xs, newtonCoefficients(Xs, Ys))
+
+    @property
+    def xs(self):
+        return self.data[0]
+
+    @property
+    def coefficients(self):
+        return self.data[1]
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def __repr__(self):
+        return f"Interpolant(xs={self.xs.tolist()}, coefficients={self.coefficients.tolist()})"
+
+    def __call__(self, x):
+        xs, coefficients = self.data.tolist() # (Python floats are much faster to index than numpy's)
+        x = np.asarray(x, dtype=float)
+        if x.ndim == 0:
+            x = float(x)
+        n = len(xs) - 1
+        result = coefficients[n]
+        for i in range(1, n+1):
+            result = coefficients[n-i] + (x - xs[n-i]) * result
+        if isinstance(x, float):
+            return result
+        return np.broadcast_to(result, x.shape).astype(float)
+
+    def __reduce__(self):
+        return (Interpolant, (self.xs, self.coefficients))
+
+    def export(self):
+        '''
+        Copies the interpolant into a new block of shared memory (see multiprocessing.shared_memory) and
+        returns the block. Other processes attach to it by name with Interpolant.attach(). The caller owns
+        the block, and must close() and unlink() it once every process is done with it.
+        '''
+        from multiprocessing import shared_memory
+        n = len(self)
+        memory = shared_memory.SharedMemory(create=True, size=8 * (2 * n + 1))
+        buffer = np.ndarray(2 * n + 1, dtype=float, buffer=memory.buf)
+        buffer[0] = n
+        buffer[1:] = self.data.ravel()
+        del buffer # Release the view of the block so it can be closed
+        return memory
+
+    @classmethod
+    def attach(cls, name):
+        '''
+        Returns the interpolant stored in the shared memory block 'name' (see export()). The interpolant
+        reads the block directly instead of copying it, and must be closed with close() when it is no
+        longer needed.
+        '''
+        from multiprocessing import shared_memory
+        memory = shared_memory.SharedMemory(name=name)
+        n = int(np.ndarray(1, dtype=float, buffer=memory.buf)[0])
+        interpolant = cls.__new__(cls)
+        interpolant.data = np.ndarray((2, n), dtype=float, buffer=memory.buf, offset=8)
+        interpolant.memory = memory
+        return interpolant
+
+    def close(self):
+        '''
+        Detaches an interpolant returned by attach() from its shared memory block. Arrays taken from the
+        interpolant (such as xs) must not be used afterwards.
+        '''
+        if self.memory is not None:
+            self.data = np.zeros((2, 0))
+            self.memory.close()
+            self.memory = None
+
+def evaluateDerivatives(x, Xs, coefficients, k=1):
+    '''
+    Evaluates the polynomial with Newton coefficients 'coefficients' (the top row of the divided difference
+    table) and nodes Xs, along with its first k derivatives, at x (a number or an array of numbers).
+
+    All of the derivatives are computed in the same Horner pass. Returns an array 'result' of shape
+    (k+1,) + shape of x, where result[j] is the j-th derivative of the polynomial at x.
+    '''
+    x = np.asarray(x, dtype=float)
+    n = len(Xs) - 1
+
+    result = np.zeros((k + 1,) + x.shape)
+    result[0] = coefficients[n]
+
+    # Multipliers j for the derivatives 1..k, shaped to broadcast against x
+    orders = np.arange(1, k + 1, dtype=float).reshape((k,) + (1,) * x.ndim)
+
+    for i in range(n - 1, -1, -1):
+        factor = x - Xs[i]
+        # Every derivative is updated from the previous step's values at once:
+        # d^j q(i) = (x - Xs[i]) d^j q(i+1) + j d^(j-1) q(i+1)
+        if k > 0:
+            result[1:] = result[1:] * factor + orders * result[:-1]
+        result[0] = result[0] * factor + coefficients[i]
+    return result
+
+def newtonToMonomial(Xs, coefficients, center=0.0):
+    '''
+    Converts the polynomial with Newton coefficients 'coefficients' and nodes Xs into the monomial form
+    p(x) = m[0] + m[1](x - center) + m[2](x - center)^2 + ... and returns the array m.
+    '''
+    n = len(Xs) - 1
+    m = np.zeros(n + 1)
+    m[0] = coefficients[n]
+    for i in range(n - 1, -1, -1):
+        # m = m * ((x - center) - (Xs[i] - center)) + coefficients[i]
+        degree = n - i
+        m[1:degree+1] = m[:degree] - (Xs[i] - center) * m[1:degree+1]
+        m[0] = coefficients[i] - (Xs[i] - center) * m[0]
+    return m
+
+def integratePolynomial(Xs, coefficients, a, b):
+    '''
+    Returns the exact definite integral from a to b of the polynomial with Newton coefficients
+    'coefficients' and nodes Xs. 'b' may be an array (for example the sample grid of the graph),
+    in which case the integral from a to each value of b is returned.
+    '''
+    # Expand around the middle of the nodes to keep the monomial coefficients well conditioned
+    center = (min(Xs) + max(Xs)) / 2
+    m = newtonToMonomial(Xs, coefficients, center)
+
+    # Antiderivative: sum m[j] (x - center)^(j+1) / (j+1), evaluated with Horner's method
+    antiderivative = m / np.arange(1, len(m) + 1)
+    def F(x):
+        t = np.asarray(x, dtype=float) - center
+        total = np.zeros(t.shape)
+        for c in antiderivative[::-1]:
+            total = total * t + c
+        return total * t
+
+    result = F(b) - F(a)
+    return result if result.ndim else float(result)
+
+# Roots, local minima and local maxima (x coordinates) of a polynomial
+CriticalPoints = namedtuple('CriticalPoints', ['roots', 'minima', 'maxima'])
+
+def refineBrackets(lo, hi, f, iterations=60, tolerance=1e-12):
+    '''
+    Finds a zero of a function inside every bracket [lo[i], hi[i]] at the same time, where the function
+    changes sign over each bracket. f(x) takes an array and returns the pair (values, slopes) of the
+    function at x. Every iteration takes a Newton step for each bracket, falling back to bisection when
+    the step leaves the bracket.
+    '''
+    lo = np.array(lo, dtype=float)
+    hi = np.array(hi, dtype=float)
+    if len(lo) == 0:
+        return lo
+
+    signLo = np.sign(f(lo)[0])
+    x = (lo + hi) / 2
+    scale = tolerance * np.maximum(1, np.abs(x))
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for iteration in range(iterations):
+            value, slope = f(x)
+
+            # Shrink each bracket to the half that still contains the sign change
+            sameSign = np.sign(value) == signLo
+            lo = np.where(sameSign, x, lo)
+            hi = np.where(sameSign, hi, x)
+
+            # Newton step, or bisection if the step is not strictly inside the bracket
+            step = x - value / slope
+            inside = np.isfinite(step) & (step > lo) & (step < hi)
+            newX = np.where(value == 0, x, np.where(inside, step, (lo + hi) / 2))
+
+            done = (value == 0) | (np.abs(newX - x) <= scale) | (hi - lo <= scale)
+            x = newX
+            if np.all(done):
+                break
+    return x
+
+def findCriticalPoints(sampleXs, sampleYs, Xs, coefficients):
+    '''
+    Finds the roots and local extrema of the polynomial with Newton coefficients 'coefficients' and nodes Xs
+    between the first and last sample. sampleXs and sampleYs are the polynomial sampled on an increasing grid
+    (for example the polyline drawn by the graph): sign changes of the samples (and of the derivative at the
+    samples) bracket the roots (and extrema). Every bracket is then refined at once, using p and p' for the
+    roots and p' and p'' for the extrema, which all come from the same Horner pass.
+    '''
+    sampleXs = np.asarray(sampleXs, dtype=float)
+    sampleYs = np.asarray(sampleYs, dtype=float)
+    slopes = evaluateDerivatives(sampleXs, Xs, coefficients, 1)[1]
+
+    def brackets(values):
+        # Returns the indices of the samples where 'values' is zero, the indices i where it changes sign between
+        # sample i and i+1, and the indices of the zero samples where it changes sign (the middle of a run of
+        # zeros between a negative and a positive sample) along with whether it rises there. A zero between
+        # samples of the same sign (such as p' at an inflection point) is not a sign change
+        signs = np.sign(values)
+        nonzero = np.flatnonzero(signs != 0)
+        left, right = nonzero[:-1], nonzero[1:]
+        with np.errstate(invalid='ignore'):
+            flips = signs[left] * signs[right] < 0
+        adjacent = right == left + 1
+        crossings = flips & ~adjacent
+        return (np.flatnonzero(signs == 0), left[flips & adjacent],
+                (left[crossings] + right[crossings]) // 2, signs[left[crossings]] < 0)
+
+    exactRoots, rootBrackets, _, _ = brackets(sampleYs)
+    _, extremaBrackets, exactExtrema, exactRising = brackets(slopes)
+
+    # Refine the brackets of p and p' together
+    lo = np.concatenate([sampleXs[rootBrackets], sampleXs[extremaBrackets]])
+    hi = np.concatenate([sampleXs[rootBrackets + 1], sampleXs[extremaBrackets + 1]])
+    isRoot = np.arange(len(lo)) < len(rootBrackets)
+
+    def f(x):
+        p = evaluateDerivatives(x, Xs, coefficients, 2)
+        return np.where(isRoot, p[0], p[1]), np.where(isRoot, p[1], p[2])
+
+    refined = refineBrackets(lo, hi, f)
+
+    roots = np.sort(np.concatenate([sampleXs[exactRoots], refined[isRoot]]))
+
+    # A local minimum is where p' changes from negative to positive
+    extrema = np.concatenate([sampleXs[exactExtrema], refined[~isRoot]])
+    rising = np.concatenate([exactRising, slopes[extremaBrackets] < 0])
+    order = np.argsort(extrema)
+    extrema = extrema[order]
+    rising = rising[order]
+    return CriticalPoints(roots, extrema[rising], extrema[~rising])
+
+# A piecewise cubic spline. On the interval [xs[i], xs[i+1]] the spline is
+# S(x) = a[i] + b[i]*t + c[i]*t^2 + d[i]*t^3 where t = x - xs[i]
+Spline = namedtuple('Spline', ['xs', 'a', 'b', 'c', 'd'])
+
+def thomasSolve(lower, diagonal, upper, rhs):
+    '''
+    Solves the tridiagonal system of equations with sub-diagonal 'lower', main diagonal 'diagonal',
+    super-diagonal 'upper' and right hand side 'rhs' in O(n) using the Thomas algorithm.
+    (lower[0] and upper[-1] are not used)
+    '''
+    n = len(diagonal)
+    lower, diagonal, upper, rhs = (list(map(float, v)) for v in (lower, diagonal, upper, rhs))
+
+    # Forward sweep: eliminate the sub-diagonal
+    c = [0.0] * n
+    d = [0.0] * n
+    c[0] = upper[0] / diagonal[0]
+    d[0] = rhs[0] / diagonal[0]
+    for i in range(1, n):
+        m = diagonal[i] - lower[i] * c[i-1]
+        c[i] = upper[i] / m if i < n - 1 else 0.0
+        d[i] = (rhs[i] - lower[i] * d[i-1]) / m
+
+    # Back substitution
+    result = [0.0] * n
+    result[-1] = d[-1]
+    for i in range(n - 2, -1, -1):
+        result[i] = d[i] - c[i] * result[i+1]
+    return np.array(result)
+
+def cubicSpline(Xs, Ys, boundary='natural', slopes=None):
+    '''
+    Creates a cubic spline through the points (Xs[i], Ys[i]). 'boundary' is either 'natural' (the second
+    derivative is zero at both ends) or 'clamped' (the first derivative at the ends is given by
+    slopes = (left slope, right slope). If no slopes are given, the slopes of the first and last pair
+    of points are used). The points do not need to be sorted, but the x coordinates must be distinct.
+    '''
+    xs = np.asarray(Xs, dtype=float)
+    ys = np.asarray(Ys, dtype=float)
+    order = np.argsort(xs, kind='stable')
+    xs = xs[order]
+    ys = ys[order]
+
+    n = len(xs)
+    if n == 0:
+        raise ValueError('a spline needs at least one point')
+    if np.any(np.diff(xs) == 0):
+        raise ValueError('x values must be distinct')
+    if n == 1:
+        zero = np.zeros(1)
+        return Spline(xs, ys, zero, zero, zero)
+
+    h = np.diff(xs)
+    delta = np.diff(ys) / h # slope of each interval
+
+    # Set up the tridiagonal system for the second derivatives M[0..n-1] of the spline at the points
+    lower = np.zeros(n)
+    diagonal = np.ones(n)
+    upper = np.zeros(n)
+    rhs = np.zeros(n)
+
+    lower[1:-1] = h[:-1]
+    diagonal[1:-1] = 2 * (h[:-1] + h[1:])
+    upper[1:-1] = h[1:]
+    rhs[1:-1] = 6 * (delta[1:] - delta[:-1])
+
+    if boundary == 'natural': # M[0] = M[n-1] = 0
+        pass
+    elif boundary == 'clamped': # S'(xs[0]) = left slope, S'(xs[n-1]) = right slope
+        if slopes is None:
+            slopes = (delta[0], delta[-1])
+        left, right = slopes
+        diagonal[0] = 2 * h[0]
+        upper[0] = h[0]
+        rhs[0] = 6 * (delta[0] - left)
+        lower[-1] = h[-1]
+        diagonal[-1] = 2 * h[-1]
+        rhs[-1] = 6 * (right - delta[-1])
+    else:
+        raise ValueError(f"Unknown spline boundary condition '{boundary}'")
+
+    M = thomasSolve(lower, diagonal, upper, rhs)
+
+    a = ys[:-1]
+    b = delta - h * (2 * M[:-1] + M[1:]) / 6
+    c = M[:-1] / 2
+    d = (M[1:] - M[:-1]) / (6 * h)
+    return Spline(xs, a, b, c, d)
+
+def evaluateSpline(x, spline):
+    '''
+    Evaluates the spline at x, which may be a single number or an array of numbers. Points outside
+    of the spline's range are extrapolated using the first/last piece.
+    '''
+    xs, a, b, c, d = spline
+    x = np.asarray(x, dtype=float)
+
+    if len(a) == 1 and len(xs) == 1: # Spline through a single point is constant
+        return np.full(x.shape, a[0]) if x.ndim else float(a[0])
+
+    # Find the interval each x is in
+    i = np.searchsorted(xs, x, side='right') - 1
+    i = np.clip(i, 0, len(a) - 1)
+
+    t = x - xs[i]
+    result = a[i] + t * (b[i] + t * (c[i] + t * d[i]))
+    return result if result.ndim else float(result)
+
+def makeNodes(distribution, n, seed=351):
+    '''
+    Returns a list of n distinct x coordinates in [-1, 1] with the given distribution (one of
+    NODE_DISTRIBUTIONS). The random nodes are the same for every call with the same n and seed.
+    '''
+    if n == 1:
+        return [0.0]
+    if distribution == 'equispaced':
+        return [-1 + 2 * i / (n - 1) for i in range(n)]
+    if distribution == 'chebyshev':
+        return [math.cos((2 * i + 1) * math.pi / (2 * n)) for i in range(n)]
+    if distribution == 'random':
+        import random
+        rng = random.Random(seed + n)
+        return sorted(rng.uniform(-1, 1) for i in range(n))
+    raise ValueError(f"Unknown node distribution '{distribution}'")
+
 def printTable(table):
     '''
     Function to print the divided difference table.
@@ -52,9 +539,10 @@ def main():
     # Print the divided difference table
     printTable(difTable)
 
-    # Evaluate the polynomial at given x coordinate(eval_x) by using list of x coordinates
-    # (x_coords) and the divided difference table for the polynomial(difTable)
-    result = evaluatePolynomial(eval_x, x_coords, difTable)
+    # Evaluate the polynomial at given x coordinate(eval_x) by using the Newton form of the polynomial
+    # (the x coordinates and the top row of the divided difference table)
+    polynomial = Interpolant(x_coords, difTable[0])
+    result = polynomial(eval_x)
 
     # Print the result
     print(f"Result of interpolated polynomial at x = {eval_x} is {result}")
@@ -0,0 +1,443 @@
+""" This file implements a small local HTTP service that gives other programs access to the interpolation
+    math in Interpolation.py without pygame, and a client library for it.
+
+    Requests are JSON objects POSTed to the server:
+        /coefficients   {"xs": [...], "ys": [...], "engine": "newton"}
+                        -> the Newton coefficients (or the pieces of the cubic spline)
+        /evaluate       {"xs": [...], "ys": [...], "engine": "newton", "x": [...]}
+                        -> the values of the interpolant at each of the query x values
+        /render         {"xs": [...], "ys": [...], "engine": "newton", "view": {"xOffset": 0, "yOffset": 0,
+                         "pixelsPerUnit": 70, "worldScale": 1, "width": 700, "height": 700}}
+                        -> the curve sampled at every pixel column of the view, as clipped polylines
+    and GET /stats returns the cache and batching counters. 'engine' is one of Interpolation.ENGINES
+    (it defaults to "newton").
+
+    Interpolants are kept in an LRU cache keyed by a hash of the engine and points, so the coefficients
+    are only calculated once per data set. Evaluations that arrive at (almost) the same time are batched:
+    the query x values of every request for the same data set are evaluated together in one vectorised call.
+    Connections are kept alive, so a client can send many requests over the same connection.
+
+    Usage:
+        python InterpolationServer.py [--host HOST] [--port PORT] [--cache-size N]
+
+        client = InterpolationClient()
+        values = client.evaluate(xs, ys, [0.5, 1.5])
+
+    Authors: Joshua Fawcett, Hans Prieto
+"""
+
+import sys
+import json
+import math
+import queue
+import hashlib
+import argparse
+import threading
+import http.client
+from time import perf_counter
+from collections import namedtuple, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from Interpolation import ENGINES, Interpolant, cubicSpline, evaluateSpline
+from Sampling import ViewTransform, clipPolyline
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8351
+DEFAULT_CACHE_SIZE = 128 # Number of interpolants kept in the cache
+
+# Largest width and height (in pixels) of the view of a render request
+MAX_VIEW_SIZE = 8192
+
+# Time (in seconds) the batcher waits for more requests after the first request of a batch arrives
+BATCH_WINDOW = 0.002
+
+# An interpolant in the cache. 'table' holds the Interpolation.Interpolant (for the 'newton' engine) or the
+# Interpolation.Spline (for the cubic spline engines)
+CachedInterpolant = namedtuple('CachedInterpolant', ['key', 'engine', 'xs', 'table'])
+
+
+def datasetKey(engine, xs, ys):
+    ''' Returns the hash identifying the interpolant of the given engine through the points (xs[i], ys[i])
+    '''
+    digest = hashlib.sha1(engine.encode())
+    digest.update(np.ascontiguousarray(xs, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(ys, dtype=float).tobytes())
+    return digest.hexdigest()
+
+def parseView(view):
+    ''' Returns the ViewTransform described by the 'view' object of a render request. Raises ValueError if
+        the view isn't an object, its offsets and scale aren't finite numbers (with a positive scale), or
+        its width and height aren't whole numbers from 1 to MAX_VIEW_SIZE
+    '''
+    if not isinstance(view, dict):
+        raise ValueError('view must be an object')
+
+    def number(name, default=None):
+        value = view.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"view.{name} must be a finite number")
+        return value
+
+    def size(name):
+        value = view.get(name)
+        if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= MAX_VIEW_SIZE:
+            raise ValueError(f"view.{name} must be a whole number from 1 to {MAX_VIEW_SIZE}")
+        return value
+
+    view = ViewTransform(number('xOffset', 0), number('yOffset', 0), number('pixelsPerUnit'),
+                         number('worldScale', 1), size('width'), size('height'))
+    if not (view.pixelsPerUnit > 0 and view.worldScale > 0 and 0 < view.scale < math.inf):
+        raise ValueError('view.pixelsPerUnit and view.worldScale must be positive')
+    return view
+
+def evaluateInterpolant(interpolant, x):
+    ''' Evaluates the cached interpolant at every value in the array x
+    '''
+    if interpolant.engine == 'newton':
+        return interpolant.table(x)
+    return evaluateSpline(x, interpolant.table)
+
+
+#####################
+# Interpolant cache #
+#####################
+
+class InterpolantCache:
+    def __init__(self, maxSize=DEFAULT_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.entries = OrderedDict() # Dictionary of the form {key: CachedInterpolant}, least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        return None
+
+    def get(self, engine, xs, ys):
+        ''' Returns the CachedInterpolant through the given points, calculating it if it isn't cached
+        '''
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'")
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        if xs.ndim != 1 or xs.shape != ys.shape or len(xs) == 0:
+            raise ValueError('xs and ys must be lists of numbers of the same (non-zero) length')
+
+        key = datasetKey(engine, xs, ys)
+        with self.lock:
+            interpolant = self.entries.get(key)
+            if interpolant is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return interpolant
+            self.misses += 1
+
+        # The interpolant is calculated outside of the lock so other data sets aren't held up
+        if engine == 'newton':
+            if len(np.unique(xs)) != len(xs):
+                raise ValueError('x values must be distinct')
+            table = Interpolant.fromPoints(xs, ys)
+        else:
+            table = cubicSpline(xs, ys, engine)
+        interpolant = CachedInterpolant(key, engine, xs, table)
+
+        with self.lock:
+            self.entries[key] = interpolant
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+        return interpolant
+
+
+###########
+# Batcher #
+###########
+
+class _Job:
+    ''' A single evaluation waiting in the batcher's queue
+    '''
+    __slots__ = ('interpolant', 'x', 'done', 'values', 'error')
+
+    def __init__(self, interpolant, x):
+        self.interpolant = interpolant
+        self.x = x
+        self.done = threading.Event()
+        self.values = None
+        self.error = None
+
+
+# The batcher evaluates interpolants on a background thread. When a job arrives, the batcher waits
+# BATCH_WINDOW seconds for more jobs, then evaluates the jobs of each data set together by concatenating
+# their query x values into a single array
+class EvaluationBatcher:
+    def __init__(self, window=BATCH_WINDOW):
+        self.window = window
+        self.jobs = queue.Queue()
+        self.batches = 0 # Number of vectorised evaluations
+        self.batchedJobs = 0 # Number of jobs evaluated
+
+        self.thread = threading.Thread(target=self.__run__, name='EvaluationBatcher', daemon=True)
+        self.thread.start()
+        return None
+
+    def evaluate(self, interpolant, x):
+        ''' Evaluate 'interpolant' at every value in the array x. Blocks until the batch containing the job is done
+        '''
+        job = _Job(interpolant, np.asarray(x, dtype=float))
+        self.jobs.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.values
+
+    def close(self):
+        self.jobs.put(None)
+        self.thread.join()
+        return None
+
+    def __run__(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return None
+
+            # Collect every job that arrives within the batch window
+            batch = [job]
+            deadline = perf_counter() + self.window
+            try:
+                while True:
+                    job = self.jobs.get(timeout=max(0, deadline - perf_counter()))
+                    if job is None:
+                        self.jobs.put(None) # Finish this batch first
+                        break
+                    batch.append(job)
+            except queue.Empty:
+                pass
+
+            # Group the jobs by data set
+            groups = {}
+            for job in batch:
+                groups.setdefault(job.interpolant.key, []).append(job)
+
+            for jobs in groups.values():
+                try:
+                    x = np.concatenate([job.x.ravel() for job in jobs])
+                    values = evaluateInterpolant(jobs[0].interpolant, x)
+                    splits = np.cumsum([job.x.size for job in jobs])[:-1]
+                    for job, part in zip(jobs, np.split(values, splits)):
+                        job.values = part.reshape(job.x.shape)
+                except Exception as e:
+                    for job in jobs:
+                        job.error = e
+                self.batches += 1
+                self.batchedJobs += len(jobs)
+                for job in jobs:
+                    job.done.set()
+
+
+##########
+# Server #
+##########
+
+class InterpolationService:
+    ''' The interpolation math behind the HTTP handler: an interpolant cache and an evaluation batcher
+    '''
+    def __init__(self, cacheSize=DEFAULT_CACHE_SIZE, batchWindow=BATCH_WINDOW):
+        self.cache = InterpolantCache(cacheSize)
+        self.batcher = EvaluationBatcher(batchWindow)
+        return None
+
+    def coefficients(self, request):
+        interpolant = self.__interpolant__(request)
+        if interpolant.engine == 'newton':
+            return {'key': interpolant.key, 'engine': 'newton', 'coefficients': interpolant.table.coefficients.tolist()}
+        return {'key': interpolant.key, 'engine': interpolant.engine,
+                'spline': {name: np.asarray(value).tolist() for name, value in interpolant.table._asdict().items()}}
+
+    def evaluate(self, request):
+        interpolant = self.__interpolant__(request)
+        values = self.batcher.evaluate(interpolant, request['x'])
+        return {'key': interpolant.key, 'values': values.tolist()}
+
+    def render(self, request):
+        interpolant = self.__interpolant__(request)
+        view = parseView(request['view'])
+
+        # Sample the curve at every pixel column of the view (see Sampling.computeCurve())
+        sxs = np.arange(view.width)
+        wys = self.batcher.evaluate(interpolant, view.toWorld(sxs, 0)[0])
+        polylines = clipPolyline(sxs, view.toScreen(0, wys)[1], 0, view.height)
+        return {'key': interpolant.key, 'polylines': polylines}
+
+    def stats(self):
+        return {'cacheEntries': len(self.cache.entries), 'cacheHits': self.cache.hits,
+                'cacheMisses': self.cache.misses, 'batches': self.batcher.batches,
+                'batchedRequests': self.batcher.batchedJobs}
+
+    def close(self):
+        self.batcher.close()
+        return None
+
+    def __interpolant__(self, request):
+        return self.cache.get(request.get('engine', 'newton'), request['xs'], request['ys'])
+
+
+class InterpolationRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep connections alive between requests
+    routes = {'/coefficients': 'coefficients', '/evaluate': 'evaluate', '/render': 'render'}
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.__respond__(200, self.server.service.stats())
+        else:
+            self.__respond__(404, {'error': f"Unknown path '{self.path}'"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length < 0:
+                raise ValueError('Content-Length must not be negative')
+        except ValueError as e:
+            self.close_connection = True # The end of the body isn't known, so the connection can't be reused
+            self.__respond__(400, {'error': f"{type(e).__name__}: {e}"})
+            return None
+        body = self.rfile.read(length)
+
+        route = self.routes.get(self.path)
+        if route is None:
+            self.__respond__(404, {'error': f"Unknown path '{self.path}'"})
+            return None
+
+        try:
+            request = json.loads(body)
+            if not isinstance(request, dict):
+                raise ValueError('the request body must be a JSON object')
+            response = getattr(self.server.service, route)(request)
+        except (ValueError, KeyError, TypeError) as e: # Bad JSON, missing fields or invalid points
+            self.__respond__(400, {'error': f"{type(e).__name__}: {e}"})
+            return None
+        self.__respond__(200, response)
+        return None
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def __respond__(self, status, response):
+        body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return None
+
+
+class InterpolationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=(DEFAULT_HOST, DEFAULT_PORT), cacheSize=DEFAULT_CACHE_SIZE, verbose=False):
+        self.service = InterpolationService(cacheSize)
+        self.verbose = verbose
+        super().__init__(address, InterpolationRequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.service.close()
+
+
+##########
+# Client #
+##########
+
+class ServiceError(Exception):
+    ''' Raised by InterpolationClient when the server rejects a request
+    '''
+
+
+# The client sends requests to an InterpolationServer over a single kept-alive connection
+class InterpolationClient:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=30):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        return None
+
+    def coefficients(self, xs, ys, engine='newton'):
+        ''' Returns the Newton coefficients of the polynomial through the points (or a dictionary holding
+            the arrays of the spline's pieces for the cubic spline engines)
+        '''
+        response = self.__post__('/coefficients', {'xs': list(xs), 'ys': list(ys), 'engine': engine})
+        if engine == 'newton':
+            return np.array(response['coefficients'])
+        return {name: np.array(value) for name, value in response['spline'].items()}
+
+    def evaluate(self, xs, ys, x, engine='newton'):
+        ''' Returns an array holding the values of the interpolant through the points at each value in x
+        '''
+        x = np.asarray(x, dtype=float)
+        response = self.__post__('/evaluate', {'xs': list(xs), 'ys': list(ys), 'engine': engine, 'x': x.tolist()})
+        return np.array(response['values'], dtype=float).reshape(x.shape)
+
+    def render(self, xs, ys, view, engine='newton'):
+        ''' Returns the curve through the points sampled at every pixel column of 'view' (a Sampling.ViewTransform
+            or a dictionary with the same fields) as a list of polylines in screen space
+        '''
+        if isinstance(view, ViewTransform):
+            view = dict(zip(('xOffset', 'yOffset', 'pixelsPerUnit', 'worldScale', 'width', 'height'), view.key()))
+        response = self.__post__('/render', {'xs': list(xs), 'ys': list(ys), 'engine': engine, 'view': view})
+        return response['polylines']
+
+    def stats(self):
+        return self.__request__('GET', '/stats', None)
+
+    def close(self):
+        self.connection.close()
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __post__(self, path, request):
+        return self.__request__('POST', path, json.dumps(request).encode())
+
+    def __request__(self, method, path, body):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server closed the kept-alive connection, so reconnect and try once more
+            self.connection.close()
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+
+        result = json.loads(response.read())
+        if response.status != 200:
+            raise ServiceError(result.get('error', f"HTTP {response.status}"))
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the interpolation math over local HTTP')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help='number of interpolants kept in the cache')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    server = InterpolationServer((args.host, args.port), args.cache_size, args.verbose)
+    print(f"Serving interpolation on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,9 +15,15 @@
 """
 
 import pygame
+import os
 import sys
+import argparse
+from time import perf_counter
 
-from Graphics import InputManager
+from Graphics import InputManager, RENDER_SCALE, RENDER_FILTERS
+from Profiling import profiler
+from Replay import InputRecorder
+from Streaming import DEFAULT_WINDOW, SlidingWindowFeed, openStream, printReport
 
 # Import pygame keyboard event constants
 from pygame.locals import (
@@ -37,21 +43,63 @@ from pygame.locals import (
 FPS = 45 # Program runs at 45 frames per second
 SCREEN_SIZE = (700,700) # Size of the polynomial interpolation demo window
 
+# Shut down pygame and exit the program, saving the profile if the profiler was used and the input
+# if it was recorded, and reporting the ingest rate and latency of the stream if there was one
+def quitDemo(recorder=None, recordPath=None, feed=None):
+    if feed is not None:
+        feed.close()
+        printReport(feed.report())
+    if recorder is not None:
+        recorder.save(recordPath)
+        print(f"Input recorded to {recordPath} ({len(recorder.events)} events)")
+    if profiler.enabled:
+        path = profiler.dump() # Write the collected timings to a JSON file
+        if path is not None:
+            print(f"Profile written to {path}")
+    pygame.quit() # Shut down pygame (uninitialize pygame modules)
+    sys.exit() # Exit the program
+
 # This program runs the polynomial interpolation demo
-def runDemo(screen, clock):
+def runDemo(screen, clock, sessionPath=None, recordPath=None, streamSource=None, window=DEFAULT_WINDOW,
+            renderScale=RENDER_SCALE, renderFilter='smooth'):
     # Create input manager object. The input manager contains a graph object which is responsible for drawing the
     # the graph interface to the screen. The input manager updates the graph according to user input
-    inputManager = InputManager(SCREEN_SIZE) 
+    # The polynomial is sampled on a background thread so that expensive polynomials don't stall the event loop
+    inputManager = InputManager(SCREEN_SIZE, threadedSampling=True) 
+
+    # While the graph is dragged or zoomed, the grid and curves are drawn at a lower resolution and scaled up
+    inputManager.graph.renderScale = renderScale
+    inputManager.graph.renderFilter = renderFilter
+
+    if sessionPath is not None: # Ctrl+S/Ctrl+O save and load this session file. Open it if it already exists
+        inputManager.graph.sessionPath = sessionPath
+        if os.path.exists(sessionPath):
+            inputManager.graph.loadSession()
+        else:
+            sessionPath = None
+
+    recorder = None
+    if recordPath is not None: # Log every event the input manager receives (see Replay.py)
+        recorder = InputRecorder(inputManager, SCREEN_SIZE, sessionPath)
+
+    feed = None
+    if streamSource is not None: # Interpolate the most recent samples of a live stream (see Streaming.py)
+        feed = SlidingWindowFeed(inputManager.graph, openStream(streamSource), window)
     
     while True:
-        # Draw the graph interface onto the main pygame display window stored in 'screen'
-        inputManager.graph.displayToScreen(screen)
+        frameStart = perf_counter()
+
+        if feed is not None: # Add the samples that arrived since the last frame
+            feed.update()
+
+        # Draw the graph interface onto the main pygame display window stored in 'screen'. Only the parts
+        # of the interface that changed since the last frame are drawn (see Graphics.Compositor)
+        dirtyRects = inputManager.graph.displayToScreen(screen)
         
         for ev in pygame.event.get(): # Event handling
             if ev.type == KEYDOWN: # If user pressed a key
                 if (ev.key == K_ESCAPE): # If pressed key was 'escape'
-                    pygame.quit() # Shut down pygame (uninitialize pygame modules)
-                    sys.exit() # Exit the program
+                    quitDemo(recorder, recordPath, feed) # Exit the program
                     
                 else:
                     inputManager.pressKey(ev) # Send key press to input manager for handling
@@ -76,8 +124,7 @@ def runDemo(screen, clock):
                     inputManager.onClick(1, (x,y)) # Notify input manager of left click up at position (x,y)
 
             if ev.type == QUIT: # If user closes pygame window
-                pygame.quit() # Shut down pygame
-                sys.exit() # Exit the program
+                quitDemo(recorder, recordPath, feed) # Exit the program
 
         # Get the relative movement of the mouse since the previous frame
         dx,dy = pygame.mouse.get_rel()
@@ -85,20 +132,55 @@ def runDemo(screen, clock):
         # Notify input manager of mouse movement
         inputManager.update((dx,dy))
 
-        pygame.display.update() # Update the main pygame window
+        pygame.display.update(dirtyRects) # Update the parts of the main pygame window that changed
+
+        if feed is not None: # Measure the latency of the samples this frame showed
+            feed.frameShown()
+
+        if profiler.enabled: # Record how long this frame took (not including the time spent waiting on the clock)
+            profiler.record('frame', perf_counter() - frameStart)
+
         clock.tick(FPS) # Update the pygame clock
     return None
 
 # This is called when the program is executed
 def main():
-    pygame.init() # Initialize pygame
+    parser = argparse.ArgumentParser(description='Polynomial Interpolation Demo')
+    parser.add_argument('--profile', nargs='?', const=profiler.dumpPath, metavar='PATH',
+                        help='time each stage of the frame and write the timings to PATH on exit (press F3 to show them)')
+    parser.add_argument('--session', metavar='PATH',
+                        help='session file to open, and to save to with Ctrl+S (Ctrl+O opens it again)')
+    parser.add_argument('--record', metavar='PATH',
+                        help='record the input to PATH on exit, to be replayed with Replay.py')
+    parser.add_argument('--stream', metavar='SOURCE',
+                        help="interpolate the most recent samples ('x y' lines) of a file that is being written to, "
+                             "a local socket ('tcp:PORT') or standard input ('-')")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, metavar='K',
+                        help='number of the most recent stream samples to interpolate')
+    parser.add_argument('--render-scale', type=float, default=RENDER_SCALE, metavar='F',
+                        help='resolution (0 < F <= 1) to draw the grid and curves at while the graph is dragged or zoomed')
+    parser.add_argument('--render-filter', choices=sorted(RENDER_FILTERS), default='smooth',
+                        help='filter that scales the lower resolution grid and curves up to the size of the window')
+    args = parser.parse_args()
+
+    if not 0 < args.render_scale <= 1:
+        parser.error('--render-scale must be greater than 0 and at most 1')
+
+    if args.profile is not None:
+        profiler.enabled = True
+        profiler.dumpPath = args.profile
+
+    # Initialize the pygame modules the demo uses. (pygame.init() would also start the audio and joystick
+    # modules, which the demo doesn't use and which can be slow to start)
+    pygame.display.init()
+    pygame.font.init()
 
     screen = pygame.display.set_mode(SCREEN_SIZE) # Create main pygame window
     pygame.display.set_caption('Polynomial Interpolation Demo') # Set window caption
     clock = pygame.time.Clock() # Create pygame clock
 
     # Run the polynomial interpolation demo
-    runDemo(screen, clock)
+    runDemo(screen, clock, args.session, args.record, args.stream, args.window, args.render_scale, args.render_filter)
     return None
 
 if __name__ == "__main__":
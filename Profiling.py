@@ -0,0 +1,183 @@
+""" This file implements lightweight timing instrumentation for the polynomial interpolation demo.
+
+    Stages of the frame (drawing the grid, calculating the interpolating polynomial, etc.) are timed
+    with profiler.stage() or the @profiled decorator. The profiler keeps a rolling window of timings
+    for each stage, which can be shown in the on-screen overlay and dumped as JSON when the program exits.
+
+    When the profiler is disabled, timing a stage only costs a single attribute check. Stages may be
+    timed on other threads (such as Sampling.CurveWorker's), so the timings are only read as copies
+    taken while holding the profiler's lock.
+
+    Authors: Joshua Fawcett, Hans Prieto
+"""
+
+import json
+import functools
+import threading
+from time import perf_counter
+from collections import deque
+
+# Number of timings kept for each stage (about 5 seconds of frames at 45 frames per second)
+HISTORY_LENGTH = 240
+
+# Upper edges (in milliseconds) of the histogram buckets reported for each stage. The last bucket
+# holds every timing above the last edge
+BUCKET_EDGES_MS = [0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33, 66]
+
+# Default file the profile is written to when the program exits
+DEFAULT_DUMP_PATH = "profile.json"
+
+
+class _NullStage:
+    ''' Context manager returned by Profiler.stage() while the profiler is disabled. It does nothing
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    ''' Context manager that records how long the code inside the 'with' block took to run
+    '''
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled=False, historyLength=HISTORY_LENGTH):
+        self.enabled = enabled
+        self.historyLength = historyLength
+
+        # Dictionary of the form {stage name: deque of the most recent timings in seconds}
+        self.timings = {}
+
+        # Total number of timings recorded for each stage (not limited to the rolling window)
+        self.counts = {}
+
+        # Held while timings are recorded or copied, since stages can be timed on any thread
+        self.lock = threading.Lock()
+
+        self.overlayVisible = False
+        self.dumpPath = DEFAULT_DUMP_PATH
+
+    def stage(self, name):
+        ''' Returns a context manager that times the code inside a 'with' block as the stage 'name'
+        '''
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record(self, name, seconds):
+        ''' Add a single timing (in seconds) for the stage 'name'
+        '''
+        with self.lock:
+            history = self.timings.get(name)
+            if history is None:
+                history = deque(maxlen=self.historyLength)
+                self.timings[name] = history
+                self.counts[name] = 0
+            history.append(seconds)
+            self.counts[name] += 1
+        return None
+
+    def stages(self):
+        ''' Returns a list of the names of the stages that have been timed
+        '''
+        with self.lock:
+            return list(self.timings)
+
+    def toggleOverlay(self):
+        ''' Show/hide the on-screen overlay. Showing the overlay enables the profiler
+        '''
+        self.overlayVisible = not self.overlayVisible
+        if self.overlayVisible:
+            self.enabled = True
+        return None
+
+    def summary(self, name):
+        ''' Returns a dictionary describing the timings of the stage 'name' in the rolling window
+            (all times are in milliseconds)
+        '''
+        with self.lock: # Copy the timings, since another thread may be recording one
+            values = list(self.timings[name])
+            count = self.counts[name]
+        values = sorted(t * 1000 for t in values)
+        n = len(values)
+
+        histogram = [0] * (len(BUCKET_EDGES_MS) + 1)
+        bucket = 0
+        for v in values: # 'values' is sorted, so the bucket index never decreases
+            while bucket < len(BUCKET_EDGES_MS) and v > BUCKET_EDGES_MS[bucket]:
+                bucket += 1
+            histogram[bucket] += 1
+
+        return {
+            'count': count,
+            'window': n,
+            'mean': sum(values) / n,
+            'p50': values[n // 2],
+            'p95': values[min(n - 1, int(n * 0.95))],
+            'max': values[-1],
+            'histogram': histogram,
+        }
+
+    def report(self):
+        ''' Returns a dictionary containing the summary of every stage that has been timed
+        '''
+        return {
+            'bucketEdgesMs': BUCKET_EDGES_MS,
+            'stages': {name: self.summary(name) for name in self.stages()},
+        }
+
+    def dump(self, path=None):
+        ''' Write the profile report to 'path' (or self.dumpPath) as JSON. Nothing is written if no
+            timings were recorded
+        '''
+        if not self.stages():
+            return None
+        if path is None:
+            path = self.dumpPath
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+
+# Profiler shared by the whole program
+profiler = Profiler()
+
+def stage(name):
+    ''' Shortcut for profiler.stage(name)
+    '''
+    return profiler.stage(name)
+
+def profiled(name):
+    ''' Decorator that times every call of the decorated function as the stage 'name'
+    '''
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.record(name, perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,255 @@
+""" This file implements recording the input of the polynomial interpolation demo and replaying it
+    headlessly, so that real sessions can be used to compare the frame timing of different builds.
+
+    While recording, every event the InputManager receives (onClick, onMouseScroll, pressKey and the mouse
+    movement passed to update) is logged with the time it was received, along with a marker for each frame
+    that was drawn. The replayer drives a new InputManager with the same events (either as fast as possible
+    or at the original pacing) and reports how long each type of event took to handle. It also reports a
+    checksum of every rendered frame and of the final state of the graph: if a build renders a recording
+    exactly like another build did, both replays have the same checksums.
+
+    The replayer samples the polynomial on the main thread (see Sampling.CurveSampler), so a replay is
+    deterministic. F3 (which shows the profiler's timings on screen) is not replayed.
+
+    Usage:
+        python Main.py --record input.jsonl                   # record a session
+        python Replay.py input.jsonl                          # replay it as fast as possible
+        python Replay.py input.jsonl --pacing original        # replay it at the speed it was recorded
+        python Replay.py input.jsonl --output report.json     # save the report
+        python Replay.py input.jsonl --baseline report.json   # fail if the output changed or events got slower
+
+    Authors: Joshua Fawcett, Hans Prieto
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+from time import perf_counter
+from collections import namedtuple
+
+import numpy as np
+
+from Profiling import Profiler
+
+FORMAT_VERSION = 1
+
+# Types of events in a recording. 'frame' marks each call of Graph.displayToScreen()
+EVENT_TYPES = ['onClick', 'onMouseScroll', 'pressKey', 'update', 'frame']
+
+DEFAULT_THRESHOLD = 25 # percent
+
+# Stand-in for the pygame KEYDOWN events passed to InputManager.pressKey()
+KeyEvent = namedtuple('KeyEvent', ['key', 'mod', 'unicode'])
+
+
+############
+# Recorder #
+############
+
+# The input recorder logs every event an InputManager receives. The InputManager's event handlers
+# (and its graph's displayToScreen()) are wrapped, so nothing else needs to know about the recording
+class InputRecorder:
+    def __init__(self, inputManager, screenSize, sessionPath=None):
+        # 'sessionPath' is the session file that was loaded before recording started (if any)
+        self.header = {'version': FORMAT_VERSION, 'screenSize': list(screenSize), 'session': sessionPath}
+        self.events = [] # List of the form [[time, type, args], ...]
+        self.start = perf_counter()
+
+        for name in ('onClick', 'onMouseScroll', 'pressKey', 'update'):
+            setattr(inputManager, name, self.__wrap__(name, getattr(inputManager, name)))
+        graph = inputManager.graph
+        graph.displayToScreen = self.__wrap__('frame', graph.displayToScreen)
+        return None
+
+    def log(self, eventType, args):
+        ''' Add an event to the recording
+        '''
+        if eventType == 'pressKey':
+            ev = args[0]
+            args = [ev.key, ev.mod, ev.unicode]
+        elif eventType == 'frame':
+            args = [] # The screen surface isn't recorded
+        else:
+            args = [list(arg) if isinstance(arg, (tuple, list)) else arg for arg in args]
+        self.events.append([round(perf_counter() - self.start, 6), eventType, args])
+        return None
+
+    def save(self, path):
+        ''' Write the recording to 'path' as JSON lines (a header followed by one line for each event)
+        '''
+        with open(path, 'w') as f:
+            f.write(json.dumps(self.header) + '\n')
+            for event in self.events:
+                f.write(json.dumps(event) + '\n')
+        return path
+
+    def __wrap__(self, eventType, handler):
+        def wrapper(*args):
+            self.log(eventType, args)
+            return handler(*args)
+        return wrapper
+
+
+def loadRecording(path):
+    ''' Returns (header, events) for the recording in the file 'path'
+    '''
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"'{path}' is not a recording of version {FORMAT_VERSION}")
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
+
+
+############
+# Replayer #
+############
+
+def stateChecksum(graph):
+    ''' Returns a checksum of the view, and the points and curve engine of each curve of 'graph'
+    '''
+    digest = hashlib.sha1()
+    for curve in graph.curves:
+        n = len(curve.points)
+        for array in (curve.points.worldX[:n], curve.points.worldY[:n], curve.points.active[:n]):
+            digest.update(array.tobytes())
+    digest.update(np.array(graph.viewState(), dtype=float).tobytes()) # (the view may hold ints or floats)
+    digest.update(repr([curve.engine for curve in graph.curves]).encode())
+    return digest.hexdigest()
+
+def replay(header, events, pacing='fast'):
+    ''' Replays the recorded events on a new InputManager and returns a report of the form:
+        {'events': ..., 'frames': ..., 'seconds': ..., 'latencyMs': {event type: summary, ...},
+         'frameChecksum': ..., 'stateChecksum': ...}
+        where each summary is the one returned by Profiling.Profiler.summary(). If 'pacing' is 'original',
+        each event is handled at the time (relative to the start) it was recorded
+    '''
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy') # No window is needed
+    import pygame
+    from Graphics import InputManager
+
+    pygame.display.init()
+    pygame.font.init()
+
+    size = tuple(header['screenSize'])
+    screen = pygame.Surface(size)
+    inputManager = InputManager(size)
+    graph = inputManager.graph
+
+    handlers = {
+        'onClick': lambda args: inputManager.onClick(args[0], tuple(args[1])),
+        'onMouseScroll': lambda args: inputManager.onMouseScroll(args[0], tuple(args[1])),
+        'pressKey': lambda args: inputManager.pressKey(KeyEvent(*args)),
+        'update': lambda args: inputManager.update(tuple(args[0])),
+        'frame': lambda args: graph.displayToScreen(screen),
+    }
+
+    timings = Profiler(enabled=True, historyLength=None)
+    frameDigest = hashlib.sha1()
+    frames = 0
+
+    # Sessions saved and loaded during the replay use a temporary file, starting from a copy of the
+    # session that was loaded when the recording started
+    with tempfile.TemporaryDirectory() as directory:
+        graph.sessionPath = os.path.join(directory, 'replay.intp')
+        if header.get('session') and os.path.exists(header['session']):
+            shutil.copyfile(header['session'], graph.sessionPath)
+            graph.loadSession()
+
+        start = perf_counter()
+        for t, eventType, args in events:
+            if eventType == 'pressKey' and args[0] == pygame.K_F3:
+                continue
+
+            if pacing == 'original':
+                delay = start + t - perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            handler = handlers[eventType]
+            eventStart = perf_counter()
+            handler(args)
+            timings.record(eventType, perf_counter() - eventStart)
+
+            if eventType == 'frame': # The frame is hashed after it is timed
+                frameDigest.update(pygame.image.tostring(screen, 'RGB'))
+                frames += 1
+        seconds = perf_counter() - start
+
+        report = {
+            'events': len(events),
+            'frames': frames,
+            'seconds': seconds,
+            'latencyMs': timings.report()['stages'],
+            'frameChecksum': frameDigest.hexdigest(),
+            'stateChecksum': stateChecksum(graph),
+        }
+        graph.close()
+    return report
+
+def compareToBaseline(report, baseline, threshold):
+    ''' Returns a list of messages describing how 'report' differs from the 'baseline' report: changed
+        checksums, and event types whose mean latency is more than 'threshold' percent higher
+    '''
+    problems = []
+    for checksum in ('frameChecksum', 'stateChecksum'):
+        if report[checksum] != baseline[checksum]:
+            problems.append(f"{checksum} changed: {baseline[checksum]} -> {report[checksum]}")
+
+    for eventType, summary in report['latencyMs'].items():
+        previous = baseline['latencyMs'].get(eventType)
+        if previous is not None and summary['mean'] > previous['mean'] * (1 + threshold / 100):
+            problems.append(f"{eventType}: mean {previous['mean']:.3f} -> {summary['mean']:.3f} ms "
+                            f"({(summary['mean'] / previous['mean'] - 1) * 100:+.0f}%)")
+    return problems
+
+def printReport(report, log=print):
+    log(f"{report['events']} events, {report['frames']} frames in {report['seconds']:.2f} s")
+    log(f"{'event':<16}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for eventType in EVENT_TYPES:
+        summary = report['latencyMs'].get(eventType)
+        if summary is not None:
+            log(f"{eventType:<16}{summary['count']:>8}{summary['mean']:>10.3f}{summary['p50']:>10.3f}"
+                f"{summary['p95']:>10.3f}{summary['max']:>10.3f}")
+    log(f"frame checksum: {report['frameChecksum']}")
+    log(f"state checksum: {report['stateChecksum']}")
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a recorded session of the interpolation demo headlessly')
+    parser.add_argument('recording', help='recording made with python Main.py --record PATH')
+    parser.add_argument('--pacing', choices=['fast', 'original'], default='fast',
+                        help='replay as fast as possible, or at the speed the session was recorded')
+    parser.add_argument('--output', help='write the report to this JSON file')
+    parser.add_argument('--baseline', help='compare against a report written with --output')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='fail if an event type is more than this percent slower than the baseline')
+    args = parser.parse_args(argv)
+
+    header, events = loadRecording(args.recording)
+    report = replay(header, events, args.pacing)
+    printReport(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = compareToBaseline(report, baseline, args.threshold)
+        if problems:
+            print(f"\n{len(problems)} difference(s) from {args.baseline}:")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+        print(f"\nSame output as {args.baseline} and no event type over {args.threshold}% slower")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+""" This file implements the sampling of the interpolating polynomial for the graph. Sampling means
+    calculating the divided difference table (or cubic spline) for the graph's points and evaluating
+    the curve at every pixel column of the graph, producing the polyline that is drawn to the screen.
+
+    Sampling can either happen synchronously (CurveSampler) or on a background thread (CurveWorker),
+    so that expensive polynomials do not stall the pygame event loop. If sampling a request fails, both
+    keep their latest result and hold the exception in 'error' until a request succeeds.
+
+    Authors: Joshua Fawcett, Hans Prieto
+"""
+
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from Interpolation import Interpolant, cubicSpline, evaluateSpline
+from Profiling import profiler
+
+# The view transform converts between screen space and world space for a grid with the given offsets
+# and scale. The coefficients of the (affine) transformation are calculated once when the transform is
+# created, and every conversion works on single numbers or whole arrays of coordinates. A transform never
+# changes after it is created, so it can be used as a snapshot of the view (for example by the background
+# sampling thread). The grid creates a new transform whenever its offsets or scale change
+class ViewTransform:
+    __slots__ = ('xOffset', 'yOffset', 'pixelsPerUnit', 'worldScale', 'width', 'height',
+                 'scale', 'originX', 'originY')
+
+    def __init__(self, xOffset, yOffset, pixelsPerUnit, worldScale, width, height):
+        self.xOffset = xOffset
+        self.yOffset = yOffset
+        self.pixelsPerUnit = pixelsPerUnit
+        self.worldScale = worldScale
+        self.width = width
+        self.height = height
+
+        # screen x = originX + (world x * scale), screen y = originY - (world y * scale)
+        self.scale = pixelsPerUnit / worldScale
+        self.originX = (width // 2) + xOffset
+        self.originY = (height // 2) - yOffset
+
+    def key(self):
+        return (self.xOffset, self.yOffset, self.pixelsPerUnit, self.worldScale, self.width, self.height)
+
+    def __eq__(self, other):
+        return isinstance(other, ViewTransform) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return 'ViewTransform(xOffset={}, yOffset={}, pixelsPerUnit={}, worldScale={}, width={}, height={})'.format(*self.key())
+
+    def toWorld(self, x, y):
+        ''' Converts screen space coordinates (x,y) to world space coordinates. x and y may be numbers or arrays
+        '''
+        return ((x - self.originX) / self.scale, (self.originY - y) / self.scale)
+
+    def toScreen(self, x, y):
+        ''' Converts world space coordinates (x,y) to screen space coordinates. x and y may be numbers or arrays
+        '''
+        return (self.originX + x * self.scale, self.originY - y * self.scale)
+
+# A request to sample the curve through the points (xs[i], ys[i]) in the view 'view'. 'engine' is one of
+# Interpolation.ENGINES ('newton' for the interpolating polynomial, or a type of cubic spline)
+CurveRequest = namedtuple('CurveRequest', ['xs', 'ys', 'view', 'engine'])
+CurveRequest.__new__.__defaults__ = ('newton',)
+
+# The result of a CurveRequest. 'key' identifies the engine and points the Interpolation.Interpolant
+# (or Interpolation.Spline) 'table' was calculated from, and 'polylines' is a list of polylines (lists of
+# screen space coordinates) to be drawn: the sampled curve clipped to the view (see clipPolyline()).
+# 'worldXs' and 'worldYs' are arrays holding the unclipped samples in world space
+CurveResult = namedtuple('CurveResult', ['key', 'table', 'polylines', 'request', 'worldXs', 'worldYs'])
+
+# Number of pixels above and below the view that the curve is drawn into before it is clipped
+CLIP_MARGIN = 10
+
+
+def clipPolyline(xs, ys, top, bottom, margin=CLIP_MARGIN):
+    ''' Clips the polyline through the screen space points (xs[i], ys[i]) to the horizontal band from
+        top - margin to bottom + margin. Segments that are entirely above or below the band (or that have
+        a point that isn't finite) are removed, segments that cross the edge of the band are cut off at
+        the edge, and the polyline is split wherever it leaves the band. Returns a list of polylines,
+        each of which is a list of at least two (x, y) coordinates.
+    '''
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    lo = top - margin
+    hi = bottom + margin
+
+    x0, x1 = xs[:-1], xs[1:]
+    y0, y1 = ys[:-1], ys[1:]
+
+    with np.errstate(invalid='ignore'):
+        inside = (ys >= lo) & (ys <= hi)
+
+        # A segment is visible if both ends are finite and it doesn't lie entirely above or below the band
+        visible = (np.isfinite(y0) & np.isfinite(y1) &
+                   ~((y0 < lo) & (y1 < lo)) & ~((y0 > hi) & (y1 > hi)))
+
+    # Cut off the ends of the visible segments that are outside of the band at the edge of the band
+    index = np.flatnonzero(visible)
+    x0, x1, y0, y1 = x0[index], x1[index], y0[index], y1[index]
+    dy = np.where(y1 == y0, 1, y1 - y0)
+
+    startY = np.clip(y0, lo, hi)
+    startX = x0 + (startY - y0) / dy * (x1 - x0)
+    endY = np.clip(y1, lo, hi)
+    endX = x1 + (endY - y1) / dy * (x1 - x0)
+
+    # A visible segment continues the polyline of the previous segment if that segment is also visible
+    # and the point they share is inside the band
+    continues = np.zeros(len(index), dtype=bool)
+    continues[1:] = (index[1:] == index[:-1] + 1) & inside[index[1:]]
+
+    # Every segment adds its end point to the polyline. The first segment of each polyline also adds its start point
+    points = np.empty((len(index), 2, 2))
+    points[:, 0, 0] = startX
+    points[:, 0, 1] = startY
+    points[:, 1, 0] = endX
+    points[:, 1, 1] = endY
+    keep = np.ones((len(index), 2), dtype=bool)
+    keep[:, 0] = ~continues
+    points = points[keep]
+
+    # Number the polylines and split the points wherever the number changes
+    lineNumbers = np.repeat(np.cumsum(~continues), 2).reshape(-1, 2)[keep]
+    splits = np.flatnonzero(np.diff(lineNumbers)) + 1
+    return [line.tolist() for line in np.split(points, splits) if len(line) >= 2]
+
+
+def visibleMarkers(xs, ys, view, margin):
+    ''' Converts the world space points (xs[i], ys[i]) to screen space with the ViewTransform 'view'. Returns
+        two arrays holding the screen space x and y coordinates of the points that are finite and no more
+        than 'margin' pixels outside of the view (so markers can be drawn at them)
+    '''
+    with np.errstate(over='ignore', invalid='ignore'):
+        sx, sy = view.toScreen(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+        visible = (np.isfinite(sx) & np.isfinite(sy) &
+                   (sx >= -margin) & (sx <= view.width + margin) & (sy >= -margin) & (sy <= view.height + margin))
+    return sx[visible], sy[visible]
+
+def computeCurve(request, previous=None, preloaded=None):
+    ''' Calculate the interpolant (or cubic spline) for the points in 'request' and evaluate the curve at
+        each pixel column of the request's view. If 'previous' (an earlier CurveResult) was calculated from
+        the same engine and points, its interpolant (or spline) is reused. 'preloaded' is an optional
+        (key, table) pair of an interpolant that is already known (for example one loaded from a session
+        file), which is used when its key matches the request
+    '''
+    xs, ys, view, engine = request
+    key = (engine, xs, ys)
+
+    if previous is not None and previous.key == key:
+        table = previous.table
+    elif preloaded is not None and preloaded[0] == key:
+        table = preloaded[1]
+    elif engine == 'newton':
+        # Calculate the Newton coefficients based on Newton's polynomial interpolation method
+        with profiler.stage('Interpolant.fromPoints'):
+            table = Interpolant.fromPoints(xs, ys)
+    else:
+        with profiler.stage('cubicSpline'):
+            table = cubicSpline(xs, ys, engine)
+
+    with profiler.stage('Graph.plot evaluation'):
+        # The curve is evaluated at every pixel column of the view at once. 'sxs' holds the x coordinate
+        # in screen space of each column and 'wxs' holds the matching world space coordinates
+        sxs = np.arange(view.width)
+        wxs = view.toWorld(sxs, 0)[0]
+
+        if engine == 'newton':
+            wys = table(wxs)
+        else:
+            wys = evaluateSpline(wxs, table)
+
+    with profiler.stage('clipPolyline'):
+        # Each polyline is a list of the form: [(x1, f(x1)), (x1, f(x1)), ...], where each (xi, f(xi))
+        # represents a coordinate in screen space to be drawn to the screen
+        screenYs = view.toScreen(0, wys)[1]
+        polylines = clipPolyline(sxs, screenYs, 0, view.height)
+
+    return CurveResult(key, table, polylines, request, wxs, wys)
+
+def resampleCurve(result, view):
+    ''' Returns the curve of 'result' (a CurveResult) sampled in another view. The interpolant (or spline)
+        of 'result' is reused, so only the columns of 'view' are evaluated
+    '''
+    xs, ys, _, engine = result.request
+    return computeCurve(CurveRequest(xs, ys, view, engine), previous=result)
+
+
+# The curve sampler samples the polynomial as soon as a request is submitted. It is used when the graph
+# does not use a background thread (for example in tests and headless tools)
+class CurveSampler:
+    def __init__(self):
+        self.result = None
+        self.preloaded = None # (key, table) of an interpolant that is already known
+        self.error = None # Exception raised by the last request (None if it succeeded)
+        return None
+
+    def submit(self, request):
+        ''' Sample the polynomial described by 'request'
+        '''
+        try:
+            self.result = computeCurve(request, self.result, self.preloaded)
+            self.error = None
+        except Exception as e: # The latest result is kept
+            self.error = e
+        return None
+
+    def preload(self, key, table):
+        ''' Use 'table' instead of calculating the table for the curve 'key' (see computeCurve())
+        '''
+        self.preloaded = (key, table)
+        return None
+
+    def show(self, result):
+        ''' Make 'result' (a CurveResult that was calculated earlier) the latest result
+        '''
+        self.result = result
+        return None
+
+    def latest(self):
+        ''' Returns the most recent CurveResult (or None if nothing has been sampled yet)
+        '''
+        return self.result
+
+    def close(self):
+        return None
+
+
+# The curve worker samples the polynomial on a background thread. Only the most recently submitted
+# request is kept: if several requests are submitted while the worker is busy, all but the newest are
+# discarded. Finished results are written to a double buffer: the worker fills the back buffer and then
+# swaps it with the front buffer, which is what latest() returns to the render loop
+class CurveWorker:
+    def __init__(self):
+        self.pending = None # Newest request that has not been started yet
+        self.preloaded = None # (key, table) of an interpolant that is already known
+        self.buffers = [None, None] # Double buffer of CurveResults
+        self.front = 0 # Index of the front buffer
+        self.error = None # Exception raised by the last finished request (None if it succeeded)
+
+        # Incremented by show(). A result that was being calculated when show() was called is out of date,
+        # so it is discarded instead of replacing the shown result
+        self.generation = 0
+
+        self.condition = threading.Condition()
+        self.running = True
+
+        self.thread = threading.Thread(target=self.__run__, name='CurveWorker', daemon=True)
+        self.thread.start()
+        return None
+
+    def submit(self, request):
+        ''' Queue 'request' to be sampled, replacing any request that has not been started yet
+        '''
+        with self.condition:
+            self.pending = request
+            self.condition.notify()
+        return None
+
+    def latest(self):
+        ''' Returns the most recently finished CurveResult (or None if nothing has finished yet)
+        '''
+        with self.condition:
+            return self.buffers[self.front]
+
+    def preload(self, key, table):
+        ''' Use 'table' instead of calculating the table for the curve 'key' (see computeCurve())
+        '''
+        with self.condition:
+            self.preloaded = (key, table)
+        return None
+
+    def show(self, result):
+        ''' Make 'result' (a CurveResult that was calculated earlier) the latest result, discarding any
+            request that hasn't finished
+        '''
+        with self.condition:
+            self.pending = None
+            self.generation += 1
+            self.buffers[self.front] = result
+        return None
+
+    def close(self):
+        ''' Stop the background thread
+        '''
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+        return None
+
+    def __run__(self):
+        while True:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return None
+                request = self.pending
+                self.pending = None
+                previous = self.buffers[self.front]
+                preloaded = self.preloaded
+                generation = self.generation
+
+            try:
+                result = computeCurve(request, previous, preloaded)
+            except Exception as e: # Keep serving requests. The latest result is kept and the error is held instead
+                with self.condition:
+                    if generation == self.generation:
+                        self.error = e
+                continue
+
+            with self.condition:
+                if generation != self.generation: # show() was called while the request was being sampled
+                    continue
+                self.error = None
+                back = 1 - self.front
+                self.buffers[back] = result # Fill the back buffer
+                self.front = back # Swap buffers
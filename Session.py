@@ -0,0 +1,118 @@
+""" This file implements saving and loading graph sessions (the view, and the points and Newton
+    coefficients of each curve) in a compact binary format.
+
+    A session file is a fixed size header followed by each curve of the session:
+        header          magic, version, curve count, active curve, xOffset, yOffset, pixelsPerUnit,
+                        worldScale, zoomIndex, zoomct (see HEADER)
+        for each curve:
+            curve header    engine, point count, coefficient count (see CURVE_HEADER)
+            worldX          float64[count]
+            worldY          float64[count]
+            coefficients    float64[coefficient count]  (Newton coefficients of the active points, may be empty)
+            active          uint8[count], padded with zeros to a multiple of 8 bytes
+
+    The arrays are memory-mapped when a session is loaded, so loading a large session does not parse or
+    copy anything up front. All values are little-endian.
+
+    Authors: Joshua Fawcett, Hans Prieto
+"""
+
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from Interpolation import ENGINES
+
+MAGIC = b'INTP'
+VERSION = 2
+
+# Default file sessions are saved to and loaded from
+DEFAULT_SESSION_PATH = "session.intp"
+
+# magic, version, curve count, active curve, xOffset, yOffset, pixelsPerUnit, worldScale, zoomIndex,
+# zoomct. The header is 64 bytes long, so the data after it is aligned to 8 bytes
+HEADER = struct.Struct('<4sHHH6xddddqq')
+
+# engine (index into Interpolation.ENGINES), point count, coefficient count (24 bytes)
+CURVE_HEADER = struct.Struct('<H6xQQ')
+
+# The contents of a session file. 'curves' is a list of CurveData and 'activeCurve' is the index of the
+# curve that was being edited
+Session = namedtuple('Session', ['xOffset', 'yOffset', 'pixelsPerUnit', 'worldScale', 'zoomIndex', 'zoomct',
+                                 'activeCurve', 'curves'])
+
+# The points of one curve of a session. 'coefficients' is an empty array if the coefficients were not saved
+CurveData = namedtuple('CurveData', ['engine', 'worldX', 'worldY', 'active', 'coefficients'])
+
+
+def saveSession(path, session):
+    ''' Write 'session' (a Session) to the file 'path'
+    '''
+    header = HEADER.pack(MAGIC, VERSION, len(session.curves), session.activeCurve, session.xOffset,
+                         session.yOffset, session.pixelsPerUnit, session.worldScale, session.zoomIndex,
+                         session.zoomct)
+    with open(path, 'wb') as f:
+        f.write(header)
+        for curve in session.curves:
+            worldX = np.ascontiguousarray(curve.worldX, dtype='<f8')
+            worldY = np.ascontiguousarray(curve.worldY, dtype='<f8')
+            active = np.ascontiguousarray(curve.active, dtype=np.uint8)
+            coefficients = np.ascontiguousarray(curve.coefficients, dtype='<f8')
+            if not (len(worldX) == len(worldY) == len(active)):
+                raise ValueError('worldX, worldY and active must have the same length')
+
+            f.write(CURVE_HEADER.pack(ENGINES.index(curve.engine), len(worldX), len(coefficients)))
+            for array in (worldX, worldY, coefficients, active):
+                array.tofile(f)
+            f.write(bytes(-len(active) % 8)) # Keep the next curve aligned to 8 bytes
+    return None
+
+def loadSession(path):
+    ''' Read the session in the file 'path'. The arrays of the returned Session are read-only memory maps
+        of the file
+    '''
+    with open(path, 'rb') as f:
+        data = f.read(HEADER.size)
+    if len(data) < HEADER.size or data[:4] != MAGIC:
+        raise ValueError(f"'{path}' is not a session file")
+
+    version = struct.unpack_from('<H', data, 4)[0]
+    if version != VERSION:
+        raise ValueError(f"Unsupported session file version {version}")
+
+    (magic, version, curveCount, activeCurve, xOffset, yOffset, pixelsPerUnit, worldScale,
+     zoomIndex, zoomct) = HEADER.unpack_from(data)
+
+    curves = []
+    offset = HEADER.size
+    with open(path, 'rb') as f:
+        for i in range(curveCount):
+            f.seek(offset)
+            data = f.read(CURVE_HEADER.size)
+            if len(data) < CURVE_HEADER.size:
+                raise ValueError(f"'{path}' is truncated")
+            engine, count, coefficientCount = CURVE_HEADER.unpack(data)
+            curve, offset = mapCurve(path, offset + CURVE_HEADER.size, engine, count, coefficientCount)
+            offset += -count % 8
+            curves.append(curve)
+
+    return Session(xOffset, yOffset, pixelsPerUnit, worldScale, zoomIndex, zoomct, activeCurve, curves)
+
+def mapCurve(path, offset, engine, count, coefficientCount):
+    ''' Returns the CurveData whose arrays start 'offset' bytes into the file, and the offset of the end of its arrays
+    '''
+    if engine >= len(ENGINES):
+        raise ValueError(f"'{path}' has a curve with an unknown engine ({engine})")
+    floats = mapArray(path, '<f8', offset, 2 * count + coefficientCount)
+    offset += 8 * (2 * count + coefficientCount)
+    active = mapArray(path, np.uint8, offset, count)
+    curve = CurveData(ENGINES[engine], floats[:count], floats[count:2*count], active.view(bool), floats[2*count:])
+    return curve, offset + count
+
+def mapArray(path, dtype, offset, length):
+    ''' Returns a read-only memory map of 'length' values of type 'dtype' starting 'offset' bytes into the file
+    '''
+    if length == 0: # Empty files can't be memory-mapped
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(length,))
@@ -0,0 +1,378 @@
+""" This file implements feeding the graph from a live stream of samples (for example a sensor writing to a
+    log file or a local socket), so the interpolant of the most recent samples can be watched as it changes.
+
+    A stream reader reads lines of the form "x y" (or "x,y") on a background thread and queues each sample
+    with the time it was received, so the render loop can collect the new samples every frame without
+    waiting (see StreamReader.poll()). The sliding window feed adds the samples to a curve of the graph and
+    keeps only the 'window' most recent ones. The divided difference table of the window is updated as
+    samples enter and leave it (see Interpolation.NewtonWindow) and handed to the curve's sampler as an
+    Interpolant, so the polynomial is never calculated from scratch.
+
+    The feed reports the ingest rate (over the whole stream and over the last few seconds) and the
+    end-to-end latency of each sample: the time from the sample being read to the end of the first frame
+    that shows the curve of a window it was added to (or a later window, when samples arrive faster than
+    the curve is drawn).
+
+    Usage:
+        python Main.py --stream log.txt [--window K]      # follow a file as lines are appended to it
+        python Main.py --stream tcp:8352                  # listen for connections on 127.0.0.1:8352
+        python Main.py --stream -                         # read standard input
+        python Streaming.py tcp:8352 --rate 200           # send a test signal to a stream
+
+    Authors: Joshua Fawcett, Hans Prieto
+"""
+
+import sys
+import math
+import time
+import queue
+import socket
+import argparse
+import threading
+from time import perf_counter
+from collections import namedtuple, deque
+
+from Interpolation import NewtonWindow
+from Profiling import Profiler
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_WINDOW = 10 # Number of samples interpolated (the graph's MAXPOINTS)
+
+POLL_INTERVAL = 0.005 # Time (in seconds) the file reader waits before checking the file for new lines again
+RATE_WINDOW = 5.0 # The recent ingest rate is measured over this many seconds
+
+# A sample read from a stream. 'received' is the perf_counter() time the line was read
+Sample = namedtuple('Sample', ['x', 'y', 'received'])
+
+
+def parseSample(line, received=0.0):
+    ''' Returns the Sample for a line of the form "x y" or "x,y", or None if the line isn't a sample
+    '''
+    fields = line.replace(',', ' ').split()
+    if len(fields) != 2:
+        return None
+    try:
+        x, y = float(fields[0]), float(fields[1])
+    except ValueError:
+        return None
+    if not (math.isfinite(x) and math.isfinite(y)):
+        return None
+    return Sample(x, y, received)
+
+
+###########
+# Readers #
+###########
+
+# A stream reader reads lines on a background thread and queues the samples, so that the render loop
+# never waits for input. Subclasses implement __lines__(), which yields each line as it is read
+class StreamReader:
+    def __init__(self, name):
+        self.name = name
+        self.samples = queue.SimpleQueue()
+        self.rejected = 0 # Number of lines that weren't samples
+        self.running = True
+        self.thread = threading.Thread(target=self.__run__, name=f'StreamReader({name})', daemon=True)
+        return None
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def poll(self):
+        ''' Returns a list of the samples received since the last call, without waiting for more
+        '''
+        samples = []
+        while True:
+            try:
+                samples.append(self.samples.get_nowait())
+            except queue.Empty:
+                return samples
+
+    def close(self):
+        ''' Stop reading (the background thread exits the next time it checks for input)
+        '''
+        self.running = False
+        return None
+
+    def __lines__(self):
+        return iter(())
+
+    def __run__(self):
+        for line in self.__lines__():
+            if not self.running:
+                break
+            sample = parseSample(line, perf_counter())
+            if sample is None:
+                self.rejected += 1
+            else:
+                self.samples.put(sample)
+        return None
+
+
+# Follows a file as lines are appended to it (like tail -f). Only lines added after the reader was created
+# are read, unless 'fromStart' is True
+class FileStream(StreamReader):
+    def __init__(self, path, fromStart=False):
+        super(FileStream, self).__init__(path)
+        self.file = open(path, 'r')
+        if not fromStart:
+            self.file.seek(0, 2) # Start at the end of the file
+        return None
+
+    def __lines__(self):
+        partial = ''
+        while self.running:
+            line = self.file.readline()
+            if not line: # No new lines yet
+                time.sleep(POLL_INTERVAL)
+                continue
+            partial += line
+            if partial.endswith('\n'): # (a line may be read before the writer finished it)
+                yield partial
+                partial = ''
+        self.file.close()
+
+
+# Reads lines from an open file object (for example standard input)
+class PipeStream(StreamReader):
+    def __init__(self, file, name='-'):
+        super(PipeStream, self).__init__(name)
+        self.file = file
+        return None
+
+    def __lines__(self):
+        for line in self.file:
+            yield line
+
+
+# Listens for TCP connections on a local port and reads lines from each connection in turn
+class SocketStream(StreamReader):
+    def __init__(self, port, host=DEFAULT_HOST):
+        super(SocketStream, self).__init__(f'tcp:{host}:{port}')
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(0.1) # Check self.running between connections
+        self.address = self.server.getsockname()
+        return None
+
+    def __lines__(self):
+        with self.server:
+            while self.running:
+                try:
+                    connection, address = self.server.accept()
+                except socket.timeout:
+                    continue
+                connection.settimeout(0.1)
+                with connection:
+                    buffer = b''
+                    while self.running:
+                        try:
+                            data = connection.recv(65536)
+                        except socket.timeout:
+                            continue
+                        if not data: # The sender closed the connection
+                            break
+                        buffer += data
+                        *lines, buffer = buffer.split(b'\n')
+                        for line in lines:
+                            yield line.decode('utf-8', 'replace')
+
+
+def openStream(source, fromStart=False):
+    ''' Start reading the stream 'source': 'tcp:PORT' or 'tcp:HOST:PORT' listens on a local socket, '-'
+        reads standard input and anything else is the path of a file to follow
+    '''
+    if source.startswith('tcp:'):
+        parts = source.split(':')
+        host = parts[1] if len(parts) == 3 else DEFAULT_HOST
+        return SocketStream(int(parts[-1]), host).start()
+    if source == '-':
+        return PipeStream(sys.stdin).start()
+    return FileStream(source, fromStart).start()
+
+
+########
+# Feed #
+########
+
+# The sliding window feed adds the samples of a stream reader to a curve of the graph, keeping the
+# 'window' most recent samples. If the active curve already has points, the samples go to a new curve
+class SlidingWindowFeed:
+    def __init__(self, graph, reader, window=DEFAULT_WINDOW):
+        self.graph = graph
+        self.reader = reader
+        self.window = NewtonWindow(window)
+
+        if len(graph.curve.points) > 0:
+            graph.addCurve()
+        self.curveIndex = graph.activeCurve
+
+        # Samples that haven't been shown yet, as a list of the form [(xs, [received, ...]), ...] where
+        # xs holds the x coordinates of the window once the samples were added
+        self.pending = []
+
+        self.samples = 0 # Number of samples added to the graph
+        self.duplicates = 0 # Number of samples dropped because their x value was already in the window
+        self.start = None # Time the first sample was received
+        self.last = None # Time the most recent sample was received
+        self.recent = deque() # Times the samples of the last RATE_WINDOW seconds were received
+        self.latency = Profiler(enabled=True) # End-to-end latency of the recent samples
+        return None
+
+    @property
+    def curve(self):
+        graph = self.graph
+        if self.curveIndex >= len(graph.curves): # The curve was removed (by undoing the stream)
+            graph.setCurveCount(self.curveIndex + 1)
+        return graph.curves[self.curveIndex]
+
+    def update(self):
+        ''' Add the samples received since the last frame to the curve. Called once every frame, before
+            the graph is drawn. Returns the number of samples added
+        '''
+        samples = self.reader.poll()
+        if not samples:
+            return 0
+
+        graph = self.graph
+        curve = self.curve
+        points = curve.points
+        window = self.window
+
+        # If the curve's points were edited since the last samples were added, start from its points
+        xs, ys = points.activeCoordinates()
+        if len(xs) != len(points) or (xs, ys) != (tuple(window.xs), tuple(window.ys)):
+            graph.deselectPoints()
+            window.reset(xs, ys)
+            points.load(window.xs, window.ys, [True] * len(window))
+            points.project(graph)
+
+        added = []
+        for sample in samples:
+            x, y = sample.x, sample.y
+            try:
+                window.append(x, y)
+            except ValueError: # The x value is already in the window
+                self.duplicates += 1
+                continue
+
+            if len(points) == window.size: # Remove the oldest point
+                oldest = points[0]
+                if oldest.selected:
+                    graph.deselectPoints()
+                points.remove(oldest)
+            points.add((x, y), graph.convertToScreen(x, y))
+            added.append(sample.received)
+
+        if added:
+            # The curve's sampler uses the window's interpolant instead of calculating it again
+            curve.sampler.preload(('newton', tuple(window.xs), tuple(window.ys)), window.interpolant())
+            graph.recordHistory('all', coalesce='stream') # The whole stream is undone as a single step
+            self.pending.append((tuple(window.xs), added))
+            self.__count__(added)
+        return len(added)
+
+    def frameShown(self):
+        ''' Record the latency of the samples shown by the frame that was just drawn. Called once every
+            frame, after the window is updated
+        '''
+        result = self.curve.result # The curve that was drawn
+        if result is None or not self.pending:
+            return None
+
+        xs = result.request.xs
+        for i in range(len(self.pending) - 1, -1, -1):
+            if self.pending[i][0] == xs: # Every sample up to this one has been shown
+                now = perf_counter()
+                for shownXs, received in self.pending[:i+1]:
+                    for t in received:
+                        self.latency.record('latency', now - t)
+                del self.pending[:i+1]
+                break
+        return None
+
+    def report(self):
+        ''' Returns a dictionary of the form {'samples': ..., 'duplicates': ..., 'rejected': ..., 'rate': ...,
+            'recentRate': ..., 'latencyMs': ...} where the rates are in samples per second (over the whole
+            stream and over the last RATE_WINDOW seconds) and 'latencyMs' is the summary returned by
+            Profiling.Profiler.summary() for the most recent samples
+        '''
+        rate = recentRate = 0.0
+        if self.samples > 1 and self.last > self.start:
+            rate = (self.samples - 1) / (self.last - self.start)
+        if len(self.recent) > 1 and self.recent[-1] > self.recent[0]:
+            recentRate = (len(self.recent) - 1) / (self.recent[-1] - self.recent[0])
+        return {
+            'samples': self.samples,
+            'duplicates': self.duplicates,
+            'rejected': self.reader.rejected,
+            'rate': rate,
+            'recentRate': recentRate,
+            'latencyMs': self.latency.summary('latency') if 'latency' in self.latency.timings else None,
+        }
+
+    def close(self):
+        self.reader.close()
+        return None
+
+    def __count__(self, received):
+        ''' Add the receive times 'received' to the ingest rate counters
+        '''
+        if self.start is None:
+            self.start = received[0]
+        self.last = received[-1]
+        self.samples += len(received)
+        self.recent.extend(received)
+        while self.recent[-1] - self.recent[0] > RATE_WINDOW:
+            self.recent.popleft()
+        return None
+
+
+def printReport(report, log=print):
+    log(f"{report['samples']} samples streamed ({report['duplicates']} with a repeated x value and "
+        f"{report['rejected']} unreadable lines dropped)")
+    log(f"ingest rate: {report['rate']:.1f} samples/s overall, {report['recentRate']:.1f} samples/s "
+        f"over the last {RATE_WINDOW:g} s")
+    latency = report['latencyMs']
+    if latency is not None:
+        log(f"latency (ms): mean {latency['mean']:.2f}, p50 {latency['p50']:.2f}, p95 {latency['p95']:.2f}, "
+            f"max {latency['max']:.2f}")
+    return None
+
+
+###############
+# Test signal #
+###############
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Send a test signal to a stream read by python Main.py --stream')
+    parser.add_argument('target', help="'tcp:PORT', 'tcp:HOST:PORT' or the path of a file to append to")
+    parser.add_argument('--rate', type=float, default=100, help='samples per second')
+    parser.add_argument('--count', type=int, default=0, help='number of samples to send (0 sends until interrupted)')
+    args = parser.parse_args(argv)
+
+    if args.target.startswith('tcp:'):
+        parts = args.target.split(':')
+        host = parts[1] if len(parts) == 3 else DEFAULT_HOST
+        connection = socket.create_connection((host, int(parts[-1])))
+        send = lambda line: connection.sendall(line.encode())
+    else:
+        output = open(args.target, 'a')
+        def send(line):
+            output.write(line)
+            output.flush()
+
+    # A noisy sine wave sampled every 0.1 units of x
+    start = perf_counter()
+    i = 0
+    while args.count == 0 or i < args.count:
+        x = i * 0.1
+        send(f"{x:.3f} {2 * math.sin(x) + 0.5 * math.sin(3.7 * x):.5f}\n")
+        i += 1
+        delay = start + i / args.rate - perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
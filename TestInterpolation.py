@@ -4,6 +4,20 @@
 """
 
 import Interpolation
+import Formatting
+import Sampling
+import InterpolationServer
+import Session
+import History
+import Replay
+import Profiling
+import Streaming
+import ConvergenceStudy
+import os
+import struct
+import tempfile
+import threading
+import time
 import unittest
 
 class test_interpolation(unittest.TestCase):
@@ -101,5 +115,653 @@ class test_interpolation(unittest.TestCase):
         # compare computed result with actual result
         self.assertEqual(computed_result, actual_result)
 
+class test_newton_form(unittest.TestCase):
+    # p(x) = 1 + 2x - 6x(x - 0.5) + 4x(x - 0.5)(x - 1) = 4x^3 - 12x^2 + 7x + 1
+    x_coords = [0, 0.5, 1, 2]
+    y_coords = [1, 2, 0, -1]
+
+    def test_coefficients(self):
+        '''
+        Tests that the Newton coefficients are the top row of the divided difference table.
+        '''
+        coefficients = Interpolation.newtonCoefficients(self.x_coords, self.y_coords)
+        self.assertEqual(list(coefficients), [1, 2, -6, 4])
+
+    def test_sliding_window(self):
+        '''
+        Tests that the table of a sliding window holds the same divided differences newtonsIP() calculates
+        for the nodes in the window, as nodes enter and leave it.
+        '''
+        xs = [0, 0.5, 1, 2, 3.5, 4, 6, 7.25]
+        ys = [1, 2, 0, -1, 3, 2.5, -4, 0.5]
+        window = Interpolation.NewtonWindow(4)
+        for k in range(len(xs)):
+            window.append(xs[k], ys[k])
+            start = max(0, k - 3)
+            table = Interpolation.newtonsIP(xs[start:k+1], ys[start:k+1])
+            self.assertEqual(window.xs, xs[start:k+1])
+            self.assertEqual(window.table, [row[:len(window) - i] for i, row in enumerate(table)])
+
+        with self.assertRaises(ValueError): # x values must be distinct
+            window.append(6, 1)
+        self.assertEqual(window.xs, xs[4:])
+
+    def test_cyclic_window(self):
+        '''
+        Tests a window fed x values that repeat once they have left it.
+        '''
+        window = Interpolation.NewtonWindow(3)
+        xs, ys = [], []
+        for k in range(9):
+            xs.append(k % 3)
+            ys.append(k * k - 2)
+            window.append(xs[-1], ys[-1])
+            table = Interpolation.newtonsIP(xs[-3:], ys[-3:])
+            self.assertEqual(window.xs, xs[-3:])
+            self.assertEqual(window.table, [row[:len(window) - i] for i, row in enumerate(table)])
+
+    def test_derivatives(self):
+        '''
+        Tests evaluating the polynomial and its first three derivatives in one pass.
+        '''
+        coefficients = Interpolation.newtonCoefficients(self.x_coords, self.y_coords)
+        xs = [-1, 0.25, 9]
+
+        computed = Interpolation.evaluateDerivatives(xs, self.x_coords, coefficients, 3)
+        self.assertEqual(computed.shape, (4, 3))
+
+        for i, x in enumerate(xs):
+            self.assertAlmostEqual(computed[0][i], 4*x**3 - 12*x**2 + 7*x + 1)
+            self.assertAlmostEqual(computed[1][i], 12*x**2 - 24*x + 7)
+            self.assertAlmostEqual(computed[2][i], 24*x - 24)
+            self.assertAlmostEqual(computed[3][i], 24)
+
+        # compare with evaluatePolynomial
+        self.assertEqual(computed[0][2], 2008)
+
+    def test_integral(self):
+        '''
+        Tests the exact integral of the polynomial. The antiderivative is x^4 - 4x^3 + 3.5x^2 + x
+        '''
+        coefficients = Interpolation.newtonCoefficients(self.x_coords, self.y_coords)
+        F = lambda x: x**4 - 4*x**3 + 3.5*x**2 + x
+
+        self.assertAlmostEqual(Interpolation.integratePolynomial(self.x_coords, coefficients, 0, 2), 0)
+
+        computed = Interpolation.integratePolynomial(self.x_coords, coefficients, -1, [0, 1, 3])
+        for c, b in zip(computed, [0, 1, 3]):
+            self.assertAlmostEqual(c, F(b) - F(-1))
+
+    def test_critical_points(self):
+        '''
+        Tests finding the roots and extrema of p(x) = (x + 2)(x - 1)(x - 3) = x^3 - 2x^2 - 5x + 6 on [-4, 5].
+        p'(x) = 3x^2 - 4x - 5 = 0 at x = (2 -+ sqrt(19)) / 3
+        '''
+        x_coords = [-2, 1, 3, 0]
+        y_coords = [0, 0, 0, 6]
+        coefficients = Interpolation.newtonCoefficients(x_coords, y_coords)
+
+        samples = [-4 + 9 * i / 700 for i in range(701)]
+        values = Interpolation.evaluateDerivatives(samples, x_coords, coefficients, 0)[0]
+
+        roots, minima, maxima = Interpolation.findCriticalPoints(samples, values, x_coords, coefficients)
+
+        self.assertEqual(len(roots), 3)
+        for c, r in zip(roots, [-2, 1, 3]):
+            self.assertAlmostEqual(c, r)
+
+        self.assertEqual(len(minima), 1)
+        self.assertEqual(len(maxima), 1)
+        self.assertAlmostEqual(minima[0], (2 + 19**0.5) / 3)
+        self.assertAlmostEqual(maxima[0], (2 - 19**0.5) / 3)
+
+    def test_critical_points_on_samples(self):
+        '''
+        Tests critical points that fall exactly on a sample. p(x) = x^3 has an inflection point at 0, where
+        p' is zero but doesn't change sign, and p(x) = x^3 - 3x has extrema at -1 and 1.
+        '''
+        samples = [-2 + 4 * i / 400 for i in range(401)]
+        x_coords = [-1, 0, 1, 2]
+        for y_coords, minima, maxima in (([-1, 0, 1, 8], [], []), ([2, 0, -2, 2], [1], [-1])):
+            coefficients = Interpolation.newtonCoefficients(x_coords, y_coords)
+            values = Interpolation.evaluateDerivatives(samples, x_coords, coefficients, 0)[0]
+            points = Interpolation.findCriticalPoints(samples, values, x_coords, coefficients)
+            self.assertEqual(points.minima.tolist(), minima)
+            self.assertEqual(points.maxima.tolist(), maxima)
+        self.assertEqual(len(points.roots), 3)
+
+    def test_interpolant(self):
+        '''
+        Tests that an Interpolant evaluates like evaluatePolynomial(), and that it survives pickling and
+        being shared through shared memory.
+        '''
+        import pickle
+        polynomial = Interpolation.Interpolant.fromPoints(self.x_coords, self.y_coords)
+        self.assertEqual(len(polynomial), 4)
+        self.assertEqual(polynomial.coefficients.tolist(), [1, 2, -6, 4])
+
+        xs = [-1, 0.25, 9]
+        self.assertEqual(polynomial(9), 2008)
+        self.assertEqual(polynomial(xs).tolist(),
+                         [Interpolation.evaluatePolynomial(x, self.x_coords, [[1, 2, -6, 4]]) for x in xs])
+
+        copy = pickle.loads(pickle.dumps(polynomial))
+        self.assertEqual(copy.data.tolist(), polynomial.data.tolist())
+
+        with self.assertRaises(ValueError): # an interpolant needs at least one node
+            Interpolation.Interpolant.fromPoints([], [])
+        with self.assertRaises(ValueError):
+            Interpolation.NewtonWindow(4).interpolant()
+        self.assertEqual(Interpolation.Interpolant([2], [5])([0, 1]).tolist(), [5, 5])
+
+        memory = polynomial.export()
+        try:
+            shared = Interpolation.Interpolant.attach(memory.name)
+            self.assertEqual(shared(xs).tolist(), polynomial(xs).tolist())
+            shared.close()
+        finally:
+            memory.close()
+            memory.unlink()
+
+class test_spline(unittest.TestCase):
+    def test_thomas_solve(self):
+        '''
+        Tests the tridiagonal solver against a system with a known solution.
+        '''
+        lower = [0, 1, 1, 1]
+        diagonal = [4, 4, 4, 4]
+        upper = [1, 1, 1, 0]
+        solution = [1, -2, 3, 0.5]
+
+        # right hand side = A * solution
+        rhs = [4*1 + 1*-2, 1*1 + 4*-2 + 1*3, 1*-2 + 4*3 + 1*0.5, 1*3 + 4*0.5]
+
+        computed = Interpolation.thomasSolve(lower, diagonal, upper, rhs)
+        for c, s in zip(computed, solution):
+            self.assertAlmostEqual(c, s)
+
+    def test_natural_spline_interpolates(self):
+        '''
+        Tests that a natural cubic spline passes through every point, even when the points are not sorted.
+        '''
+        x_coords = [2, 0, 0.5, 1, 3]
+        y_coords = [-1, 1, 2, 0, 4]
+
+        spline = Interpolation.cubicSpline(x_coords, y_coords)
+
+        for x, y in zip(x_coords, y_coords):
+            self.assertAlmostEqual(Interpolation.evaluateSpline(x, spline), y)
+
+        # The second derivative (2 * c) is zero at the left end of the spline
+        self.assertAlmostEqual(spline.c[0], 0)
+
+    def test_natural_spline_linear(self):
+        '''
+        Tests that a natural cubic spline through points on a line is that line, including outside of the points.
+        '''
+        x_coords = [0, 1, 2.5, 4]
+        y_coords = [2*x + 1 for x in x_coords]
+
+        spline = Interpolation.cubicSpline(x_coords, y_coords)
+        computed = Interpolation.evaluateSpline([-1, 0.5, 3, 5], spline)
+
+        for c, x in zip(computed, [-1, 0.5, 3, 5]):
+            self.assertAlmostEqual(c, 2*x + 1)
+
+    def test_clamped_spline_cubic(self):
+        '''
+        Tests that a clamped cubic spline through points on a cubic (with the exact end slopes) is that cubic.
+        '''
+        f = lambda x: x**3 - 2*x + 1
+        df = lambda x: 3*x**2 - 2
+
+        x_coords = [-1, 0, 0.5, 2]
+        y_coords = [f(x) for x in x_coords]
+
+        spline = Interpolation.cubicSpline(x_coords, y_coords, 'clamped', (df(-1), df(2)))
+
+        for x in [-0.75, 0.25, 1, 1.5]:
+            self.assertAlmostEqual(Interpolation.evaluateSpline(x, spline), f(x))
+
+    def test_spline_duplicate_x(self):
+        '''
+        Tests that a spline can't be created when the x values are not distinct.
+        '''
+        with self.assertRaises(ValueError):
+            Interpolation.cubicSpline([0, 1, 1], [0, 1, 2])
+
+class test_clipping(unittest.TestCase):
+    def test_clip_inside(self):
+        '''
+        Tests that a polyline inside the view is not changed.
+        '''
+        polylines = Sampling.clipPolyline([0, 1, 2], [10, 50, 90], 0, 100)
+        self.assertEqual(polylines, [[[0, 10], [1, 50], [2, 90]]])
+
+    def test_clip_split(self):
+        '''
+        Tests that segments leaving the view are cut off at its edge and the polyline is split where it leaves.
+        '''
+        polylines = Sampling.clipPolyline([0, 1, 2, 3, 4], [50, -70, -1e12, float('nan'), 50], 0, 100, margin=10)
+        self.assertEqual(len(polylines), 1)
+        self.assertEqual(polylines[0][0], [0, 50])
+        self.assertAlmostEqual(polylines[0][1][0], 0.5)
+        self.assertEqual(polylines[0][1][1], -10)
+
+    def test_resample(self):
+        '''
+        Tests that a curve resampled in another view reuses its divided difference table and matches the
+        curve sampled in that view from scratch.
+        '''
+        xs, ys = (-1.0, 0.5, 2.0), (2.0, -1.0, 3.0)
+        wide = Sampling.ViewTransform(0, 0, 60, 1, 700, 700)
+        detail = Sampling.ViewTransform(30, -15, 90, 0.5, 200, 150)
+        result = Sampling.computeCurve(Sampling.CurveRequest(xs, ys, wide))
+        resampled = Sampling.resampleCurve(result, detail)
+        self.assertIs(resampled.table, result.table)
+        self.assertEqual(len(resampled.worldXs), 200)
+        self.assertEqual(resampled.polylines, Sampling.computeCurve(Sampling.CurveRequest(xs, ys, detail)).polylines)
+
+    def test_worker_error(self):
+        '''
+        Tests that the curve worker keeps serving requests after one fails, and holds the error until a
+        request succeeds.
+        '''
+        view = Sampling.ViewTransform(0, 0, 60, 1, 200, 200)
+        good = Sampling.CurveRequest((0.0, 1.0, 2.0), (0.0, 1.0, 0.0), view, 'natural')
+        worker = Sampling.CurveWorker()
+        try:
+            worker.submit(Sampling.CurveRequest((0.0, 1.0, 1.0), (0.0, 1.0, 2.0), view, 'natural')) # x values repeat
+            for i in range(500):
+                if worker.error is not None:
+                    break
+                time.sleep(0.01)
+            self.assertIsInstance(worker.error, ValueError)
+            self.assertIsNone(worker.latest())
+
+            worker.submit(good)
+            for i in range(500):
+                if worker.latest() is not None:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(worker.latest().request, good)
+            self.assertIsNone(worker.error)
+        finally:
+            worker.close()
+
+    def test_visible_markers(self):
+        '''
+        Tests that critical points whose screen position is far outside of the view (or not finite) are not
+        marked. The maximum of the polynomial through (-1, 0), (0.3, 1e25), (1, 0) is too large for a pixel.
+        '''
+        xs, ys = (-1.0, 0.3, 1.0), (0.0, 1e25, 0.0)
+        view = Sampling.ViewTransform(0, 0, 60, 1, 700, 700)
+        result = Sampling.computeCurve(Sampling.CurveRequest(xs, ys, view))
+        roots, minima, maxima = Interpolation.findCriticalPoints(result.worldXs, result.worldYs, xs, result.table.coefficients)
+        self.assertEqual(len(maxima), 1)
+
+        sx, sy = Sampling.visibleMarkers(maxima, result.table(maxima), view, 9)
+        self.assertEqual(len(sx), 0)
+        sx, sy = Sampling.visibleMarkers(roots, [0] * len(roots), view, 9)
+        self.assertEqual((sx.tolist(), sy.tolist()), ([290, 410], [350, 350]))
+
+        sx, sy = Sampling.visibleMarkers([0, -6, -5.75, 6.25, 0], [float('nan'), 0, 0, 0, 5.75], view, 9)
+        self.assertEqual((sx.tolist(), sy.tolist()), ([5, 350], [350, 5]))
+
+class test_service(unittest.TestCase):
+    def test_cache_lru(self):
+        '''
+        Tests that the interpolant cache reuses interpolants and drops the least recently used one when full.
+        '''
+        cache = InterpolationServer.InterpolantCache(maxSize=2)
+        first = cache.get('newton', [0, 1], [1, 3])
+        self.assertIs(cache.get('newton', [0, 1], [1, 3]), first)
+        cache.get('natural', [0, 1], [1, 3])
+        cache.get('newton', [0, 2], [1, 3])
+        self.assertEqual(len(cache.entries), 2)
+        self.assertNotIn(first.key, cache.entries)
+
+    def test_batched_evaluation(self):
+        '''
+        Tests that the batcher returns the values of the interpolant at each query x.
+        '''
+        service = InterpolationServer.InterpolationService()
+        try:
+            result = service.evaluate({'xs': [0, 0.5, 1, 2], 'ys': [1, 2, 0, -1], 'x': [9, 0.5]})
+        finally:
+            service.close()
+        self.assertEqual(result['values'], [2008, 2])
+
+    def test_bad_request(self):
+        '''
+        Tests that a request body that is valid JSON but not an object gets an error response.
+        '''
+        server = InterpolationServer.InterpolationServer(('127.0.0.1', 0))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            with InterpolationServer.InterpolationClient('127.0.0.1', server.server_address[1]) as client:
+                for body in ([1, 2], 'x'):
+                    with self.assertRaisesRegex(InterpolationServer.ServiceError, 'JSON object'):
+                        client.__post__('/evaluate', body)
+
+                view = {'pixelsPerUnit': 70, 'width': 100, 'height': 100}
+                for change in ([1, 2], {'pixelsPerUnit': 0}, {'worldScale': float('inf')}, {'width': 10**9},
+                               {'height': 2.5}, {'xOffset': 'left'}):
+                    bad = dict(view, **change) if isinstance(change, dict) else change
+                    with self.assertRaisesRegex(InterpolationServer.ServiceError, 'view'):
+                        client.render([0, 1], [1, 3], bad)
+                self.assertEqual(len(client.render([0, 1], [1, 3], view)), 1)
+                self.assertEqual(client.evaluate([0, 1], [1, 3], [2]).tolist(), [5])
+
+            connection = InterpolationServer.http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+            connection.putrequest('POST', '/evaluate')
+            connection.putheader('Content-Length', 'many')
+            connection.endheaders()
+            self.assertEqual(connection.getresponse().status, 400)
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+class test_session(unittest.TestCase):
+    def test_round_trip(self):
+        '''
+        Tests that a saved session is loaded back unchanged.
+        '''
+        curves = [Session.CurveData('newton', [0, 0.5, 1], [1, 2, 0], [True, False, True], [1, -2]),
+                  Session.CurveData('natural', [], [], [], []),
+                  Session.CurveData('clamped', [4, 5], [6, 7], [True, True], [])]
+        session = Session.Session(12.5, -3, 65, 2, -1, 3, 2, curves)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.intp')
+            Session.saveSession(path, session)
+            loaded = Session.loadSession(path)
+
+            self.assertEqual(loaded[:7], session[:7])
+            self.assertEqual([curve.engine for curve in loaded.curves], ['newton', 'natural', 'clamped'])
+            first, last = loaded.curves[0], loaded.curves[2]
+            self.assertEqual(first.worldX.tolist(), [0, 0.5, 1])
+            self.assertEqual(first.worldY.tolist(), [1, 2, 0])
+            self.assertEqual(first.active.tolist(), [True, False, True])
+            self.assertEqual(first.coefficients.tolist(), [1, -2])
+            self.assertEqual(last.worldY.tolist(), [6, 7])
+            self.assertEqual(len(loaded.curves[1].worldX), 0)
+            del loaded, first, last # Close the memory maps before the directory is removed
+
+    def test_not_a_session(self):
+        '''
+        Tests that loading a file that isn't a session fails.
+        '''
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.intp')
+            with open(path, 'wb') as f:
+                f.write(b'P(x) = 1 + 2(x - 0)')
+            with self.assertRaises(ValueError):
+                Session.loadSession(path)
+
+    def test_unknown_engine(self):
+        '''
+        Tests that loading a session with a curve engine that doesn't exist fails.
+        '''
+        session = Session.Session(0, 0, 60, 1, 0, 2, 0, [Session.CurveData('natural', [1, 2], [3, 4], [True, False], [])])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.intp')
+            Session.saveSession(path, session)
+            with open(path, 'r+b') as f: # Change the engine of the curve
+                f.seek(Session.HEADER.size)
+                f.write(struct.pack('<H', len(Interpolation.ENGINES)))
+            with self.assertRaises(ValueError):
+                Session.loadSession(path)
+
+class test_history(unittest.TestCase):
+    def test_persistent_vector(self):
+        '''
+        Tests that changing a persistent vector returns a new vector and leaves the old one unchanged.
+        '''
+        vector = History.PersistentVector.fromList(range(2000))
+        changed = vector.set(1500, 'x').append('y')
+
+        self.assertEqual(list(vector), list(range(2000)))
+        self.assertEqual(len(changed), 2001)
+        self.assertEqual(changed[1500], 'x')
+        self.assertEqual(changed[-1], 'y')
+        self.assertEqual(list(changed.delete(0))[:3], [1, 2, 3])
+
+    def test_undo_redo(self):
+        '''
+        Tests undoing and redoing snapshots, and that coalesced changes are undone as a single step.
+        '''
+        history = History.History('a')
+        history.record('b')
+        history.record('c', coalesce='zoom')
+        history.record('d', coalesce='zoom')
+
+        self.assertEqual(history.undo(), 'b')
+        self.assertEqual(history.undo(), 'a')
+        self.assertIsNone(history.undo())
+        self.assertEqual(history.redo(), 'b')
+
+        history.record('e') # Recording a change discards the undone snapshots
+        self.assertIsNone(history.redo())
+        self.assertEqual(history.undo(), 'b')
+
+class test_profiling(unittest.TestCase):
+    def test_concurrent_record(self):
+        '''
+        Tests summarizing the timings of a stage while another thread records timings of it (as the
+        curve worker thread does).
+        '''
+        profiler = Profiling.Profiler(enabled=True)
+        done = threading.Event()
+
+        def writer():
+            while not done.is_set():
+                profiler.record('worker', 0.001)
+                profiler.record(f'stage {len(profiler.timings) % 50}', 0.002)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            profiler.record('worker', 0.001)
+            for i in range(2000):
+                self.assertEqual(profiler.summary('worker')['mean'], 1)
+                profiler.report()
+        finally:
+            done.set()
+            thread.join()
+
+class test_graph(unittest.TestCase):
+    # The graph needs pygame, which is only imported by these tests (without a window)
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        import pygame
+        import Graphics
+        pygame.display.init()
+        pygame.font.init()
+        cls.pygame = pygame
+        cls.Graphics = Graphics
+
+    def makeGraph(self):
+        graph = self.Graphics.Graph((700, 700))
+        self.addCleanup(graph.close)
+        graph.points.load([-2.0, 0.0, 1.5], [1.0, -1.0, 2.0], [True, True, True])
+        graph.points.project(graph)
+        return graph
+
+    def test_view_transaction(self):
+        '''
+        Tests that nested view changes (zooming in and out and resetting the view) inside a view transaction
+        project the points and sample the curve once, when the outer transaction ends, and end at the same
+        view as the same changes made one at a time.
+        '''
+        graph = self.makeGraph()
+        calls = {'submit': 0, 'project': 0}
+        def counted(name, method):
+            def wrapper(*args):
+                calls[name] += 1
+                return method(*args)
+            return wrapper
+        curve = graph.curves[0]
+        curve.sampler.submit = counted('submit', curve.sampler.submit)
+        curve.points.project = counted('project', curve.points.project)
+
+        with graph.viewTransaction() as view:
+            graph.zoomIn()
+            graph.zoomOut()
+            graph.reset()
+            view.move(25, -10)
+            graph.zoom(0)
+            self.assertEqual(calls, {'submit': 0, 'project': 0})
+        self.assertEqual(calls, {'submit': 1, 'project': 1})
+        self.assertEqual(curve.lastCurveRequest.view, graph.view)
+
+        sequential = self.makeGraph()
+        sequential.zoomIn()
+        sequential.zoomOut()
+        sequential.reset()
+        with sequential.viewTransaction() as view:
+            view.move(25, -10)
+        sequential.zoom(0)
+        self.assertEqual(graph.viewState(), sequential.viewState())
+        self.assertEqual(graph.points.screenX[:3].tolist(), sequential.points.screenX[:3].tolist())
+
+    def test_point_dirty_rects(self):
+        '''
+        Tests the dirty rects of the points layer when a point is selected and moved, including to screen
+        coordinates past 4096 pixels
+        '''
+        graph = self.makeGraph()
+        points = graph.points
+        compositor = graph.compositor
+        r = self.Graphics.Point.radius
+        def circle(i):
+            x, y = int(points.screenX[i] + 1), int(points.screenY[i])
+            return (x - r, y - r, 2 * r + 1, 2 * r + 1)
+        def dirty(screenRect):
+            return {tuple(rect) for rect in compositor.__updatePoints__(screenRect)}
+
+        screenRect = self.pygame.Rect(0, 0, 700, 700)
+        self.assertEqual(dirty(screenRect), {circle(0), circle(1), circle(2)})
+        self.assertEqual(dirty(screenRect), set())
+
+        points.selected[1] = True
+        self.assertEqual(dirty(screenRect), {circle(1)})
+
+        before = circle(1)
+        points.screenX[1] += 30
+        self.assertEqual(dirty(screenRect), {before, circle(1)})
+
+        screenRect = self.pygame.Rect(0, 0, 10000, 10000)
+        before = circle(1)
+        points.screenX[1], points.screenY[1] = 4100, 5000
+        self.assertEqual(dirty(screenRect), {before, circle(1)})
+        points.screenY[1] = 9000
+        self.assertEqual(dirty(screenRect), {(4101 - r, 5000 - r, 2 * r + 1, 2 * r + 1), circle(1)})
+
+class test_replay(unittest.TestCase):
+    def test_compare_to_baseline(self):
+        '''
+        Tests that a replay report is compared against a baseline by its checksums and mean latencies.
+        '''
+        baseline = {'frameChecksum': 'a', 'stateChecksum': 'b',
+                    'latencyMs': {'frame': {'mean': 2.0}, 'onClick': {'mean': 0.1}}}
+        report = {'frameChecksum': 'a', 'stateChecksum': 'b',
+                  'latencyMs': {'frame': {'mean': 2.4}, 'onClick': {'mean': 0.2}, 'pressKey': {'mean': 1.0}}}
+
+        self.assertEqual(Replay.compareToBaseline(report, baseline, 25), ['onClick: mean 0.100 -> 0.200 ms (+100%)'])
+
+        report['frameChecksum'] = 'c'
+        problems = Replay.compareToBaseline(report, baseline, 150)
+        self.assertEqual(len(problems), 1)
+        self.assertTrue(problems[0].startswith('frameChecksum changed'))
+
+class test_streaming(unittest.TestCase):
+    def test_parse_sample(self):
+        '''
+        Tests that stream lines are parsed into samples, and that other lines are rejected.
+        '''
+        self.assertEqual(Streaming.parseSample('1.5 -2\n', 3.0), (1.5, -2.0, 3.0))
+        self.assertEqual(Streaming.parseSample('1.5,-2')[:2], (1.5, -2.0))
+        for line in ('', 'x y', '1 2 3', '1 nan'):
+            self.assertIsNone(Streaming.parseSample(line))
+
+    def test_file_stream(self):
+        '''
+        Tests that a file stream reads the lines appended to the file after it was opened.
+        '''
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stream.txt')
+            with open(path, 'w') as f:
+                f.write('0 0\n')
+
+            reader = Streaming.FileStream(path).start()
+            with open(path, 'a') as f:
+                f.write('1 2\nnot a sample\n3 4\n')
+
+            samples = []
+            for attempt in range(200):
+                samples += reader.poll()
+                if len(samples) == 2:
+                    break
+                Streaming.time.sleep(Streaming.POLL_INTERVAL)
+            reader.close()
+            reader.thread.join()
+
+        self.assertEqual([sample[:2] for sample in samples], [(1, 2), (3, 4)])
+        self.assertEqual(reader.rejected, 1)
+
+class test_formatting(unittest.TestCase):
+    def test_format_number(self):
+        '''
+        Tests that formatNumber() formats a number like formatNumberString() formats its string, keeping
+        ints and equal floats apart in the memo.
+        '''
+        for value in [1, 1.0, -0.0, 2.5, 0.123456, 123456.0, 98765, -1e-7]:
+            self.assertEqual(Formatting.formatNumber(value), Formatting.formatNumberString(str(value)))
+        self.assertEqual(Formatting.formatNumber(1), '1.')
+        self.assertEqual(Formatting.formatNumber(1.0), '1')
+
+    def test_polynomial_string(self):
+        '''
+        Tests the string of a polynomial with a negative coefficient and a negative node.
+        '''
+        xs = [2.0, -1.5, 0.25]
+        table = Interpolation.newtonsIP(xs, [1.0, -6.0, 2.123456])
+        self.assertEqual(Formatting.getPolynomialString(xs, table), 'P(x) = 1 + 2(x - 2) - 1.5097(x - 2)(x + 1.5) ')
+
+class test_convergence(unittest.TestCase):
+    def test_runge_phenomenon(self):
+        '''
+        Tests that the error of interpolating Runge's function grows with n for equispaced nodes and
+        shrinks for Chebyshev nodes.
+        '''
+        study = ConvergenceStudy.runStudy(ConvergenceStudy.DEFAULT_FUNCTION, [5, 21], ['equispaced', 'chebyshev'],
+                                          gridSize=501, processes=1)
+        errors = {(result['family'], result['n']): result['maxError'] for result in study['results']}
+        self.assertGreater(errors[('equispaced', 21)], errors[('equispaced', 5)])
+        self.assertLess(errors[('chebyshev', 21)], errors[('chebyshev', 5)])
+
+    def test_callable(self):
+        '''
+        Tests that a callable (which can't be sent to worker processes) is studied, and that a polynomial
+        is interpolated exactly once there are enough nodes.
+        '''
+        study = ConvergenceStudy.runStudy(lambda x: 2 * x ** 3 - x, [4], ['random'], interval=(0, 2), gridSize=101)
+        self.assertLess(study['results'][0]['maxError'], 1e-12)
+
+    def test_nodes(self):
+        '''
+        Tests that each node distribution gives n distinct nodes in [-1, 1], and the same random nodes every time.
+        '''
+        for distribution in Interpolation.NODE_DISTRIBUTIONS:
+            nodes = Interpolation.makeNodes(distribution, 12)
+            self.assertEqual(len(set(nodes)), 12)
+            self.assertTrue(all(-1 <= x <= 1 for x in nodes))
+        self.assertEqual(Interpolation.makeNodes('equispaced', 3), [-1, 0, 1])
+        self.assertEqual(Interpolation.makeNodes('random', 7), Interpolation.makeNodes('random', 7))
+
 if __name__ == '__main__':
     unittest.main()